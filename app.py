@@ -1,12 +1,25 @@
 import streamlit as st
 import os
 import json
-from datetime import datetime
+import itertools
+from datetime import datetime, timedelta
 from thinking_chat import ThinkingChat
 from direct_chat import DirectChat
 import config
-from utils import save_chat_history, load_chat_history
+from concurrent_chat import process_dual_brain, stream_dual_brain
+from cancellation import CancelToken, TurnCancelled, cancel_scope
+from utils import migrate_json_log
+from log_segments import read_index as read_segment_index
+from log_writer import get_log_writer, log_chat_entry, flush_chat_log
+from history_store import SEARCH_FIELDS, get_history_store
+from session_history import read_page as read_history_page, restore_chats, turn_messages
+from log_export import FORMATS as EXPORT_FORMATS, EXPORT_FIELDS, export_file, export_file_name, export_mime_type
 import audio_utils
+import llm_client
+from request_scheduler import get_scheduler, request_priority
+from plan_cache import get_plan_cache
+from semantic_cache import get_semantic_cache
+from metrics import get_metrics
 import email_utils # Gmail integration
 from voice_email_handler import VoiceEmailHandler # Add this import
 import os # ensure os is imported
@@ -18,6 +31,18 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def prepare_chat_log():
+    """First-run setup, once per server process: convert a chat log left by older versions
+    (a JSON array) into the JSONL log."""
+    if config.ENABLE_LOGGING:
+        try:
+            migrate_json_log(config.LEGACY_LOG_FILE_PATH, config.LOG_FILE_PATH)
+        except Exception as e:
+            print(f"Error migrating chat history: {e}")
+
+prepare_chat_log()
+
 # Initialize session state
 if "thinking_chat" not in st.session_state:
     st.session_state.thinking_chat = ThinkingChat()
@@ -45,8 +70,17 @@ if "continuous_listening_mode" not in st.session_state:
     st.session_state.continuous_listening_mode = False
 if "needs_auto_listen" not in st.session_state:
     st.session_state.needs_auto_listen = False
+if "pending_stream_input" not in st.session_state: # Text input waiting to be streamed into the chat columns
+    st.session_state.pending_stream_input = None
+if "turn_token" not in st.session_state: # Cancels the session's in-flight turn when new input arrives
+    st.session_state.turn_token = None
+if "older_turns" not in st.session_state: # Logged turns paged in above the resumed ones, oldest first
+    st.session_state.older_turns = []
 
 
+# Time windows offered by the chat history search (days back; None for all time)
+HISTORY_SEARCH_WINDOWS = {"Any time": None, "Last day": 1, "Last week": 7, "Last month": 30}
+
 # --- AVAILABLE TTS VOICES ---
 AVAILABLE_TTS_VOICES = ["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
 
@@ -84,14 +118,92 @@ def trigger_auto_listen():
     # No explicit st.rerun() here to avoid potential loops if not handled carefully.
     # process_voice_command should trigger reruns if it updates state/UI.
 
+def start_turn() -> CancelToken:
+    """Cancels the session's previous turn if it is still in flight and starts a new one."""
+    if st.session_state.turn_token is not None:
+        st.session_state.turn_token.cancel()
+    st.session_state.turn_token = CancelToken()
+    return st.session_state.turn_token
+
+
 def process_general_llm_input(user_input_text: str, called_from_voice: bool):
     """Handles input for ThinkingChat and DirectChat, and TTS if applicable."""
     if not user_input_text.strip():
         return
 
-    thinking_plan, thinking_response = st.session_state.thinking_chat.process_message(user_input_text)
-    direct_response = st.session_state.direct_chat.process_message(user_input_text)
+    token = start_turn()
+    if config.STREAM_RESPONSES and not called_from_voice:
+        # Streaming renders into the chat columns, which only exist later in the script run.
+        # Defer the turn to stream_general_llm_input, called once the containers are drawn.
+        st.session_state.pending_stream_input = user_input_text
+        st.session_state.user_input = ""
+        return
 
+    try:
+        if config.CONCURRENT_BRAINS:
+            thinking_plan, thinking_response, direct_response = process_dual_brain(
+                st.session_state.thinking_chat, st.session_state.direct_chat, user_input_text, token
+            )
+        else:
+            with cancel_scope(token):
+                thinking_plan, thinking_response = st.session_state.thinking_chat.process_message(user_input_text)
+                direct_response = st.session_state.direct_chat.process_message(user_input_text)
+    except TurnCancelled:
+        print(f"Turn cancelled by new input: {user_input_text!r}")
+        return
+    token.complete()
+
+    finish_general_llm_turn(user_input_text, thinking_plan, thinking_response, direct_response, called_from_voice)
+
+
+def stream_general_llm_input(user_input_text: str, thinking_container, direct_container):
+    """Streams ThinkingChat and DirectChat responses into their chat containers as tokens arrive."""
+    with thinking_container:
+        st.markdown(f"**You**: {user_input_text}")
+        with st.expander("Show Thinking Process", expanded=True):
+            plan_placeholder = st.empty()
+        thinking_placeholder = st.empty()
+    with direct_container:
+        st.markdown(f"**You**: {user_input_text}")
+        direct_placeholder = st.empty()
+
+    token = start_turn()
+    if config.CONCURRENT_BRAINS:
+        events = stream_dual_brain(st.session_state.thinking_chat, st.session_state.direct_chat, user_input_text,
+                                   token)
+    else:
+        events = itertools.chain(
+            st.session_state.thinking_chat.process_message_stream(user_input_text),
+            (("direct", delta) for delta in st.session_state.direct_chat.process_message_stream(user_input_text))
+        )
+
+    streamed = {"plan": "", "response": "", "direct": ""}
+    try:
+        with cancel_scope(token):
+            for kind, delta in events:
+                streamed[kind] += delta
+                if kind == "plan":
+                    plan_placeholder.markdown(f"**System Thinking**: {streamed['plan']}")
+                elif kind == "response":
+                    thinking_placeholder.markdown(f"**Assistant**: {streamed['response']}")
+                else:
+                    direct_placeholder.markdown(f"**Assistant**: {streamed['direct']}")
+        token.complete()
+    except TurnCancelled:
+        print(f"Turn cancelled by new input: {user_input_text!r}")
+        return
+    finally:
+        # Streamlit interrupts the script (e.g. on new input) by raising from the placeholder
+        # updates above; drop the half-finished turn and close its streams. No-op once completed.
+        token.cancel()
+
+    finish_general_llm_turn(user_input_text, streamed["plan"], streamed["response"], streamed["direct"],
+                            called_from_voice=False)
+
+
+def finish_general_llm_turn(user_input_text: str, thinking_plan: str, thinking_response: str,
+                            direct_response: str, called_from_voice: bool):
+    """Logs a completed ThinkingChat/DirectChat turn and speaks the direct response if applicable."""
     if config.ENABLE_LOGGING:
         os.makedirs(os.path.dirname(config.LOG_FILE_PATH), exist_ok=True)
         log_entry = {
@@ -99,11 +211,10 @@ def process_general_llm_input(user_input_text: str, called_from_voice: bool):
             "user_input": user_input_text,
             "thinking_plan": thinking_plan,
             "thinking_response": thinking_response,
-            "direct_response": direct_response
+            "direct_response": direct_response,
+            "metrics": {**st.session_state.thinking_chat.last_metrics, **st.session_state.direct_chat.last_metrics}
         }
-        current_logs = load_chat_history(config.LOG_FILE_PATH)
-        current_logs.append(log_entry)
-        save_chat_history(current_logs, config.LOG_FILE_PATH)
+        log_chat_entry(log_entry)
 
     speech_was_made = False
     if st.session_state.talking_mode_enabled and called_from_voice:
@@ -123,6 +234,7 @@ def process_general_llm_input(user_input_text: str, called_from_voice: bool):
         st.session_state.needs_auto_listen = True
 
 
+@request_priority("voice")  # Spoken turns are served ahead of typed ones when rate limited
 def process_voice_command(recognized_text: str):
     """Processes recognized speech: routes to email handler or general LLM, or handles stop command."""
     text_lower = recognized_text.lower()
@@ -246,9 +358,7 @@ def process_voice_command(recognized_text: str):
                 "user_input (voice_email)": recognized_text,
                 "handler_response": response_text,
             }
-            current_logs = load_chat_history(config.LOG_FILE_PATH)
-            current_logs.append(log_entry)
-            save_chat_history(current_logs, config.LOG_FILE_PATH)
+            log_chat_entry(log_entry)
     else:
         # Not an email command, or email command could not be fully processed by handler (e.g. bad parse)
         # Fallback to general LLM processing for voice.
@@ -422,9 +532,7 @@ def handle_submit(): # This is for text based submission
                     "user_input (text_email)": user_text,
                     "handler_response": email_response_text,
                 }
-                current_logs = load_chat_history(config.LOG_FILE_PATH)
-                current_logs.append(log_entry)
-                save_chat_history(current_logs, config.LOG_FILE_PATH)
+                log_chat_entry(log_entry)
             st.rerun() # Rerun to update UI immediately
             return # Stop further processing
 
@@ -432,9 +540,48 @@ def handle_submit(): # This is for text based submission
     if not email_command_processed_for_submit:
         process_general_llm_input(user_text_from_input_box, called_from_voice=False) # called_from_voice=False for text input
 
+def build_chat_export(fmt: str, compress: bool, start, end, fields):
+    """Stream the chat log (rotated segments included) into a downloadable export file."""
+    flush_chat_log()
+    return export_file(config.LOG_FILE_PATH, fmt=fmt, compress=compress, start=start, end=end,
+                       fields=fields or None)
+
+def restore_session():
+    """Resume the chats with the last logged turns; returns the cursor for paging in older ones."""
+    if not config.ENABLE_LOGGING or not config.SESSION_RESTORE_TURNS:
+        return None
+    try:
+        flush_chat_log()
+        entries, cursor = read_history_page(config.LOG_FILE_PATH, config.SESSION_RESTORE_TURNS)
+    except Exception as e:
+        print(f"Error restoring chat session: {e}")
+        return None
+    restore_chats(st.session_state.thinking_chat, st.session_state.direct_chat, entries)
+    return cursor
+
+def load_older_turns():
+    """Page the turns before the oldest one shown into the chat columns (display only).
+
+    At most SESSION_HISTORY_MAX_TURNS older turns are kept in the session.
+    """
+    limit = min(config.SESSION_HISTORY_PAGE_SIZE,
+                config.SESSION_HISTORY_MAX_TURNS - len(st.session_state.older_turns))
+    if limit <= 0:
+        return
+    try:
+        entries, st.session_state.history_cursor = read_history_page(
+            config.LOG_FILE_PATH, limit, st.session_state.history_cursor
+        )
+    except Exception as e:
+        print(f"Error loading older turns: {e}")
+        return
+    st.session_state.older_turns = entries + st.session_state.older_turns
+
 def clear_chats():
     st.session_state.thinking_chat.clear_messages()
     st.session_state.direct_chat.clear_messages()
+    st.session_state.older_turns = []
+    st.session_state.history_cursor = None
     st.rerun()
 
 st.title("🧠 LLM Dual Brain - Thinking vs Direct Chat")
@@ -470,11 +617,67 @@ if st.session_state.talking_mode_enabled:
         handle_mic_input()
     st.sidebar.caption("Click 'Speak' then talk. Your message will appear in the input box below and be processed.")
 
+with st.sidebar.expander("OpenAI Connection Pool"):
+    st.json(llm_client.get_pool_stats())
+if get_scheduler() is not None:
+    with st.sidebar.expander("OpenAI Rate Limiting"):
+        st.json(get_scheduler().stats())
+
+if get_plan_cache() is not None:
+    with st.sidebar.expander("Plan Cache"):
+        st.json(get_plan_cache().stats())
+if get_semantic_cache() is not None:
+    with st.sidebar.expander("Semantic Plan Cache"):
+        st.json(get_semantic_cache().stats())
+if config.ENABLE_LOGGING and get_log_writer() is not None:
+    with st.sidebar.expander("Chat Log Writer"):
+        st.json(get_log_writer().stats())
+if config.ENABLE_LOGGING and get_history_store() is not None:
+    with st.sidebar.expander("Search Chat History"):
+        search_text = st.text_input("Find turns containing", key="history_search_text")
+        search_fields = st.multiselect("In", SEARCH_FIELDS, key="history_search_fields")
+        search_window = st.selectbox("From", list(HISTORY_SEARCH_WINDOWS), key="history_search_window")
+        search_page = st.number_input("Page", min_value=1, value=1, step=1, key="history_search_page")
+        if search_text.strip():
+            window_days = HISTORY_SEARCH_WINDOWS[search_window]
+            page_size = config.HISTORY_SEARCH_PAGE_SIZE
+            results, total = get_history_store().search(
+                search_text, search_fields,
+                start=(datetime.now() - timedelta(days=window_days)).isoformat() if window_days else None,
+                limit=page_size, offset=(search_page - 1) * page_size
+            )
+            pages = max((total + page_size - 1) // page_size, 1)
+            st.caption(f"{total} matching turns, page {search_page} of {pages}.")
+            for result in results:
+                st.markdown(f"**{result['entry'].get('timestamp', '')[:16]}** {result['snippet']}")
+
+with st.sidebar.expander("LLM Latency & Tokens"):
+    metrics_summary = get_metrics().summary()
+    if metrics_summary:
+        st.caption("Seconds per call over the most recent calls (p50/p90/p95/p99).")
+        st.table(metrics_summary)
+    else:
+        st.caption("No LLM calls yet.")
+    if get_metrics().counters():
+        st.caption("Identical concurrent requests served by one upstream call.")
+        st.json(get_metrics().counters())
+
+if "history_cursor" not in st.session_state: # Where paging in older logged turns continues from
+    st.session_state.history_cursor = restore_session()
+if st.session_state.history_cursor is not None:
+    if len(st.session_state.older_turns) < config.SESSION_HISTORY_MAX_TURNS:
+        st.button("Load older turns", on_click=load_older_turns)
+    else:
+        st.caption(f"Showing the last {config.SESSION_HISTORY_MAX_TURNS} older turns; "
+                   "use \"Download Chat History\" below for the rest.")
+older_messages = [turn_messages(entry) for entry in st.session_state.older_turns]
+
 col1, col2 = st.columns(2)
 
 with col1:
     st.header("🤔 Thinking Chat")
-    thinking_messages = st.session_state.thinking_chat.get_messages()
+    thinking_messages = [m for thinking, _ in older_messages for m in thinking] + \
+        st.session_state.thinking_chat.get_messages()
     thinking_container = st.container(height=400, border=True)
     with thinking_container:
         for message in thinking_messages:
@@ -487,7 +690,8 @@ with col1:
                 st.markdown(f"**Assistant**: {message['content']}")
 with col2:
     st.header("💬 Direct Chat")
-    direct_messages = st.session_state.direct_chat.get_messages()
+    direct_messages = [m for _, direct in older_messages for m in direct] + \
+        st.session_state.direct_chat.get_messages()
     direct_container = st.container(height=400, border=True)
     with direct_container:
         for message in direct_messages:
@@ -495,6 +699,12 @@ with col2:
                 st.markdown(f"**You**: {message['content']}")
             elif message["role"] == "assistant":
                 st.markdown(f"**Assistant**: {message['content']}")
+
+if st.session_state.pending_stream_input:
+    pending_input = st.session_state.pending_stream_input
+    st.session_state.pending_stream_input = None
+    stream_general_llm_input(pending_input, thinking_container, direct_container)
+
 st.text_input(
     "Enter your message:",
     key="user_input",
@@ -506,18 +716,25 @@ with col_buttons1:
     if st.button("Clear Chats"):
         clear_chats()
 with col_buttons2:
-    if st.button("Download Chat History") and config.ENABLE_LOGGING:
-        if os.path.exists(config.LOG_FILE_PATH):
-            with open(config.LOG_FILE_PATH, "r") as f:
-                chat_data = f.read()
-            st.download_button(
-                label="Download JSON",
-                data=chat_data,
-                file_name="chat_history.json",
-                mime="application/json"
-            )
-        else:
-            st.error("Log file not found. Please send a message first to create it.")
+    if config.ENABLE_LOGGING:
+        with st.expander("Download Chat History"):
+            export_format = st.selectbox("Format", EXPORT_FORMATS, key="export_format")
+            export_gzip = st.checkbox("Compress (gzip)", value=True, key="export_gzip")
+            export_dates = st.date_input("Dates (all if empty)", value=(), key="export_dates")
+            export_fields = st.multiselect("Fields (all if empty)", EXPORT_FIELDS, key="export_fields")
+            if os.path.exists(config.LOG_FILE_PATH) or read_segment_index(config.LOG_FILE_PATH):
+                export_start = f"{export_dates[0].isoformat()}T00:00:00" if export_dates else None
+                export_end = f"{export_dates[-1].isoformat()}T23:59:59.999999" if export_dates else None
+                # Built only when the button is clicked, not on every rerun
+                st.download_button(
+                    label=f"Download {export_file_name(export_format, export_gzip)}",
+                    data=lambda: build_chat_export(export_format, export_gzip, export_start, export_end,
+                                                   export_fields),
+                    file_name=export_file_name(export_format, export_gzip),
+                    mime=export_mime_type(export_format, export_gzip)
+                )
+            else:
+                st.caption("No chat history yet. Send a message first to create it.")
 st.markdown("---")
 st.markdown("""
 **Project Information:**
@@ -2,10 +2,9 @@ import speech_recognition as sr
 # import pyttsx3 # No longer used
 import io
 # from google.cloud import texttospeech # No longer used, replaced by OpenAI TTS
-from openai import OpenAI
+from llm_client import get_openai_client, has_credentials
 import pygame
 import os # For environment variables, if not handled by config
-import config # To access OPENAI_API_KEY
 
 def listen_to_user():
     """Captures audio from the microphone and converts it to text."""
@@ -36,8 +35,8 @@ def speak_text(text, voice_id="alloy"): # Added voice_id parameter with default
         print("No text provided to speak.")
         return
 
-    if not config.OPENAI_API_KEY:
-        print("WARNING: OPENAI_API_KEY not found in config.")
+    if not has_credentials():
+        print("WARNING: OPENAI_API_KEY not found in config (and no OPENAI_BASE_URL or cassette replay is set).")
         print("OpenAI TTS will fail. Falling back to print output.")
         print(f"Message to speak: {text}")
         return
@@ -48,8 +47,8 @@ def speak_text(text, voice_id="alloy"): # Added voice_id parameter with default
             print("Initializing pygame mixer...")
             pygame.mixer.init()
 
-        client = OpenAI(api_key=config.OPENAI_API_KEY)
-        
+        client = get_openai_client()
+
         print(f"Synthesizing speech with OpenAI TTS (voice: {voice_id}) for: \"{text}\"")
         response = client.audio.speech.create(
             model="tts-1",  # Standard model
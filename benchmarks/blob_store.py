@@ -0,0 +1,142 @@
+"""Benchmark the content-addressed blob store on a synthetic chat log.
+
+Builds the same log twice, once plain and once with large fields moved into the blob
+store, and reports the bytes on disk (active log, blobs, and gzip segments after
+rotation) and the read-path cost of rehydrating entries:
+
+    python benchmarks/blob_store.py --entries 20000 --distinct-plans 200 --canned-rate 0.3
+
+Plans are drawn from --distinct-plans texts with Zipf-like popularity; a --canned-rate
+share of responses are repeated canned replies, the rest are unique.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import blob_store
+import log_segments
+from blob_store import BlobStore, blob_dir
+from utils import append_chat_log, iter_chat_history
+
+WORDS = ("plan", "answer", "email", "step", "consider", "user", "context", "detail", "summary", "result",
+         "first", "then", "finally", "check", "question", "reply", "inbox", "message", "search", "topic")
+
+
+def _text(rng: random.Random, chars: int) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)
+
+
+def synthetic_entries(count: int, distinct_plans: int, canned_rate: float, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    plans = [_text(rng, 1500) for _ in range(distinct_plans)]
+    weights = [1 / (rank + 1) for rank in range(distinct_plans)]
+    canned = [_text(rng, 600) for _ in range(20)]
+    entries = []
+    for i in range(count):
+        def response():
+            return rng.choice(canned) if rng.random() < canned_rate else _text(rng, 800)
+        entries.append({
+            "timestamp": f"2024-01-01T00:00:{i % 60:02d}.{i:06d}",
+            "user_input": _text(rng, 60),
+            "thinking_plan": rng.choices(plans, weights)[0],
+            "thinking_response": response(),
+            "direct_response": response(),
+        })
+    return entries
+
+
+def disk_usage(path: str) -> Dict[str, int]:
+    """Apparent bytes, allocated bytes and file count of a file or directory tree."""
+    usage = {"bytes": 0, "allocated_bytes": 0, "files": 0}
+    paths = [path] if os.path.isfile(path) else [os.path.join(d, f) for d, _, files in os.walk(path) for f in files]
+    for p in paths:
+        stat = os.stat(p)
+        usage["bytes"] += stat.st_size
+        usage["allocated_bytes"] += getattr(stat, "st_blocks", 0) * 512 or stat.st_size
+        usage["files"] += 1
+    return usage
+
+
+def build(path: str, entries: List[Dict[str, Any]], blobs, batch_size: int = 100) -> float:
+    started_at = time.perf_counter()
+    for i in range(0, len(entries), batch_size):
+        batch = entries[i:i + batch_size]
+        append_chat_log([blobs.dehydrate(e) for e in batch] if blobs else batch, path)
+    return time.perf_counter() - started_at
+
+
+def read_all(path: str) -> Dict[str, float]:
+    blob_store._blob_stores.clear()  # Start with a cold blob cache
+    started_at = time.perf_counter()
+    count = sum(1 for _ in iter_chat_history(path))
+    elapsed = time.perf_counter() - started_at
+    return {"entries": count, "seconds": round(elapsed, 3), "entries_per_second": round(count / elapsed)}
+
+
+def run(entries: List[Dict[str, Any]], directory: str, use_blobs: bool, min_size: int) -> Dict[str, Any]:
+    path = os.path.join(directory, "blobs" if use_blobs else "plain", "chat_history.jsonl")
+    os.makedirs(os.path.dirname(path))
+    blobs = BlobStore(blob_dir(path), min_size) if use_blobs else None
+    result = {"write_seconds": round(build(path, entries, blobs), 3), "log": disk_usage(path)}
+    if use_blobs:
+        result["blobs"] = disk_usage(blob_dir(path))
+        result["blob_stats"] = blobs.stats()
+    result["read"] = read_all(path)
+    log_segments.rotate(path)
+    result["gzip_segment_bytes"] = disk_usage(log_segments.segment_dir(path))["bytes"]
+    result["read_from_segment"] = read_all(path)
+    return result
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    plain, blobs = report["plain"], report["blobs"]
+    blob_total = blobs["log"]["bytes"] + blobs["blobs"]["bytes"]
+    blob_allocated = blobs["log"]["allocated_bytes"] + blobs["blobs"]["allocated_bytes"]
+    print(f"{'':<28}{'plain':>14}{'blob store':>14}")
+    print(f"{'log bytes':<28}{plain['log']['bytes']:>14,}{blobs['log']['bytes']:>14,}")
+    print(f"{'log + blobs bytes':<28}{plain['log']['bytes']:>14,}{blob_total:>14,}")
+    print(f"{'allocated on disk':<28}{plain['log']['allocated_bytes']:>14,}{blob_allocated:>14,}")
+    print(f"{'blob files':<28}{'':>14}{blobs['blobs']['files']:>14,}")
+    print(f"{'gzip segment + blobs bytes':<28}{plain['gzip_segment_bytes']:>14,}"
+          f"{blobs['gzip_segment_bytes'] + blobs['blobs']['bytes']:>14,}")
+    print(f"{'write seconds':<28}{plain['write_seconds']:>14}{blobs['write_seconds']:>14}")
+    print(f"{'read entries/s (JSONL)':<28}{plain['read']['entries_per_second']:>14,}"
+          f"{blobs['read']['entries_per_second']:>14,}")
+    print(f"{'read entries/s (segment)':<28}{plain['read_from_segment']['entries_per_second']:>14,}"
+          f"{blobs['read_from_segment']['entries_per_second']:>14,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chat log blob store.")
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--distinct-plans", type=int, default=200)
+    parser.add_argument("--canned-rate", type=float, default=0.3, help="Share of responses that are canned replies")
+    parser.add_argument("--min-size", type=int, default=256, help="Smallest field moved into the blob store")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    entries = synthetic_entries(args.entries, args.distinct_plans, args.canned_rate, args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        report = {"entries": args.entries, "plain": run(entries, directory, False, args.min_size),
+                  "blobs": run(entries, directory, True, args.min_size)}
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
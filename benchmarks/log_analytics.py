@@ -0,0 +1,126 @@
+"""Benchmark log_analytics on a synthetic chat log, timing loading and aggregation separately.
+
+Builds a log of --entries turns rotated into segments of about --segment-entries
+entries (the rest stay in the active log), then times:
+
+    parse      reading every entry as JSON, as the analytics did before columns were saved
+    cold load  load_columns() on segments without saved columns (built and saved on the way)
+    warm load  load_columns() once every segment has its columns saved
+    aggregate  summarize() over the loaded columns, per --group-by
+
+    python benchmarks/log_analytics.py --entries 200000 --segment-entries 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import log_segments
+from log_analytics import load_columns, summarize
+from log_columns import LogColumns
+from utils import append_chat_log, iter_chat_history
+
+MODELS = ("gpt-4o-mini", "gpt-4o", "gpt-3.5-turbo")
+
+
+def synthetic_entries(start: int, count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    entries = []
+    for i in range(start, start + count):
+        def call(model: str) -> Dict[str, Any]:
+            return {"model": model, "wall_time": rng.expovariate(1.0), "ttft": rng.expovariate(4.0),
+                    "prompt_tokens": rng.randint(50, 2000), "completion_tokens": rng.randint(10, 500),
+                    "error": "timeout" if rng.random() < 0.01 else None}
+        entries.append({
+            "timestamp": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}T12:00:00.{i:06d}",
+            "user_input": "question " * rng.randint(1, 20),
+            "thinking_plan": "plan " * rng.randint(10, 100),
+            "thinking_response": "answer " * rng.randint(10, 200),
+            "direct_response": "direct " * rng.randint(10, 100),
+            "metrics": {"plan": call(rng.choice(MODELS)), "final": call(rng.choice(MODELS)),
+                        "direct": call(MODELS[-1])},
+        })
+    return entries
+
+
+def build_log(path: str, entries: int, segment_entries: int, seed: int) -> None:
+    rng = random.Random(seed)
+    for start in range(0, entries, segment_entries):
+        count = min(segment_entries, entries - start)
+        append_chat_log(synthetic_entries(start, count, rng), path)
+        if start + count < entries:  # The last batch stays in the active log
+            log_segments.rotate(path)
+
+
+def _remove_columns(path: str) -> None:
+    directory = log_segments.segment_dir(path)
+    for name in os.listdir(directory):
+        if name.endswith(".columns.npz"):
+            os.remove(os.path.join(directory, name))
+
+
+def _timed(function):
+    started_at = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started_at
+
+
+def run(path: str, group_bys: List[str]) -> Dict[str, Any]:
+    def parse():
+        columns = LogColumns()
+        for entry in iter_chat_history(path):
+            columns.add_entry(entry)
+        return columns
+
+    _, parse_seconds = _timed(parse)
+    _remove_columns(path)
+    _, cold_seconds = _timed(lambda: load_columns(path))
+    columns, warm_seconds = _timed(lambda: load_columns(path))
+    results = {"entries": columns.entries, "segments": len(log_segments.read_index(path)),
+               "parse_seconds": round(parse_seconds, 3), "cold_load_seconds": round(cold_seconds, 3),
+               "warm_load_seconds": round(warm_seconds, 3), "aggregate_seconds": {}}
+    columns.arrays()  # Merge the chunks once, as the first summarize() would
+    for group_by in group_bys:
+        for unit in ("turn", "call"):
+            _, seconds = _timed(lambda: summarize(columns, unit, group_by.split("+"), "wall_time"))
+            results["aggregate_seconds"][f"{unit}:{group_by}"] = round(seconds, 4)
+    return results
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    print(f"{results['entries']} entries, {results['segments']} segments")
+    for name in ("parse", "cold_load", "warm_load"):
+        print(f"{name.replace('_', ' '):<28}{results[name + '_seconds']:>10.3f}s")
+    for name, seconds in results["aggregate_seconds"].items():
+        print(f"{'aggregate ' + name:<28}{seconds:>10.4f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading and aggregating the chat log.")
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--segment-entries", type=int, default=20000, help="Entries per rotated segment")
+    parser.add_argument("--group-by", default="day+brain,model,month+error",
+                        help="Comma-separated groupings; keys within one are joined with +")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "chat_history.jsonl")
+        build_log(path, args.entries, args.segment_entries, args.seed)
+        results = run(path, [g.strip() for g in args.group_by.split(",") if g.strip()])
+    print_report(results)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
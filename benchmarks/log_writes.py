@@ -0,0 +1,110 @@
+"""Benchmark chat log appends under N concurrent writer processes.
+
+Each writer process appends --entries log entries of about --entry-size bytes to the
+same JSONL file, one append per entry. Modes:
+
+    buffered      open(path, "a") and a buffered write, without locking (no safety)
+    locked        utils.append_chat_log: one O_APPEND write under the log's file lock
+    locked-fsync  the same, with fsync after every append
+
+For each mode and writer count the report shows entries/s and whether the log came out
+intact (every line parses and every entry is present), e.g.:
+
+    python benchmarks/log_writes.py --writers 1,4,8 --entries 2000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from utils import append_chat_log
+
+MODES = ("buffered", "locked", "locked-fsync")
+
+
+def _buffered_append(entry: Dict[str, Any], path: str) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def _writer(path: str, mode: str, writer_id: int, entries: int, entry_size: int, start) -> None:
+    text = "x" * entry_size
+    start.wait()
+    for i in range(entries):
+        entry = {"timestamp": "2024-01-01T00:00:00", "writer": writer_id, "i": i, "user_input": text}
+        if mode == "buffered":
+            _buffered_append(entry, path)
+        else:
+            append_chat_log(entry, path, fsync=mode == "locked-fsync")
+
+
+def check_log(path: str, writers: int, entries: int) -> Dict[str, int]:
+    """Count unreadable lines and missing entries in a benchmark log."""
+    seen, corrupt = set(), 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                seen.add((entry["writer"], entry["i"]))
+            except (ValueError, KeyError, TypeError):
+                corrupt += 1
+    return {"corrupt_lines": corrupt, "missing_entries": writers * entries - len(seen)}
+
+
+def run(mode: str, writers: int, entries: int, entry_size: int, directory: str) -> Dict[str, Any]:
+    path = os.path.join(directory, f"{mode}-{writers}.jsonl")
+    start = multiprocessing.Event()
+    processes = [multiprocessing.Process(target=_writer, args=(path, mode, w, entries, entry_size, start))
+                 for w in range(writers)]
+    for process in processes:
+        process.start()
+    started_at = time.perf_counter()
+    start.set()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started_at
+    return {"mode": mode, "writers": writers, "entries": writers * entries, "seconds": round(elapsed, 3),
+            "entries_per_second": round(writers * entries / elapsed), **check_log(path, writers, entries)}
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    header = f"{'mode':<14}{'writers':>8}{'entries':>9}{'seconds':>9}{'entries/s':>11}{'corrupt':>9}{'missing':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:<14}{r['writers']:>8}{r['entries']:>9}{r['seconds']:>9.3f}{r['entries_per_second']:>11}"
+              f"{r['corrupt_lines']:>9}{r['missing_entries']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent chat log appends.")
+    parser.add_argument("--writers", default="1,4,8", help="Comma-separated writer process counts")
+    parser.add_argument("--entries", type=int, default=1000, help="Entries appended by each writer")
+    parser.add_argument("--entry-size", type=int, default=2000, help="Approximate bytes per entry")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Comma-separated: {','.join(MODES)}")
+    parser.add_argument("--report", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            if mode not in MODES:
+                parser.error(f"Unknown mode: {mode}")
+            for writers in [int(w) for w in args.writers.split(",")]:
+                results.append(run(mode, writers, args.entries, args.entry_size, directory))
+    print_report(results)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Benchmark the thinking and direct pipelines by replaying a JSONL corpus of prompts.
+
+Runs against an in-process fake OpenAI-compatible server by default, so it works
+without network access:
+
+    python benchmarks/pipelines.py --corpus benchmarks/prompts.jsonl --concurrency 4
+
+Use --base-url to point at another OpenAI-compatible backend instead. The chats use
+the benchmark's own client, so no OPENAI_API_KEY is needed for the fake server or a
+local backend.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+import httpx
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import openai
+
+import config
+from direct_chat import DirectChat
+from thinking_chat import ThinkingChat
+from fake_openai_server import FakeOpenAIServer
+from hedging import Hedger
+from metrics import get_metrics
+
+# USD per 1K (prompt, completion) tokens; override with --prices
+MODEL_PRICES_PER_1K = {
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+PERCENTILES = (50, 95, 99)
+
+
+def load_corpus(path: str) -> List[str]:
+    """Read prompts from a JSONL file of {"prompt": ...} objects or bare JSON strings."""
+    prompts = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                prompts.append(item["prompt"] if isinstance(item, dict) else str(item))
+    return prompts
+
+
+def run_thinking(client, prompt: str, stream: bool, use_caches: bool, hedger=None) -> List[Dict[str, Any]]:
+    chat = ThinkingChat(client, use_caches=use_caches)
+    chat.hedger = hedger
+    started_at = time.perf_counter()
+    if stream:
+        for _ in chat.process_message_stream(prompt):
+            pass
+    else:
+        chat.process_message(prompt)
+    total = {"stage": "thinking.total", "wall_time": time.perf_counter() - started_at}
+    return [total] + [{**r, "stage": f"thinking.{r['stage']}"} for r in chat.last_metrics.values()
+                      if not r.get("cached")]
+
+
+def run_direct(client, prompt: str, stream: bool, use_caches: bool, hedger=None) -> List[Dict[str, Any]]:
+    chat = DirectChat(client)
+    chat.hedger = hedger
+    started_at = time.perf_counter()
+    if stream:
+        for _ in chat.process_message_stream(prompt):
+            pass
+    else:
+        chat.process_message(prompt)
+    total = {"stage": "direct.total", "wall_time": time.perf_counter() - started_at}
+    return [total] + [{**r, "stage": f"direct.{r['stage']}"} for r in chat.last_metrics.values()]
+
+
+PIPELINES = {"thinking": run_thinking, "direct": run_direct}
+
+
+def percentiles(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {f"p{q}": None for q in PERCENTILES}
+    array = np.asarray(values, dtype=float)
+    return {f"p{q}": round(float(v), 4) for q, v in zip(PERCENTILES, np.percentile(array, PERCENTILES))}
+
+
+def summarize(records: List[Dict[str, Any]], prices: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Group call records by stage and compute latency percentiles, token rates and cost."""
+    stages: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        stages.setdefault(record["stage"], []).append(record)
+
+    summary = {}
+    for stage, stage_records in sorted(stages.items()):
+        ok = [r for r in stage_records if not r.get("error")]
+        prompt_tokens = sum(r.get("prompt_tokens") or 0 for r in ok)
+        completion_tokens = sum(r.get("completion_tokens") or 0 for r in ok)
+        wall_time = sum(r["wall_time"] for r in ok if "completion_tokens" in r)
+        cost = 0.0
+        for r in ok:
+            prompt_price, completion_price = prices.get(r.get("model"), (0.0, 0.0))
+            cost += ((r.get("prompt_tokens") or 0) * prompt_price + (r.get("completion_tokens") or 0) * completion_price) / 1000
+        summary[stage] = {
+            "calls": len(stage_records),
+            "errors": len(stage_records) - len(ok),
+            "wall_time": percentiles([r["wall_time"] for r in ok]),
+            "ttft": percentiles([r["ttft"] for r in ok if r.get("ttft") is not None]),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_per_second": round(completion_tokens / wall_time, 1) if wall_time else None,
+            "cost_usd": round(cost, 6),
+        }
+    return summary
+
+
+def run_benchmark(prompts: List[str], base_url: str, pipelines: List[str], concurrency: int,
+                  repeat: int, stream: bool, use_caches: bool, prices: Dict[str, Any],
+                  hedger=None) -> Dict[str, Any]:
+    client = openai.OpenAI(
+        base_url=base_url, api_key=config.OPENAI_API_KEY or "benchmark", max_retries=0,
+        http_client=openai.DefaultHttpxClient(
+            limits=httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+        )
+    )
+    jobs = [(name, prompt) for _ in range(repeat) for prompt in prompts for name in pipelines]
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda job: PIPELINES[job[0]](client, job[1], stream, use_caches, hedger), jobs))
+    elapsed = time.perf_counter() - started_at
+
+    records = [record for result in results for record in result]
+    stages = summarize(records, prices)
+    completion_tokens = sum(s["completion_tokens"] for name, s in stages.items() if not name.endswith(".total"))
+    return {
+        "settings": {"base_url": base_url, "pipelines": pipelines, "prompts": len(prompts), "repeat": repeat,
+                     "concurrency": concurrency, "stream": stream, "use_caches": use_caches, "hedging": bool(hedger),
+                     "thinking_model": config.THINKING_MODEL, "direct_model": config.DIRECT_MODEL,
+                     "thinking_mode": config.THINKING_MODE},
+        "elapsed_seconds": round(elapsed, 3),
+        "turns": len(jobs),
+        "turns_per_second": round(len(jobs) / elapsed, 2),
+        "completion_tokens_per_second": round(completion_tokens / elapsed, 1),
+        "total_cost_usd": round(sum(s["cost_usd"] for s in stages.values()), 6),
+        "stages": stages,
+        "counters": get_metrics().counters(),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['turns']} turns in {report['elapsed_seconds']}s "
+          f"({report['turns_per_second']} turns/s, {report['completion_tokens_per_second']} tokens/s, "
+          f"est. ${report['total_cost_usd']})")
+    header = f"{'stage':<24}{'calls':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'ttft p50':>10}{'tok/s':>8}{'cost $':>11}"
+    print(header)
+    print("-" * len(header))
+    for stage, s in report["stages"].items():
+        wall, ttft = s["wall_time"], s["ttft"]
+        fmt = lambda v: "-" if v is None else f"{v:.3f}"
+        print(f"{stage:<24}{s['calls']:>6}{s['errors']:>5}{fmt(wall['p50']):>9}{fmt(wall['p95']):>9}"
+              f"{fmt(wall['p99']):>9}{fmt(ttft['p50']):>10}{fmt(s['tokens_per_second']):>8}{s['cost_usd']:>11.6f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the thinking and direct chat pipelines.")
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "prompts.jsonl"),
+                        help="JSONL file of prompts")
+    parser.add_argument("--pipelines", default="thinking,direct", help="Comma-separated: thinking,direct")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the corpus this many times")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming APIs")
+    parser.add_argument("--use-caches", action="store_true", help="Keep plan caches and the planner bypass on")
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow calls (see hedging.py)")
+    parser.add_argument("--hedge-fallback-model", help="Send hedges to this model instead of the original")
+    parser.add_argument("--base-url", help="OpenAI-compatible backend; defaults to an in-process fake server")
+    parser.add_argument("--fake-latency", default="fixed:0.05",
+                        help="Fake server: time to first token, e.g. 0.05, uniform:0.05:0.2 or lognormal:0.3:0.5")
+    parser.add_argument("--fake-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--fake-error-rate", type=float, default=0.0,
+                        help="Fake server: fraction of requests answered with 429 or 500 (split evenly)")
+    parser.add_argument("--fake-seed", type=int, default=0, help="Fake server: seed for latencies and errors")
+    parser.add_argument("--prices", help="JSON file mapping model to [prompt, completion] USD per 1K tokens")
+    parser.add_argument("--report", default="bench_output.json", help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    prices = dict(MODEL_PRICES_PER_1K)
+    if args.prices:
+        with open(args.prices, "r") as f:
+            prices.update({model: tuple(p) for model, p in json.load(f).items()})
+    prompts = load_corpus(args.corpus)
+    report_path = os.path.abspath(args.report)
+    os.chdir(ROOT)  # ThinkingChat loads prompts/ relative to the working directory
+    pipelines = [p.strip() for p in args.pipelines.split(",") if p.strip()]
+
+    fake_server = None
+    base_url = args.base_url
+    if not base_url:
+        fake_server = FakeOpenAIServer(
+            latency=args.fake_latency, tokens_per_second=args.fake_tokens_per_second,
+            error_rate_429=args.fake_error_rate / 2, error_rate_500=args.fake_error_rate / 2, seed=args.fake_seed
+        ).start()
+        base_url = fake_server.base_url
+    try:
+        hedger = None
+        if args.hedge:
+            hedger = Hedger(config.HEDGE_PERCENTILE, config.HEDGE_MIN_SAMPLES, config.HEDGE_MIN_DELAY_SECONDS,
+                            config.HEDGE_MAX_RATE, args.hedge_fallback_model or config.HEDGE_FALLBACK_MODEL)
+        report = run_benchmark(prompts, base_url, pipelines, args.concurrency, args.repeat,
+                               args.stream, args.use_caches, prices, hedger)
+    finally:
+        if fake_server:
+            fake_server.stop()
+
+    print_report(report)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Content-addressed storage of large chat log fields.
+
+The same plans and canned replies (email confirmations, error messages) are logged
+over and over. With the blob store on, a field in BLOB_FIELDS of at least min_size
+characters that has been logged before is stored once under the hash of its content,
+and the log line keeps {"$blob": "<hash>"} in its place. A text's first occurrence is
+logged inline: most responses are unique, and a blob file per unique response would
+take more space (a filesystem block each) than it saves. Readers of the log
+(utils.iter_chat_history) put the text back transparently, with an LRU cache since
+the same blobs keep coming back.
+
+Blobs live in "<log path>.blobs/", so rotated segments and exports keep resolving them.
+Blobs are never deleted: the log is append-only, so every blob stays referenced.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any
+
+# Fields that may be moved into the blob store
+BLOB_FIELDS = ("thinking_plan", "thinking_response", "direct_response", "handler_response")
+BLOB_KEY = "$blob"
+# Hex digits of the SHA-256 kept as the blob's name (128 bits)
+HASH_LENGTH = 32
+
+
+def blob_dir(file_path: str) -> str:
+    return file_path + ".blobs"
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and BLOB_KEY in value
+
+
+def has_blob_refs(entry: Dict[str, Any]) -> bool:
+    return any(is_blob_ref(entry.get(field)) for field in BLOB_FIELDS)
+
+
+class BlobStore:
+    """Stores large text fields once each, named by their content hash."""
+
+    def __init__(self, directory: str, min_size: int = 256, fsync: bool = False, cache_size: int = 1024,
+                 seen_size: int = 100000):
+        self.directory = directory
+        self.min_size = min_size
+        self.fsync = fsync
+        self.cache_size = cache_size
+        self.seen_size = seen_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        # Hashes of texts logged inline recently; a second occurrence moves the text into a blob
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"blobs_written": 0, "fields_deduplicated": 0, "cache_hits": 0, "cache_misses": 0}
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:HASH_LENGTH]
+
+    def put(self, text: str) -> str:
+        """Store text (if not already stored) and return its hash."""
+        data = text.encode("utf-8")
+        digest = self.digest(text)
+        path = self._path(digest)
+        if os.path.exists(path):
+            with self._lock:
+                self._stats["fields_deduplicated"] += 1
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written to a temp file and renamed, so a blob is either complete or absent
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        with self._lock:
+            self._stats["blobs_written"] += 1
+        return digest
+
+    def get(self, digest: str) -> str:
+        with self._lock:
+            text = self._cache.get(digest)
+            if text is not None:
+                self._cache.move_to_end(digest)
+                self._stats["cache_hits"] += 1
+                return text
+            self._stats["cache_misses"] += 1
+        with open(self._path(digest), "rb") as f:
+            text = f.read().decode("utf-8")
+        with self._lock:
+            self._cache[digest] = text
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    def _repeated(self, text: str) -> bool:
+        """True if text is already a blob or was logged recently; otherwise remember it."""
+        digest = self.digest(text)
+        if os.path.exists(self._path(digest)):
+            return True
+        with self._lock:
+            if digest in self._seen:
+                del self._seen[digest]
+                return True
+            self._seen[digest] = None
+            if len(self._seen) > self.seen_size:
+                self._seen.popitem(last=False)
+        return False
+
+    def dehydrate(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Return entry with its large, repeated fields replaced by blob references (a copy if any are)."""
+        repeated = [field for field in BLOB_FIELDS
+                    if isinstance(entry.get(field), str) and len(entry[field]) >= self.min_size
+                    and self._repeated(entry[field])]
+        if not repeated:
+            return entry
+        return {**entry, **{field: {BLOB_KEY: self.put(entry[field])} for field in repeated}}
+
+    def hydrate(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Return entry with its blob references replaced by the stored text."""
+        refs = [field for field in BLOB_FIELDS if is_blob_ref(entry.get(field))]
+        if not refs:
+            return entry
+        hydrated = dict(entry)
+        for field in refs:
+            try:
+                hydrated[field] = self.get(entry[field][BLOB_KEY])
+            except OSError as e:
+                print(f"Missing chat log blob for {field}: {e}")
+                hydrated[field] = None
+        return hydrated
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+_blob_stores: Dict[str, BlobStore] = {}
+_blob_stores_lock = threading.Lock()
+
+
+def blob_store_for(file_path: str) -> BlobStore:
+    """Return the process-wide blob store that readers of the log at file_path share (for its cache)."""
+    directory = blob_dir(file_path)
+    with _blob_stores_lock:
+        if directory not in _blob_stores:
+            _blob_stores[directory] = BlobStore(directory)
+        return _blob_stores[directory]
+
+
+def hydrate_entry(entry: Dict[str, Any], file_path: str) -> Dict[str, Any]:
+    """Resolve any blob references in an entry read from the log at file_path."""
+    if not has_blob_refs(entry):
+        return entry
+    return blob_store_for(file_path).hydrate(entry)
@@ -0,0 +1,142 @@
+"""Cancellation of a session's in-flight chat turn.
+
+Each turn gets a CancelToken. The chats run inside cancel_scope(token), so while the
+turn is live their OpenAI streams are registered to be closed on cancellation and
+their history additions are recorded. Cancelling the token closes those streams
+(freeing the workers reading them), stops further OpenAI requests of the turn, and
+removes what the turn already added to the chat histories, so a half-finished turn
+leaves no trace.
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class TurnCancelled(Exception):
+    """Raised when the current turn has been cancelled (e.g. by new user input)."""
+
+    def __init__(self, message: str = "Turn cancelled by new input"):
+        super().__init__(message)
+
+
+def _remove(additions: List[Tuple[list, Any]]) -> None:
+    for container, item in reversed(additions):
+        for i in range(len(container) - 1, -1, -1):
+            if container[i] is item:
+                del container[i]
+                break
+
+
+class CancelToken:
+    """Cancels one turn (or, for a child token, one part of it). Completed turns can no longer be cancelled."""
+
+    def __init__(self, parent: Optional["CancelToken"] = None):
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._additions: List[Tuple[list, Any]] = []
+        self.parent = parent
+        self.cancelled = False
+        self.completed = False
+
+    def child(self) -> "CancelToken":
+        """A token for one part of this turn (e.g. one brain), cancelled with the turn or on its own.
+
+        Completing the child hands its history additions to this token, so they are
+        still rolled back if the whole turn is cancelled later.
+        """
+        child = CancelToken(parent=self)
+        self.on_cancel(child.cancel)
+        return child
+
+    def cancel(self) -> bool:
+        """Cancel the turn; returns False if it had already completed or been cancelled."""
+        with self._lock:
+            if self.cancelled or self.completed:
+                return False
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+            _remove(self._additions)
+            self._additions = []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error while cancelling turn: {e}")
+        return True
+
+    def complete(self) -> None:
+        """Mark the turn finished; its history additions are kept from now on (or passed to the parent)."""
+        with self._lock:
+            if self.completed or self.cancelled:
+                self.completed = True
+                return
+            self.completed = True
+            self._callbacks = []
+            additions, self._additions = self._additions, []
+        if self.parent is not None:
+            self.parent._adopt(additions)
+
+    def _adopt(self, additions: List[Tuple[list, Any]]) -> None:
+        with self._lock:
+            if self.cancelled:
+                _remove(additions)
+            elif not self.completed:
+                self._additions.extend(additions)
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Run callback when the turn is cancelled (immediately if it already is)."""
+        with self._lock:
+            if not self.cancelled:
+                if not self.completed:
+                    self._callbacks.append(callback)
+                return
+        callback()
+
+    def append(self, container: list, item: Any) -> None:
+        """Append item to container as part of this turn; dropped if the turn was cancelled."""
+        with self._lock:
+            if self.cancelled:
+                return
+            container.append(item)
+            if not self.completed:
+                self._additions.append((container, item))
+
+
+_current_token = contextvars.ContextVar("cancel_token", default=None)
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken]):
+    """Run the enclosed chat calls as part of the turn identified by token."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+def raise_if_cancelled() -> None:
+    token = current_token()
+    if token is not None and token.cancelled:
+        raise TurnCancelled()
+
+
+def close_on_cancel(stream) -> None:
+    """Close stream if the current turn is cancelled, unblocking whoever is reading it."""
+    token = current_token()
+    if token is not None:
+        token.on_cancel(stream.close)
+
+
+def append_to_turn(container: list, item: Any) -> None:
+    """Append item to a chat history, as part of the current turn if there is one."""
+    token = current_token()
+    if token is None:
+        container.append(item)
+    else:
+        token.append(container, item)
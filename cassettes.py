@@ -0,0 +1,278 @@
+"""Record/replay of OpenAI and Gmail HTTP traffic.
+
+In record mode every request/response pair is appended to a gzipped JSONL cassette,
+together with the time spent waiting on the network. In replay mode the same requests
+are answered from the cassette, with either the recorded or zero latency, so a session
+can be re-run offline and the app's own overhead profiled apart from network time.
+
+OpenAI calls are captured by an httpx transport (see llm_client.py); Gmail calls by an
+httplib2.Http handed to googleapiclient (see email_utils.authenticate_gmail).
+"""
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Iterator
+
+import httplib2
+import httpx
+
+import config
+from utils import ensure_directory_exists
+
+# Hop-by-hop headers that do not describe the recorded body
+_SKIPPED_HEADERS = {"transfer-encoding", "connection", "keep-alive"}
+
+
+def _encode(data: bytes) -> Dict[str, str]:
+    try:
+        return {"text": data.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(data).decode("ascii")}
+
+
+def _decode(item: Dict[str, str]) -> bytes:
+    if "text" in item:
+        return item["text"].encode("utf-8")
+    return base64.b64decode(item["base64"])
+
+
+def request_key(kind: str, method: str, url: str, body: Optional[bytes]) -> str:
+    """Identify a request by its method, URL and body (JSON bodies are canonicalized)."""
+    body = body or b""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        pass
+    digest = hashlib.sha256()
+    for part in (kind, method.upper(), url):
+        digest.update(part.encode("utf-8") + b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class CassetteMiss(httpx.TransportError):
+    """Raised in replay mode for a request that is not on the cassette."""
+
+
+class Cassette:
+    """A gzipped JSONL file of recorded interactions, opened for recording or replay.
+
+    Each line holds one interaction: the request key, method and URL, the response
+    status and headers, the seconds until the response headers arrived ("latency")
+    and the body as a list of chunks, each with the seconds spent waiting for it.
+    """
+
+    def __init__(self, path: str, mode: str, replay_latency: str = "original"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        self._file = None
+        self._interactions: Dict[str, deque] = {}
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        if mode == "replay":
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            print(f"Cassette not found: {self.path}")
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self._interactions.setdefault(interaction["key"], deque()).append(interaction)
+
+    def record(self, interaction: Dict[str, Any]) -> None:
+        line = json.dumps(interaction, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                ensure_directory_exists(os.path.dirname(self.path) or ".")
+                # Appending adds a gzip member; readers see one continuous stream
+                self._file = gzip.open(self.path, "at", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()  # Keeps the cassette readable if the process dies
+            self.stats["recorded"] += 1
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the next recorded interaction for key; the last one is reused once they run out."""
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                self.stats["misses"] += 1
+                return None
+            self.stats["replayed"] += 1
+            return interactions.popleft() if len(interactions) > 1 else interactions[0]
+
+    def wait(self, seconds: float) -> None:
+        if self.replay_latency == "original" and seconds > 0:
+            time.sleep(seconds)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def transport(self, inner: Optional[httpx.BaseTransport] = None) -> httpx.BaseTransport:
+        """Return an httpx transport that records through inner, or replays."""
+        if self.mode == "record":
+            return RecordingTransport(self, inner or httpx.HTTPTransport())
+        return ReplayTransport(self)
+
+    def http(self) -> httplib2.Http:
+        """Return an httplib2.Http for googleapiclient that records or replays."""
+        if self.mode == "record":
+            return RecordingHttp(self)
+        return ReplayHttp(self)
+
+
+# --- OpenAI (httpx) -----------------------------------------------------------------
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """Passes the response body through, timing each chunk, and records it when closed."""
+
+    def __init__(self, cassette: Cassette, interaction: Dict[str, Any], stream: httpx.SyncByteStream):
+        self.cassette = cassette
+        self.interaction = interaction
+        self.stream = stream
+        self.chunks: List[Dict[str, Any]] = []
+        self.closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        iterator = iter(self.stream)
+        while True:
+            started_at = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            # Only time blocked on the network counts, not time the app spends between reads
+            self.chunks.append({"wait": round(time.perf_counter() - started_at, 4), **_encode(chunk)})
+            yield chunk
+
+    def close(self) -> None:
+        self.stream.close()
+        if not self.closed:
+            self.closed = True
+            self.cassette.record({**self.interaction, "chunks": self.chunks})
+
+
+class RecordingTransport(httpx.BaseTransport):
+    def __init__(self, cassette: Cassette, transport: httpx.BaseTransport):
+        self.cassette = cassette
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        started_at = time.perf_counter()
+        response = self.transport.handle_request(request)
+        interaction = {
+            "kind": "openai",
+            "key": request_key("openai", request.method, str(request.url), body),
+            "method": request.method,
+            "url": str(request.url),
+            "status": response.status_code,
+            "headers": [[k, v] for k, v in response.headers.multi_items() if k.lower() not in _SKIPPED_HEADERS],
+            "latency": round(time.perf_counter() - started_at, 4),
+        }
+        return httpx.Response(
+            response.status_code, headers=response.headers, extensions=response.extensions,
+            stream=_RecordingStream(self.cassette, interaction, response.stream)
+        )
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, cassette: Cassette, chunks: List[Dict[str, Any]]):
+        self.cassette = cassette
+        self.chunks = chunks
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.chunks:
+            self.cassette.wait(chunk["wait"])
+            yield _decode(chunk)
+
+
+class ReplayTransport(httpx.BaseTransport):
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        interaction = self.cassette.lookup(request_key("openai", request.method, str(request.url), request.read()))
+        if interaction is None:
+            raise CassetteMiss(f"No recorded response for {request.method} {request.url}", request=request)
+        self.cassette.wait(interaction["latency"])
+        return httpx.Response(interaction["status"], headers=interaction["headers"],
+                              stream=_ReplayStream(self.cassette, interaction["chunks"]))
+
+
+# --- Gmail (httplib2) ---------------------------------------------------------------
+
+
+class RecordingHttp(httplib2.Http):
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        started_at = time.perf_counter()
+        response, content = super().request(uri, method, body, headers, *args, **kwargs)
+        latency = time.perf_counter() - started_at
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.cassette.record({
+            "kind": "gmail",
+            "key": request_key("gmail", method, uri, body),
+            "method": method,
+            "url": uri,
+            "status": response.status,
+            "headers": [[k, v] for k, v in response.items() if k.lower() not in _SKIPPED_HEADERS],
+            "latency": round(latency, 4),
+            "chunks": [{"wait": 0.0, **_encode(content or b"")}],
+        })
+        return response, content
+
+
+class ReplayHttp(httplib2.Http):
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        interaction = self.cassette.lookup(request_key("gmail", method, uri, body))
+        if interaction is None:
+            raise httplib2.HttpLib2Error(f"No recorded response for {method} {uri}")
+        self.cassette.wait(interaction["latency"])
+        info = dict(interaction["headers"])
+        info["status"] = str(interaction["status"])
+        return httplib2.Response(info), b"".join(_decode(chunk) for chunk in interaction["chunks"])
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Return the process-wide cassette, or None when record/replay is off."""
+    global _cassette
+    if config.CASSETTE_MODE not in ("record", "replay"):
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(config.CASSETTE_PATH, config.CASSETTE_MODE, config.CASSETTE_REPLAY_LATENCY)
+            atexit.register(_cassette.close)
+        return _cassette
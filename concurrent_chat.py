@@ -0,0 +1,283 @@
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Tuple, Any, Iterator, Optional
+
+import config
+from cancellation import CancelToken, TurnCancelled, append_to_turn, cancel_scope
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx, add_script_run_ctx
+except ImportError:  # Older Streamlit versions or running outside Streamlit
+    get_script_run_ctx = None
+    add_script_run_ctx = None
+
+# Extra time allowed on top of a brain's own request timeout before giving up on it.
+# The OpenAI calls enforce the timeout themselves; this only covers work around them
+# (e.g. Gmail lookups in ThinkingChat.handle_email_query).
+JOIN_GRACE_SECONDS = 5.0
+# How often a waiting script thread checks whether the user submitted new input
+CANCEL_POLL_SECONDS = 0.1
+
+_executor = None
+_rerun_check_warned = False
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide thread pool shared by all Streamlit sessions."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=config.BRAIN_WORKERS,
+                thread_name_prefix="brain"
+            )
+        return _executor
+
+
+def _with_script_ctx(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap fn so it runs with the caller's Streamlit script context (for st.session_state access)
+    and context variables (e.g. the request priority)."""
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return context.run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+def _rerun_requested() -> bool:
+    """True if Streamlit has a rerun or stop pending for this session, i.e. the user submitted new input."""
+    global _rerun_check_warned
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+    if ctx is None:
+        return False
+    # Streamlit has no public API for this; read the script runner's pending request.
+    state = getattr(getattr(ctx, "script_requests", None), "_state", None)
+    if state is None:
+        if not _rerun_check_warned:
+            _rerun_check_warned = True
+            print("WARNING: this Streamlit version does not expose pending script requests; "
+                  "new input will not cancel a running turn.")
+        return False
+    return getattr(state, "name", "CONTINUE") != "CONTINUE"
+
+
+def _check_cancelled(cancel_token: Optional[CancelToken]) -> None:
+    """Cancel the turn if new input is waiting, and raise TurnCancelled if it is cancelled."""
+    if cancel_token is None:
+        return
+    if _rerun_requested():
+        cancel_token.cancel()
+    if cancel_token.cancelled:
+        raise TurnCancelled()
+
+
+def _in_turn(fn: Callable[..., Any], cancel_token: Optional[CancelToken]) -> Callable[..., Any]:
+    def wrapper(*args, **kwargs):
+        with cancel_scope(cancel_token):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def _brain_token(cancel_token: Optional[CancelToken]) -> CancelToken:
+    """A token for one brain's part of the turn, so a brain that misses its deadline can be cancelled alone."""
+    return cancel_token.child() if cancel_token is not None else CancelToken()
+
+
+def _record_failure(chat, user_input: str, message: str, cancel_token: Optional[CancelToken]) -> None:
+    """Put a failed brain's turn in its history as the question and the error, like the chats do for API errors."""
+    with cancel_scope(cancel_token):
+        append_to_turn(chat.messages, {"role": "user", "content": user_input})
+        append_to_turn(chat.messages, {"role": "system", "content": message})
+
+
+def _join(future, started_at: float, timeout: float, brain_name: str, default: Any,
+          cancel_token: Optional[CancelToken] = None, brain_token: Optional[CancelToken] = None) -> Any:
+    """Wait for a brain's result, returning default (an error message) if it misses its deadline.
+
+    A brain that misses its deadline or fails has its brain_token cancelled: its stream
+    is closed, its history additions are removed and anything it adds later is dropped.
+    Raises TurnCancelled (and cancels the future if it has not started) if the turn is cancelled meanwhile.
+    """
+    deadline = started_at + timeout + JOIN_GRACE_SECONDS
+    try:
+        while True:
+            remaining = max(deadline - time.monotonic(), 0)
+            try:
+                wait = remaining if cancel_token is None else min(remaining, CANCEL_POLL_SECONDS)
+                result = future.result(timeout=wait)
+                _check_cancelled(cancel_token)  # A cancelled brain may return early with whatever it had
+                break
+            except FutureTimeoutError:
+                if remaining <= CANCEL_POLL_SECONDS or cancel_token is None:
+                    raise
+                _check_cancelled(cancel_token)
+    except FutureTimeoutError:
+        print(f"{brain_name} timed out after {timeout} seconds")
+    except TurnCancelled:
+        future.cancel()
+        raise
+    except Exception as e:
+        print(f"{brain_name} failed: {e}")
+    else:
+        if brain_token is not None:
+            brain_token.complete()
+        return result
+    future.cancel()
+    if brain_token is not None:
+        brain_token.cancel()
+    return default
+
+
+def process_dual_brain(thinking_chat, direct_chat, user_input: str,
+                       cancel_token: Optional[CancelToken] = None) -> Tuple[str, str, str]:
+    """Run ThinkingChat and DirectChat on the same input concurrently.
+
+    Each chat only touches its own history, so the two can run side by side while
+    each history stays in user -> plan -> assistant order.
+
+    With a cancel_token, new input in the session (or cancelling the token) aborts the
+    turn: TurnCancelled is raised and the turn's history additions are rolled back.
+    A brain that misses its deadline is cancelled on its own, so its late answer never
+    reaches its history; the history gets the question and the timeout error instead.
+
+    Returns:
+        A tuple of (thinking_plan, thinking_response, direct_response).
+    """
+    executor = get_executor()
+    started_at = time.monotonic()
+    thinking_token, direct_token = _brain_token(cancel_token), _brain_token(cancel_token)
+    thinking_future = executor.submit(_with_script_ctx(_in_turn(thinking_chat.process_message, thinking_token)),
+                                      user_input)
+    direct_future = executor.submit(_with_script_ctx(_in_turn(direct_chat.process_message, direct_token)),
+                                    user_input)
+
+    thinking_timeout = config.THINKING_TIMEOUT_SECONDS
+    timeout_message = f"Error generating response: timed out after {thinking_timeout} seconds"
+    try:
+        thinking_plan, thinking_response = _join(
+            thinking_future, started_at, thinking_timeout, "ThinkingChat", (timeout_message, timeout_message),
+            cancel_token, thinking_token
+        )
+        if thinking_token.cancelled:
+            _record_failure(thinking_chat, user_input, thinking_response, cancel_token)
+
+        direct_timeout = config.DIRECT_TIMEOUT_SECONDS
+        direct_response = _join(
+            direct_future, started_at, direct_timeout, "DirectChat",
+            f"Error generating response: timed out after {direct_timeout} seconds", cancel_token, direct_token
+        )
+        if direct_token.cancelled:
+            _record_failure(direct_chat, user_input, direct_response, cancel_token)
+    except TurnCancelled:
+        cancel_token.cancel()
+        direct_future.cancel()
+        raise
+
+    return thinking_plan, thinking_response, direct_response
+
+
+# Which brain produces each kind of stream event
+_EVENT_BRAINS = {"plan": "ThinkingChat", "response": "ThinkingChat", "direct": "DirectChat"}
+
+
+def _pump(events, brain_name: str, out_queue: "queue.Queue", brain_token: CancelToken) -> None:
+    """Forward a brain's stream events into out_queue, followed by a (brain_name, None) end marker.
+
+    Stops as soon as the brain's part of the turn is cancelled, freeing the worker.
+    """
+    try:
+        with cancel_scope(brain_token):
+            for event in events:
+                if brain_token.cancelled:
+                    events.close()
+                    break
+                out_queue.put(event)
+    except Exception as e:
+        print(f"{brain_name} stream failed: {e}")
+    finally:
+        brain_token.complete()  # No-op if it was cancelled
+        out_queue.put((brain_name, None))
+
+
+def _direct_events(direct_chat, user_input: str) -> Iterator[Tuple[str, str]]:
+    for delta in direct_chat.process_message_stream(user_input):
+        yield "direct", delta
+
+
+def stream_dual_brain(thinking_chat, direct_chat, user_input: str,
+                      cancel_token: Optional[CancelToken] = None) -> Iterator[Tuple[str, str]]:
+    """Stream ThinkingChat and DirectChat concurrently, yielding events as they arrive.
+
+    Events are (kind, delta) tuples where kind is "plan" or "response" for ThinkingChat
+    and "direct" for DirectChat. A brain that misses its deadline gets a final error
+    delta and is no longer waited for.
+
+    With a cancel_token, new input in the session (or cancelling the token) aborts the
+    turn: the open streams are closed and TurnCancelled is raised. Closing this
+    generator early cancels the token too. A brain that misses its deadline is
+    cancelled on its own, as in process_dual_brain.
+    """
+    executor = get_executor()
+    started_at = time.monotonic()
+    events = queue.Queue()
+    brains = {"ThinkingChat": (thinking_chat, _brain_token(cancel_token)),
+              "DirectChat": (direct_chat, _brain_token(cancel_token))}
+
+    executor.submit(_with_script_ctx(_pump), thinking_chat.process_message_stream(user_input), "ThinkingChat",
+                    events, brains["ThinkingChat"][1])
+    executor.submit(_with_script_ctx(_pump), _direct_events(direct_chat, user_input), "DirectChat",
+                    events, brains["DirectChat"][1])
+    finished = False
+    try:
+        yield from _merge_events(events, started_at, cancel_token, brains, user_input)
+        finished = True
+    finally:
+        if not finished:
+            if cancel_token is not None:
+                cancel_token.cancel()
+            for _, brain_token in brains.values():
+                brain_token.cancel()
+
+
+def _merge_events(events: "queue.Queue", started_at: float, cancel_token: Optional[CancelToken],
+                  brains: Dict[str, Tuple[Any, CancelToken]], user_input: str) -> Iterator[Tuple[str, str]]:
+    """Yield the brains' events from the queue until both finish or miss their deadlines."""
+    deadlines = {
+        "ThinkingChat": (started_at + config.THINKING_TIMEOUT_SECONDS + JOIN_GRACE_SECONDS, "response"),
+        "DirectChat": (started_at + config.DIRECT_TIMEOUT_SECONDS + JOIN_GRACE_SECONDS, "direct"),
+    }
+
+    while deadlines:
+        # Pumps stop and send their end markers once cancelled; do not mistake that for success
+        _check_cancelled(cancel_token)
+        next_deadline = min(deadline for deadline, _ in deadlines.values())
+        timeout = max(next_deadline - time.monotonic(), 0)
+        try:
+            kind, delta = events.get(timeout=timeout if cancel_token is None else min(timeout, CANCEL_POLL_SECONDS))
+        except queue.Empty:
+            now = time.monotonic()
+            for brain_name, (deadline, kind) in list(deadlines.items()):
+                chat, brain_token = brains[brain_name]
+                # A brain that completed just now has its end marker queued; it is not late
+                if deadline <= now and brain_token.cancel():
+                    print(f"{brain_name} timed out")
+                    del deadlines[brain_name]
+                    message = "Error generating response: timed out"
+                    _record_failure(chat, user_input, message, cancel_token)
+                    yield kind, message
+            continue
+
+        if delta is None:
+            deadlines.pop(kind, None)
+        elif _EVENT_BRAINS[kind] in deadlines:
+            yield kind, delta
+    _check_cancelled(cancel_token)
@@ -6,14 +6,151 @@ load_dotenv()
 
 # OpenAI API configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Point every OpenAI call (chat and TTS) at another OpenAI-compatible server, e.g. the
+# local stand-in started with `python fake_openai_server.py` (http://127.0.0.1:8000/v1)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Shared OpenAI connection pool (see llm_client.py)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY_SECONDS", "60"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true"  # Used only if the h2 package is installed
+
+# Record/replay of OpenAI and Gmail traffic (see cassettes.py): "off", "record" or "replay".
+# Replay answers from the cassette with the recorded ("original") or "zero" network latency.
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "logs/cassettes/session.jsonl.gz")
+CASSETTE_REPLAY_LATENCY = os.getenv("CASSETTE_REPLAY_LATENCY", "original").lower()
+
+# Rate limiting (see request_scheduler.py). All sessions share per-model request/min and
+# token/min budgets; transient errors (429, 5xx, connection) are retried with backoff.
+# A limit of 0 means unlimited.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+OPENAI_RETRY_BASE_SECONDS = float(os.getenv("OPENAI_RETRY_BASE_SECONDS", "0.5"))
+OPENAI_RETRY_MAX_SECONDS = float(os.getenv("OPENAI_RETRY_MAX_SECONDS", "30"))
+
+# Identical chat requests in flight at the same time (e.g. a double submit, or several
+# sessions asking the same thing) share one upstream call (see single_flight.py)
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() == "true"
+
+# Hedged requests (see hedging.py): if a chat call has no first token after the stage's
+# observed HEDGE_PERCENTILE time-to-first-token, a backup request is sent (to
+# HEDGE_FALLBACK_MODEL if set) and the first to answer wins. Hedging starts once a stage
+# has HEDGE_MIN_SAMPLES calls and is capped at HEDGE_MAX_RATE of its calls.
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.5"))
+HEDGE_MAX_RATE = float(os.getenv("HEDGE_MAX_RATE", "0.1"))
+HEDGE_FALLBACK_MODEL = os.getenv("HEDGE_FALLBACK_MODEL", "")
 
 # Model configuration
 THINKING_MODEL = "gpt-4o-mini"
 DIRECT_MODEL = "gpt-3.5-turbo"
 
+# Concurrency configuration
+# When enabled, ThinkingChat and DirectChat are queried at the same time
+# instead of one after the other.
+CONCURRENT_BRAINS = os.getenv("CONCURRENT_BRAINS", "true").lower() == "true"
+BRAIN_WORKERS = int(os.getenv("BRAIN_WORKERS", "8"))
+# Per-brain timeouts (seconds). A brain that misses its deadline gets an error
+# response so it cannot hold up the other column.
+THINKING_TIMEOUT_SECONDS = float(os.getenv("THINKING_TIMEOUT_SECONDS", "60"))
+DIRECT_TIMEOUT_SECONDS = float(os.getenv("DIRECT_TIMEOUT_SECONDS", "30"))
+
+# Context window configuration
+# DirectChat sends at most this many tokens of history per request; older turns are
+# folded into a rolling summary of up to CONTEXT_SUMMARY_MAX_TOKENS tokens.
+DIRECT_CONTEXT_TOKEN_BUDGET = int(os.getenv("DIRECT_CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "300"))
+
+# Streaming configuration
+# When enabled, typed messages are streamed token by token into the chat columns.
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+
+# Plan cache configuration
+# Thinking plans depend only on the planner prompt, the model and the user input,
+# so repeated questions can reuse a stored plan instead of calling the planner again.
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "true").lower() == "true"
+PLAN_CACHE_PATH = os.getenv("PLAN_CACHE_PATH", "logs/plan_cache.sqlite3")
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "1000"))
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Semantic plan cache configuration
+# Reuses a plan when a new input rewords a previously planned one: among the most similar
+# cached inputs (cosine similarity of locally hashed word features), the first whose
+# content words overlap by at least the threshold (Jaccard, ignoring stopwords). Inputs
+# that swap a word ("sort ascending" vs "sort descending") or a negation never match.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "logs/semantic_plan_index")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.75"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_TOP_K = int(os.getenv("SEMANTIC_CACHE_TOP_K", "5"))
+
+# Thinking pipeline mode
+# "two_call": plan first, then answer with the plan in the system prompt (two round trips).
+# "single_call": ask for {"plan": ..., "answer": ...} in one structured reply (one round trip).
+# Any other value is rejected when the thinking chat is created.
+THINKING_MODE = os.getenv("THINKING_MODE", "two_call").lower()
+
+# Planner bypass configuration
+# Greetings and acknowledgements (score 0) skip the planning call and are answered in
+# one call, as do queries scoring below the threshold (0 = trivial, 1 = complex; see
+# query_router.heuristic_score for what the scores mean). By default only the former
+# skip: a short question can still need a plan. Raising it (e.g. to 0.2, which skips
+# questions of under 16 words with no reasoning keyword) trades answer quality for latency.
+# Train the optional learned router with: python query_router.py train
+PLANNER_BYPASS_ENABLED = os.getenv("PLANNER_BYPASS_ENABLED", "true").lower() == "true"
+PLANNER_BYPASS_THRESHOLD = float(os.getenv("PLANNER_BYPASS_THRESHOLD", "0.0"))
+ROUTER_MODEL_PATH = os.getenv("ROUTER_MODEL_PATH", "logs/router_model.npz")
+
+# Metrics configuration
+# Number of recent LLM calls kept for the latency/token percentiles in the sidebar.
+METRICS_MAX_RECORDS = int(os.getenv("METRICS_MAX_RECORDS", "1000"))
+
 # Logging configuration
 ENABLE_LOGGING = True
-LOG_FILE_PATH = "logs/chat_history.json" 
+# Append-only JSONL log, one line per turn. A JSON array log left at
+# LEGACY_LOG_FILE_PATH by older versions is migrated into it on startup.
+LOG_FILE_PATH = os.getenv("LOG_FILE_PATH", "logs/chat_history.jsonl")
+LEGACY_LOG_FILE_PATH = "logs/chat_history.json"
+# Log entries are written by a background thread (see log_writer.py) in batches of up to
+# LOG_WRITER_BATCH_SIZE entries or LOG_WRITER_FLUSH_SECONDS. When LOG_WRITER_QUEUE_SIZE
+# entries are waiting, a turn blocks for up to LOG_WRITER_ENQUEUE_TIMEOUT_SECONDS and
+# then writes its entry itself. LOG_FSYNC is "never", "batch" or "entry".
+LOG_WRITER_ENABLED = os.getenv("LOG_WRITER_ENABLED", "true").lower() == "true"
+LOG_WRITER_QUEUE_SIZE = int(os.getenv("LOG_WRITER_QUEUE_SIZE", "1000"))
+LOG_WRITER_BATCH_SIZE = int(os.getenv("LOG_WRITER_BATCH_SIZE", "50"))
+LOG_WRITER_FLUSH_SECONDS = float(os.getenv("LOG_WRITER_FLUSH_SECONDS", "0.5"))
+LOG_WRITER_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("LOG_WRITER_ENQUEUE_TIMEOUT_SECONDS", "5"))
+LOG_FSYNC = os.getenv("LOG_FSYNC", "batch").lower()
+# The active log is moved into a numbered, compressed segment (see log_segments.py) once it
+# reaches LOG_ROTATE_MAX_BYTES or its oldest entry is LOG_ROTATE_MAX_AGE_SECONDS old
+# (0 disables either limit). LOG_SEGMENT_COMPRESSION is "gzip" or "zstd" (needs zstandard).
+LOG_ROTATE_MAX_BYTES = int(os.getenv("LOG_ROTATE_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_MAX_AGE_SECONDS = float(os.getenv("LOG_ROTATE_MAX_AGE_SECONDS", "0"))
+LOG_SEGMENT_COMPRESSION = os.getenv("LOG_SEGMENT_COMPRESSION", "gzip").lower()
+# Optional SQLite copy of the chat log with full-text search (see history_store.py),
+# written in the log writer's batches. Build it from an existing log with
+# `python history_store.py import`.
+HISTORY_STORE_ENABLED = os.getenv("HISTORY_STORE_ENABLED", "false").lower() == "true"
+HISTORY_STORE_PATH = os.getenv("HISTORY_STORE_PATH", "logs/chat_history.sqlite3")
+HISTORY_SEARCH_PAGE_SIZE = int(os.getenv("HISTORY_SEARCH_PAGE_SIZE", "10"))
+# Content-addressed storage of large logged responses (see blob_store.py): plans and
+# responses of at least BLOB_MIN_SIZE characters are stored once under their hash in
+# "<LOG_FILE_PATH>.blobs/" and the log line keeps only the hash.
+BLOB_STORE_ENABLED = os.getenv("BLOB_STORE_ENABLED", "false").lower() == "true"
+BLOB_MIN_SIZE = int(os.getenv("BLOB_MIN_SIZE", "256"))
+# With SESSION_RESTORE_TURNS > 0, a new session resumes with the last turns of the chat
+# log; "Load older turns" pages in SESSION_HISTORY_PAGE_SIZE more at a time, up to
+# SESSION_HISTORY_MAX_TURNS per session (older turns are left to the log export). The log
+# is shared by every session (emails included), so only enable it for a single-user app.
+SESSION_RESTORE_TURNS = int(os.getenv("SESSION_RESTORE_TURNS", "0"))
+SESSION_HISTORY_PAGE_SIZE = int(os.getenv("SESSION_HISTORY_PAGE_SIZE", "20"))
+SESSION_HISTORY_MAX_TURNS = int(os.getenv("SESSION_HISTORY_MAX_TURNS", "200"))
 
 # Gmail API credentials and settings
 GMAIL_CLIENT_ID = os.getenv("GMAIL_CLIENT_ID", "YOUR_CLIENT_ID")
@@ -0,0 +1,137 @@
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate
+    tiktoken = None
+
+from cancellation import raise_if_cancelled
+from metrics import CallTimer
+
+# Tokens the chat format adds around every message (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant.
+Update the existing summary with the new turns below. Keep every fact, name, preference and open question
+the assistant may need later, drop pleasantries, and answer with the updated summary only."""
+
+
+def make_token_counter(model: str) -> Callable[[str], int]:
+    """Return a function counting the tokens of a string for model."""
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text))
+    # Roughly four characters per token for English text
+    return lambda text: (len(text) + 3) // 4
+
+
+class ContextWindow:
+    """Keeps the messages sent to the model within a token budget.
+
+    Token counts are computed once per message as messages are appended, and kept
+    with the message they belong to, so messages deleted from the history (e.g. by a
+    cancelled turn) drop out of the counts. When the window overflows, the oldest
+    turns are folded into a rolling summary, which is sent as a system message ahead
+    of the most recent turns.
+    """
+
+    def __init__(self, client, model: str, max_tokens: int, summary_max_tokens: int = 300,
+                 count_tokens: Optional[Callable[[str], int]] = None, timeout: Optional[float] = None):
+        self.client = client
+        self.model = model
+        self.timeout = timeout
+        self.last_metrics: Dict[str, Dict[str, Any]] = {}  # The summary call of the most recent build(), if any
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.count_tokens = count_tokens or make_token_counter(model)
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all counts and the summary (e.g. after the chat history is cleared)."""
+        self.summary = ""
+        self.summary_tokens = 0
+        self.window_start = 0  # Index of the first message not folded into the summary
+        self.window_tokens = 0
+        # (message, tokens) for the history as last seen; holding the message keeps its identity unique
+        self._counted: List[Tuple[Dict[str, str], int]] = []
+
+    def _message_tokens(self, message: Dict[str, str]) -> int:
+        return self.count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+    def _sync(self, messages: List[Dict[str, str]]) -> None:
+        """Forget the messages deleted since the last call and count only those appended since."""
+        kept, position, window_start = [], 0, self.window_start
+        for index, (message, tokens) in enumerate(self._counted):
+            if position < len(messages) and messages[position] is message:
+                kept.append((message, tokens))
+                position += 1
+            elif index < self.window_start:
+                window_start -= 1  # Already folded into the summary, which keeps it
+            else:
+                self.window_tokens -= tokens
+        if self._counted and not kept:  # The history was cleared or replaced
+            self.reset()
+        else:
+            self._counted, self.window_start = kept, window_start
+        for message in messages[position:]:
+            tokens = self._message_tokens(message)
+            self._counted.append((message, tokens))
+            self.window_tokens += tokens
+
+    def build(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Return the messages to send: the rolling summary (if any) followed by the recent window."""
+        self.last_metrics = {}
+        self._sync(messages)
+        if self.summary_tokens + self.window_tokens > self.max_tokens:
+            self._fold(messages)
+
+        window = messages[self.window_start:]
+        if not self.summary:
+            return window
+        return [{"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"}] + window
+
+    def _fold(self, messages: List[Dict[str, str]]) -> None:
+        """Move the oldest turns of the window into the summary until the rest fits the budget."""
+        budget = self.max_tokens - self.summary_max_tokens - MESSAGE_OVERHEAD_TOKENS
+        cut = self.window_start
+        remaining = self.window_tokens
+        last = len(messages) - 1  # The newest message is always kept
+        while cut < last and remaining > budget:
+            remaining -= self._counted[cut][1]
+            cut += 1
+        # Start the window on a user message so an answer is not separated from its question
+        while cut < last and messages[cut].get("role") != "user":
+            remaining -= self._counted[cut][1]
+            cut += 1
+        if cut == self.window_start:
+            return
+
+        self._update_summary(messages[self.window_start:cut])
+        self.window_start = cut
+        self.window_tokens = remaining
+
+    def _update_summary(self, folded: List[Dict[str, str]]) -> None:
+        transcript = "\n".join(f"{m.get('role', '')}: {m.get('content', '')}" for m in folded)
+        raise_if_cancelled()
+        timer = CallTimer("summary", self.model)
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": f"Existing summary:\n{self.summary or '(none)'}\n\nNew turns:\n{transcript}"}
+                ],
+                temperature=0.2,
+                max_tokens=self.summary_max_tokens,
+                timeout=self.timeout
+            )
+            self.last_metrics = {"summary": timer.finish(response.usage)}
+            self.summary = response.choices[0].message.content or ""
+        except Exception as e:
+            self.last_metrics = {"summary": timer.finish(error=str(e))}
+            # Keep the previous summary; the folded turns are dropped rather than blowing the budget
+            print(f"Error summarizing conversation: {e}")
+        self.summary_tokens = self.count_tokens(self.summary) + MESSAGE_OVERHEAD_TOKENS if self.summary else 0
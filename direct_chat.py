@@ -1,17 +1,30 @@
-import openai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 import config
+from llm_client import get_openai_client
+from context_window import ContextWindow
+from metrics import CallTimer
+from hedging import create_completion, get_hedger
+from cancellation import append_to_turn
 
 class DirectChat:
-    def __init__(self):
-        """Initialize the DirectChat class."""
-        self.client = openai.OpenAI(api_key=config.OPENAI_API_KEY)
+    def __init__(self, client=None):
+        """Initialize the DirectChat class (client defaults to the shared OpenAI client)."""
+        self.client = client or get_openai_client()
         self.model = config.DIRECT_MODEL
+        self.timeout = config.DIRECT_TIMEOUT_SECONDS
         self.messages = []
+        self.last_metrics = {}  # Call metrics of the most recent turn
+        self.hedger = get_hedger()
+        self.context_window = ContextWindow(
+            self.client, self.model,
+            max_tokens=config.DIRECT_CONTEXT_TOKEN_BUDGET,
+            summary_max_tokens=config.CONTEXT_SUMMARY_MAX_TOKENS,
+            timeout=self.timeout
+        )
     
     def add_message(self, role: str, content: str) -> None:
         """Add a message to the chat history."""
-        self.messages.append({"role": role, "content": content})
+        append_to_turn(self.messages, {"role": role, "content": content})
     
     def get_messages(self) -> List[Dict[str, str]]:
         """Get all messages in the chat history."""
@@ -20,20 +33,25 @@ class DirectChat:
     def clear_messages(self) -> None:
         """Clear all messages in the chat history."""
         self.messages = []
+        self.context_window.reset()
     
     def process_message(self, user_input: str) -> str:
         """Process user input and generate a direct response."""
         # Add user message to history
         self.add_message("user", user_input)
         
+        timer = CallTimer("direct", self.model)
         try:
-            # Send the conversation to OpenAI
-            response = self.client.chat.completions.create(
+            # Send the conversation (the recent window plus a summary of older turns) to OpenAI
+            response = create_completion(
+                self.client, self.hedger, "direct",
                 model=self.model,
-                messages=self.messages,
+                messages=self.context_window.build(self.messages),
                 temperature=0.7,
-                max_tokens=2000
+                max_tokens=2000,
+                timeout=self.timeout
             )
+            self.last_metrics = {**self.context_window.last_metrics, "direct": timer.finish(response.usage)}
             
             # Extract the assistant's response
             assistant_response = response.choices[0].message.content
@@ -44,7 +62,51 @@ class DirectChat:
             return assistant_response
         
         except Exception as e:
+            self.last_metrics = {**self.context_window.last_metrics, "direct": timer.finish(error=str(e))}
             error_message = f"Error generating response: {str(e)}"
             print(error_message)
             self.add_message("system", error_message)
-            return error_message 
\ No newline at end of file
+            return error_message
+
+    def process_message_stream(self, user_input: str) -> Iterator[str]:
+        """Process user input and yield the direct response as it is generated.
+
+        The full response is added to the chat history once the stream completes.
+        """
+        self.add_message("user", user_input)
+
+        timer = CallTimer("direct", self.model)
+        try:
+            stream = create_completion(
+                self.client, self.hedger, "direct",
+                model=self.model,
+                messages=self.context_window.build(self.messages),
+                temperature=0.7,
+                max_tokens=2000,
+                timeout=self.timeout,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+
+            chunks = []
+            usage = None
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    timer.first_token()
+                    chunks.append(delta)
+                    yield delta
+
+            self.last_metrics = {**self.context_window.last_metrics, "direct": timer.finish(usage)}
+            self.add_message("assistant", "".join(chunks))
+
+        except Exception as e:
+            self.last_metrics = {**self.context_window.last_metrics, "direct": timer.finish(error=str(e))}
+            error_message = f"Error generating response: {str(e)}"
+            print(error_message)
+            self.add_message("system", error_message)
+            yield error_message
@@ -6,14 +6,21 @@ from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 
 import config
+from cassettes import get_cassette
 
 # Define the SCOPES. If modifying these, delete the token.json file.
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
 def authenticate_gmail():
     """Authenticates with the Gmail API using OAuth 2.0."""
+    cassette = get_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        # Recorded responses need no credentials
+        return build('gmail', 'v1', http=cassette.http())
+
     creds = None
     # The file token.json stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first time.
@@ -31,6 +38,8 @@ def authenticate_gmail():
         with open(config.GMAIL_TOKEN_PATH, 'w') as token:
             token.write(creds.to_json())
 
+    if cassette is not None:
+        return build('gmail', 'v1', http=AuthorizedHttp(creds, http=cassette.http()))
     service = build('gmail', 'v1', credentials=creds)
     return service
 
@@ -0,0 +1,312 @@
+"""A local stand-in for the OpenAI API, for benchmarks, load tests and offline testing.
+
+Serves deterministic /v1/chat/completions responses (streaming and non-streaming) and
+/v1/audio/speech audio, with configurable latency distributions, token rates and
+injected errors (429, 500 and timeouts), so the whole app can run without network access.
+
+    python fake_openai_server.py --port 8000 --latency lognormal:0.3:0.5 --error-rate-429 0.05
+
+Then point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8000/v1.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+WORDS = (
+    "the model considers this question carefully and explains each part in turn so that "
+    "a reader can follow the reasoning from first principles to a useful practical answer"
+).split()
+
+
+def fake_completion_text(messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Build a deterministic reply whose words and length depend only on the request messages."""
+    digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).digest()
+    length = min(max_tokens, 20 + digest[0] % 60)
+    return " ".join(WORDS[(digest[i % len(digest)] + i) % len(WORDS)] for i in range(length))
+
+
+# A silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz, ~26 ms): header followed by zeroed side info and data
+SILENT_MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x64]) + bytes(413)
+
+
+class LatencyDistribution:
+    """Samples delays in seconds from a distribution given as "kind:param[:param]".
+
+    Supported kinds: fixed:S, uniform:LOW:HIGH, normal:MEAN:STDDEV, lognormal:MEDIAN:SIGMA,
+    exponential:MEAN. A bare number means fixed.
+    """
+
+    def __init__(self, spec: str):
+        parts = str(spec).split(":")
+        if len(parts) == 1:
+            parts = ["fixed"] + parts
+        self.kind = parts[0]
+        self.params = [float(p) for p in parts[1:]]
+        if self.kind not in ("fixed", "uniform", "normal", "lognormal", "exponential"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(self.params[0], self.params[1])
+        elif self.kind == "normal":
+            value = rng.gauss(self.params[0], self.params[1])
+        elif self.kind == "lognormal":
+            value = self.params[0] * rng.lognormvariate(0, self.params[1])
+        else:
+            value = rng.expovariate(1 / self.params[0])
+        return max(value, 0.0)
+
+    def __repr__(self) -> str:
+        return ":".join([self.kind] + [str(p) for p in self.params])
+
+
+def count_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Approximate prompt tokens as words plus per-message overhead."""
+    return sum(len(str(m.get("content", "")).split()) + 4 for m in messages)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # Keep benchmark output clean
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        request = self._read_json()
+        if self._inject_error():
+            return
+        try:
+            if self.path.rstrip("/").endswith("/chat/completions"):
+                self._chat_completions(request)
+            elif self.path.rstrip("/").endswith("/audio/speech"):
+                self._speech(request)
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}",
+                                                "type": "invalid_request_error"}})
+        except ConnectionError:
+            # The client went away mid-response (e.g. a cancelled or hedged stream)
+            self.server.count("disconnects")
+            self.close_connection = True
+
+    def _inject_error(self) -> bool:
+        """Fail the request as configured; returns True if an error response was produced."""
+        settings = self.server.settings
+        roll = self.server.random()
+        if roll < settings["error_rate_429"]:
+            self.server.count("rate_limited")
+            self._send_json(429, {"error": {"message": "Rate limit reached (injected)", "type": "requests",
+                                            "code": "rate_limit_exceeded"}},
+                            headers={"Retry-After": str(settings["retry_after"])})
+            return True
+        roll -= settings["error_rate_429"]
+        if roll < settings["error_rate_500"]:
+            self.server.count("server_errors")
+            self._send_json(500, {"error": {"message": "Internal server error (injected)", "type": "server_error"}})
+            return True
+        roll -= settings["error_rate_500"]
+        if roll < settings["timeout_rate"]:
+            # Hold the connection without answering, then drop it
+            self.server.count("timeouts")
+            time.sleep(settings["timeout_seconds"])
+            self.close_connection = True
+            return True
+        return False
+
+    def _token_delay(self) -> float:
+        settings = self.server.settings
+        rate = settings["tokens_per_second"] * (1 + settings["token_rate_jitter"] * (2 * self.server.random() - 1))
+        return 1 / max(rate, 1e-6)
+
+    def _speech(self, request: Dict[str, Any]) -> None:
+        settings = self.server.settings
+        self.server.count("speech")
+        time.sleep(settings["latency"].sample(self.server.rng))
+        # Roughly 150 words per minute of speech, 26 ms per frame
+        frames = max(1, int(len(str(request.get("input", "")).split()) * 0.4 / 0.026))
+        data = SILENT_MP3_FRAME * frames
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chat_completions(self, request: Dict[str, Any]) -> None:
+        settings = self.server.settings
+        self.server.count("chat_completions")
+        messages = request.get("messages", [])
+        text = fake_completion_text(messages, request.get("max_tokens") or 256)
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            text = json.dumps({"plan": text, "answer": text})
+
+        words = text.split(" ")
+        usage = {"prompt_tokens": count_tokens(messages), "completion_tokens": len(words)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request.get("model", "fake")}
+
+        time.sleep(settings["latency"].sample(self.server.rng))
+        if not request.get("stream"):
+            time.sleep(sum(self._token_delay() for _ in words))
+            self._send_json(200, {
+                **base, "object": "chat.completion", "usage": usage,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}]
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, word in enumerate(words):
+            delta = {"role": "assistant", "content": word} if i == 0 else {"content": " " + word}
+            self._send_event({**base, "object": "chat.completion.chunk",
+                              "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            time.sleep(self._token_delay())
+        self._send_event({**base, "object": "chat.completion.chunk",
+                          "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_event({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _send_event(self, body: Dict[str, Any]) -> None:
+        self._send_chunk(f"data: {json.dumps(body)}\n\n".encode("utf-8"))
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, settings: Dict[str, Any], seed: Optional[int]):
+        super().__init__(address, FakeOpenAIHandler)
+        self.settings = settings
+        self.rng = _LockedRandom(seed)
+        self.stats = {"chat_completions": 0, "speech": 0, "rate_limited": 0, "server_errors": 0, "timeouts": 0,
+                      "disconnects": 0}
+        self._stats_lock = threading.Lock()
+
+    def random(self) -> float:
+        return self.rng.random()
+
+    def count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+
+class _LockedRandom(random.Random):
+    """A seeded Random that can be shared by the handler threads."""
+
+    def __init__(self, seed: Optional[int]):
+        self._lock = threading.Lock()
+        super().__init__(seed)
+
+    def random(self) -> float:
+        with self._lock:
+            return super().random()
+
+
+class FakeOpenAIServer:
+    """Runs the fake API in a background thread. Use as a context manager or call start()/stop().
+
+    latency is a LatencyDistribution spec (or seconds) for the delay before the first token;
+    error rates are per-request probabilities. With a seed, latencies and injected errors
+    are reproducible for the same sequence of requests.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency="fixed:0.05",
+                 tokens_per_second: float = 200.0, token_rate_jitter: float = 0.0,
+                 error_rate_429: float = 0.0, error_rate_500: float = 0.0, timeout_rate: float = 0.0,
+                 timeout_seconds: float = 30.0, retry_after: float = 1.0, seed: Optional[int] = None):
+        settings = {
+            "latency": LatencyDistribution(latency),
+            "tokens_per_second": tokens_per_second,
+            "token_rate_jitter": token_rate_jitter,
+            "error_rate_429": error_rate_429,
+            "error_rate_500": error_rate_500,
+            "timeout_rate": timeout_rate,
+            "timeout_seconds": timeout_seconds,
+            "retry_after": retry_after,
+        }
+        self.httpd = _FakeHTTPServer((host, port), settings, seed)
+        self._thread = None
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(self.httpd.stats)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI-compatible API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", default="fixed:0.05",
+                        help="Delay before the first token: fixed:S, uniform:LOW:HIGH, normal:MEAN:SD, "
+                             "lognormal:MEDIAN:SIGMA or exponential:MEAN")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--token-rate-jitter", type=float, default=0.0, help="Relative +/- jitter of the token rate")
+    parser.add_argument("--error-rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate-500", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Fraction of requests that never answer")
+    parser.add_argument("--timeout-seconds", type=float, default=30.0)
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible latencies and injected errors")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        args.host, args.port, args.latency, args.tokens_per_second, args.token_rate_jitter,
+        args.error_rate_429, args.error_rate_500, args.timeout_rate, args.timeout_seconds,
+        args.retry_after, args.seed
+    )
+    print(f"Fake OpenAI API listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""Advisory lock shared by every thread and process writing the same file.
+
+The lock lives in a "<path>.lock" file next to the file it protects, so it stays valid
+while the file itself is renamed (log rotation, atomic rewrites). On platforms without
+fcntl (Windows) it is a no-op, and writers rely on O_APPEND alone.
+"""
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+@contextmanager
+def locked(path: str):
+    """Hold an exclusive lock on path for the duration of the with block."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # Also releases the lock
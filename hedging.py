@@ -0,0 +1,181 @@
+"""Hedged chat completion requests to cut tail latency.
+
+If a call has not produced its first token within the stage's observed p90
+time-to-first-token, the same request is sent again, optionally to a fallback
+model, and whichever answers first wins. A losing stream is closed so the server
+stops generating; a losing non-streaming call cannot be interrupted mid-request,
+so its result is simply discarded (or it is cancelled if it has not started yet).
+
+Hedges are only sent once a stage has enough latency samples, and never for more
+than HEDGE_MAX_RATE of a stage's calls, so the extra cost stays bounded.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+import numpy as np
+
+import config
+from cancellation import close_on_cancel, raise_if_cancelled
+from metrics import get_metrics
+from single_flight import CoalescingClient
+
+
+def _open_stream(client, kwargs: Dict[str, Any]) -> Tuple[Any, Iterator, list]:
+    """Open a stream and read it up to the first content chunk.
+
+    Returns (stream, its chunk iterator, chunks read so far).
+    """
+    stream = client.chat.completions.create(**kwargs)
+    iterator = iter(stream)
+    chunks = []
+    for chunk in iterator:
+        chunks.append(chunk)
+        if chunk.choices and chunk.choices[0].delta.content:
+            break
+    return stream, iterator, chunks
+
+
+def _close_stream(future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result()[0].close()
+
+
+class _HedgedStream:
+    """The winning stream, starting with the chunks read while racing."""
+
+    def __init__(self, stream, iterator: Iterator, first_chunks: list):
+        self.stream = stream
+        self.iterator = iterator
+        self.first_chunks = first_chunks
+
+    def __iter__(self):
+        yield from self.first_chunks
+        yield from self.iterator
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+class Hedger:
+    """Sends a backup request when a call is slower than the stage's adaptive threshold."""
+
+    def __init__(self, percentile: float = 90, min_samples: int = 20, min_delay: float = 0.5,
+                 max_rate: float = 0.1, fallback_model: Optional[str] = None, workers: int = 16):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self.fallback_model = fallback_model or None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+
+    def hedge_delay(self, stage: str) -> Optional[float]:
+        """Seconds to wait for the first token before hedging, or None if this call should not be hedged."""
+        metrics = get_metrics()
+        counters = metrics.counters()
+        calls = counters.get(f"{stage}.calls", 0)
+        if calls and counters.get(f"{stage}.hedges_sent", 0) >= self.max_rate * calls:
+            return None
+        ttfts = [r["ttft"] for r in metrics.records(stage) if r.get("ttft") is not None and not r.get("error")]
+        if len(ttfts) < self.min_samples:
+            return None
+        return max(float(np.percentile(ttfts, self.percentile)), self.min_delay)
+
+    def _submit(self, fn, *args):
+        # Keep the caller's context (e.g. the request priority) in the worker thread
+        return self._executor.submit(contextvars.copy_context().run, fn, *args)
+
+    def _hedge_request(self, client, stage: str, kwargs: Dict[str, Any]):
+        get_metrics().increment(f"{stage}.hedges_sent")
+        hedge_kwargs = {**kwargs, "model": self.fallback_model or kwargs.get("model")}
+        # The backup must not be coalesced into the slow request it is racing
+        hedge_client = client.raw if isinstance(client, CoalescingClient) else client
+        return hedge_kwargs, hedge_client
+
+    def create(self, client, stage: str, **kwargs):
+        """Drop-in for client.chat.completions.create that hedges slow calls.
+
+        With stream=True, returns an iterator over the winning stream's chunks.
+        """
+        get_metrics().increment(f"{stage}.calls")
+        delay = self.hedge_delay(stage)
+        if kwargs.get("stream"):
+            return self._create_stream(client, stage, delay, kwargs)
+        if delay is None:
+            return client.chat.completions.create(**kwargs)
+
+        primary = self._submit(lambda: client.chat.completions.create(**kwargs))
+        if wait([primary], timeout=delay).done:
+            return primary.result()
+        hedge_kwargs, hedge_client = self._hedge_request(client, stage, kwargs)
+        hedge = self._submit(lambda: hedge_client.chat.completions.create(**hedge_kwargs))
+
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    if future is hedge:
+                        get_metrics().increment(f"{stage}.hedge_wins")
+                    return future.result()
+        return primary.result()  # Both failed; report the original request's error
+
+    def _create_stream(self, client, stage: str, delay: Optional[float], kwargs: Dict[str, Any]) -> Iterator:
+        if delay is None:
+            return client.chat.completions.create(**kwargs)
+
+        primary = self._submit(_open_stream, client, kwargs)
+        winner = primary
+        if not wait([primary], timeout=delay).done:
+            hedge_kwargs, hedge_client = self._hedge_request(client, stage, kwargs)
+            hedge = self._submit(_open_stream, hedge_client, hedge_kwargs)
+            pending = {primary, hedge}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                successful = [f for f in done if f.exception() is None]
+                if successful:
+                    winner = hedge if hedge in successful else successful[0]
+                    break
+            for loser in {primary, hedge} - {winner}:
+                # Closed as soon as it opens, if it is still connecting
+                if not loser.cancel():
+                    loser.add_done_callback(_close_stream)
+            if winner is hedge and hedge.exception() is None:
+                get_metrics().increment(f"{stage}.hedge_wins")
+
+        return _HedgedStream(*winner.result())
+
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Optional[Hedger]:
+    """Return the process-wide hedger, or None if hedging is disabled."""
+    global _hedger
+    if not config.HEDGING_ENABLED:
+        return None
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger(config.HEDGE_PERCENTILE, config.HEDGE_MIN_SAMPLES, config.HEDGE_MIN_DELAY_SECONDS,
+                             config.HEDGE_MAX_RATE, config.HEDGE_FALLBACK_MODEL)
+        return _hedger
+
+
+def create_completion(client, hedger: Optional[Hedger], stage: str, **kwargs):
+    """Call client.chat.completions.create, through the hedger when one is given.
+
+    Refuses to start if the current turn was cancelled, and closes a returned
+    stream when it is.
+    """
+    raise_if_cancelled()
+    if hedger is None:
+        response = client.chat.completions.create(**kwargs)
+    else:
+        response = hedger.create(client, stage, **kwargs)
+    if kwargs.get("stream"):
+        close_on_cancel(response)
+    return response
@@ -0,0 +1,207 @@
+"""SQLite store of the chat log with full-text search.
+
+Every logged turn is also inserted (in the log writer's batches) into a SQLite database
+in WAL mode, so searches from the sidebar never block on, or block, the writer. An FTS5
+index covers the user input and the three responses (plus email handler replies), so
+questions like "what did the thinking model say about X last week" are answered from
+the index instead of scanning the JSONL log.
+
+The JSONL log stays the source of truth; `python history_store.py import` (re)builds the
+store from it.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+import config
+from utils import ensure_directory_exists, iter_chat_history, user_input_of
+
+# Indexed fields, in FTS column order
+SEARCH_FIELDS = ("user_input", "thinking_plan", "thinking_response", "direct_response", "handler_response")
+
+
+def _fields(entry: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    fields = {field: entry.get(field) for field in SEARCH_FIELDS}
+    fields["user_input"] = user_input_of(entry)
+    return {field: value if value is None or isinstance(value, str) else str(value) for field, value in fields.items()}
+
+
+def fts_query(text: str, fields: Optional[Iterable[str]] = None) -> str:
+    """Turn free text into an FTS5 query matching all its words (as literals), optionally only in some fields."""
+    terms = " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+    fields = [field for field in fields or () if field in SEARCH_FIELDS]
+    if fields:
+        return "{" + " ".join(fields) + "} : (" + terms + ")"
+    return terms
+
+
+class HistoryStore:
+    """Chat log entries in SQLite (WAL mode), with an FTS5 index over the user input and responses."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        ensure_directory_exists(os.path.dirname(db_path) or ".")
+        # One connection for the writer and one for searches; WAL lets them work side by side
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._write_conn = self._connect()
+        self._create_schema()
+        self._read_conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _create_schema(self) -> None:
+        columns = ", ".join(f"{field} TEXT" for field in SEARCH_FIELDS)
+        self._write_conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY, timestamp TEXT, {columns}, entry TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp);
+            CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+                {", ".join(SEARCH_FIELDS)}, content='entries', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+                INSERT INTO entries_fts (rowid, {", ".join(SEARCH_FIELDS)})
+                VALUES (new.id, {", ".join("new." + field for field in SEARCH_FIELDS)});
+            END;
+        """)
+        self._write_conn.commit()
+
+    def add_many(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """Insert a batch of log entries in one transaction; returns how many were added."""
+        rows = []
+        for entry in entries:
+            fields = _fields(entry)
+            rows.append((entry.get("timestamp"), *(fields[field] for field in SEARCH_FIELDS),
+                         json.dumps(entry, ensure_ascii=False)))
+        if not rows:
+            return 0
+        placeholders = ", ".join("?" * (len(SEARCH_FIELDS) + 2))
+        with self._write_lock:
+            with self._write_conn:
+                self._write_conn.executemany(
+                    f"INSERT INTO entries (timestamp, {', '.join(SEARCH_FIELDS)}, entry) VALUES ({placeholders})",
+                    rows
+                )
+        return len(rows)
+
+    def search(self, text: str, fields: Optional[Iterable[str]] = None, start: Optional[str] = None,
+               end: Optional[str] = None, limit: int = 10, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Find entries containing all words of text, best matches first.
+
+        Returns (one page of results, total number of matches). Each result has the
+        entry, its id and a snippet with the matched words in **bold**.
+        """
+        if not text.strip():
+            return [], 0
+        where = "entries_fts MATCH ?"
+        params: List[Any] = [fts_query(text, fields)]
+        if start is not None:
+            where += " AND entries.timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            where += " AND entries.timestamp <= ?"
+            params.append(end)
+        from_clause = f"FROM entries_fts JOIN entries ON entries.id = entries_fts.rowid WHERE {where}"
+        with self._read_lock:
+            total = self._read_conn.execute(f"SELECT COUNT(*) {from_clause}", params).fetchone()[0]
+            rows = self._read_conn.execute(
+                f"SELECT entries.id, entries.entry, snippet(entries_fts, -1, '**', '**', ' … ', 16) "
+                f"{from_clause} ORDER BY bm25(entries_fts), entries.timestamp DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [{"id": row[0], "entry": json.loads(row[1]), "snippet": row[2]} for row in rows], total
+
+    def iter_entries(self, start: Optional[str] = None, end: Optional[str] = None,
+                     batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Yield stored entries oldest first, optionally only those timestamped within [start, end]."""
+        last_id = 0
+        while True:
+            with self._read_lock:
+                rows = self._read_conn.execute(
+                    "SELECT id, entry FROM entries WHERE id > ? AND (? IS NULL OR timestamp >= ?) "
+                    "AND (? IS NULL OR timestamp <= ?) ORDER BY id LIMIT ?",
+                    (last_id, start, start, end, end, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield json.loads(row[1])
+            last_id = rows[-1][0]
+
+    def clear(self) -> None:
+        with self._write_lock:
+            with self._write_conn:
+                self._write_conn.execute("DELETE FROM entries")
+                self._write_conn.execute("INSERT INTO entries_fts (entries_fts) VALUES ('delete-all')")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._read_lock:
+            entries = self._read_conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"entries": entries, "path": self.db_path}
+
+    def close(self) -> None:
+        self._write_conn.close()
+        self._read_conn.close()
+
+
+_history_store = None
+_history_store_lock = threading.Lock()
+
+
+def get_history_store() -> Optional[HistoryStore]:
+    """Return the process-wide history store, or None if it is disabled."""
+    global _history_store
+    if not config.HISTORY_STORE_ENABLED:
+        return None
+    with _history_store_lock:
+        if _history_store is None:
+            _history_store = HistoryStore(config.HISTORY_STORE_PATH)
+        return _history_store
+
+
+def import_log(store: HistoryStore, log_path: str, batch_size: int = 1000) -> int:
+    """Load every entry of a chat log (segments included) into the store; returns the count."""
+    count, batch = 0, []
+    for entry in iter_chat_history(log_path):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            count += store.add_many(batch)
+            batch = []
+    return count + store.add_many(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or search the SQLite chat history store.")
+    parser.add_argument("--db", default=config.HISTORY_STORE_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Rebuild the store from the JSONL chat log")
+    import_parser.add_argument("--log", default=config.LOG_FILE_PATH)
+    search_parser = subparsers.add_parser("search", help="Full-text search of the stored turns")
+    search_parser.add_argument("text")
+    search_parser.add_argument("--field", action="append", choices=SEARCH_FIELDS)
+    search_parser.add_argument("--since", help="Only turns at or after this ISO timestamp")
+    search_parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db)
+    if args.command == "import":
+        store.clear()
+        print(f"Imported {import_log(store, args.log)} entries from {args.log} into {args.db}")
+    else:
+        results, total = store.search(args.text, args.field, start=args.since, limit=args.limit)
+        print(f"{total} matching turns")
+        for result in results:
+            print(f"[{result['entry'].get('timestamp', '')}] {result['snippet']}")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import threading
+from typing import Dict, Any
+
+import httpx
+import openai
+
+import config
+from cassettes import get_cassette
+from request_scheduler import ScheduledClient, get_scheduler
+from single_flight import CoalescingClient, get_single_flight
+
+try:
+    import h2  # noqa: F401  (HTTP/2 support for httpx is optional)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_lock = threading.Lock()
+_http_client = None
+_openai_client = None
+_request_stats = {"requests_sent": 0, "responses_received": 0}
+
+
+def _on_request(request: httpx.Request) -> None:
+    with _lock:
+        _request_stats["requests_sent"] += 1
+
+
+def _on_response(response: httpx.Response) -> None:
+    with _lock:
+        _request_stats["responses_received"] += 1
+
+
+def _build_http_client() -> httpx.Client:
+    """Build the pooled httpx client shared by every OpenAI call in the process."""
+    limits = httpx.Limits(
+        max_connections=config.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=config.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.OPENAI_KEEPALIVE_EXPIRY_SECONDS
+    )
+    http2 = config.OPENAI_HTTP2 and HTTP2_AVAILABLE
+    transport = None
+    cassette = get_cassette()
+    if cassette is not None:
+        transport = cassette.transport(httpx.HTTPTransport(limits=limits, http2=http2))
+    return openai.DefaultHttpxClient(
+        limits=limits,
+        http2=http2,
+        transport=transport,
+        event_hooks={"request": [_on_request], "response": [_on_response]}
+    )
+
+
+def is_offline() -> bool:
+    """Whether calls go to a local server or are replayed from cassettes, which need no real API key."""
+    return bool(config.OPENAI_BASE_URL) or config.CASSETTE_MODE == "replay"
+
+
+def has_credentials() -> bool:
+    """Whether get_openai_client() can make calls: an API key is set, or none is needed."""
+    return bool(config.OPENAI_API_KEY) or is_offline()
+
+
+def get_openai_client() -> openai.OpenAI:
+    """Return the process-wide OpenAI client, creating it on first use.
+
+    All Streamlit sessions, the chat pipelines and TTS share this client, so TLS and
+    connection setup are paid once per pooled connection rather than once per call.
+    With rate limiting enabled, calls go through the shared request scheduler, which
+    also takes over retries from the OpenAI client. Identical concurrent chat requests
+    are coalesced before they reach the scheduler.
+    """
+    global _http_client, _openai_client
+    with _lock:
+        if _openai_client is None:
+            _http_client = _build_http_client()
+            scheduler = get_scheduler()
+            client = openai.OpenAI(
+                api_key=config.OPENAI_API_KEY or ("local" if is_offline() else None),
+                base_url=config.OPENAI_BASE_URL,
+                http_client=_http_client,
+                max_retries=0 if scheduler is not None else openai.DEFAULT_MAX_RETRIES
+            )
+            if scheduler is not None:
+                client = ScheduledClient(client, scheduler)
+            if get_single_flight() is not None:
+                client = CoalescingClient(client, get_single_flight())
+            _openai_client = client
+        return _openai_client
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Return a snapshot of the shared connection pool."""
+    with _lock:
+        stats = dict(_request_stats)
+        http_client = _http_client
+
+    stats.update({"connections": 0, "idle_connections": 0, "active_connections": 0, "http2_connections": 0})
+    if http_client is None:
+        return stats
+
+    # httpx does not expose pool state publicly; read it from the underlying httpcore pool.
+    transport = getattr(http_client, "_transport", None)
+    transport = getattr(transport, "transport", transport)  # Unwrap a recording transport
+    pool = getattr(transport, "_pool", None)
+    for connection in list(getattr(pool, "connections", [])):
+        stats["connections"] += 1
+        if connection.is_idle():
+            stats["idle_connections"] += 1
+        else:
+            stats["active_connections"] += 1
+        if "HTTP/2" in connection.info():
+            stats["http2_connections"] += 1
+    return stats
+
+
+def close_clients() -> None:
+    """Close the shared clients and release their pooled connections."""
+    global _http_client, _openai_client
+    with _lock:
+        if _openai_client is not None:
+            _openai_client.close()
+        _http_client = None
+        _openai_client = None
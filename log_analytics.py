@@ -0,0 +1,269 @@
+"""Grouped statistics over the chat log, computed on columnar NumPy arrays.
+
+The log is read as columns (see log_columns.py): rotated segments from the columns
+saved next to them, so only the active log is parsed as JSON. NumPy derives one row
+per turn and brain ("turn" unit) or per LLM call ("call" unit) from them. Group keys
+are encoded as integers and the per-group count/mean/min/max and percentiles are
+computed with a single sort instead of a Python loop per group.
+
+    python log_analytics.py --group-by day,brain --metric wall_time
+    python log_analytics.py --group-by model --metric response_chars --percentiles 10,50,90
+    python log_analytics.py --unit call --group-by stage --metric ttft --format csv --output ttft.csv
+
+Metrics: wall_time and ttft (seconds), prompt_tokens, completion_tokens and
+response_chars. For a turn, the thinking brain's wall time and tokens add up its stages
+(plan and final answer), and its ttft is the time until its answer starts streaming.
+"""
+import argparse
+import csv
+import sys
+import time
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import config
+import log_segments
+from log_columns import BRAINS, CALL_METRICS, STAGE_BRAIN, STAGE_CODES, STAGES, LogColumns
+from utils import is_legacy_log, iter_unsealed_entries
+
+UNITS = ("turn", "call")
+METRICS = ("wall_time", "ttft", "prompt_tokens", "completion_tokens", "response_chars")
+GROUP_KEYS = {"turn": ("day", "month", "brain", "model", "error"),
+              "call": ("day", "month", "brain", "stage", "model", "error")}
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+Keys = Dict[str, Tuple[np.ndarray, List[str]]]
+
+
+def load_columns(file_path: str, start: Optional[str] = None, end: Optional[str] = None) -> LogColumns:
+    """Columns of the log's entries; only the segments that may overlap [start, end] are loaded.
+
+    Entries outside the window are still included; rows() filters them.
+    """
+    columns = LogColumns()
+    if not is_legacy_log(file_path):
+        for segment in log_segments.segments_in_range(file_path, start, end):
+            columns.extend(log_segments.read_segment_columns(file_path, segment))
+    for entry in iter_unsealed_entries(file_path, start, end):
+        columns.add_entry(entry)
+    return columns
+
+
+def _codes(values: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    """Integer codes and labels for days or months; entries without a timestamp are "unknown"."""
+    unique, codes = np.unique(values, return_inverse=True)
+    labels = [label if label != "NaT" else "unknown" for label in np.datetime_as_string(unique)]
+    return codes.ravel(), labels
+
+
+def rows(columns: LogColumns, unit: str, start: Optional[str] = None,
+         end: Optional[str] = None) -> Tuple[Dict[str, np.ndarray], Keys]:
+    """Return (metric arrays, group key (codes, labels)) with one element per turn of a brain, or per call,
+    for the entries timestamped within [start, end]."""
+    if unit not in UNITS:
+        raise ValueError(f"Unknown unit: {unit}")
+    data = columns.arrays()
+    time_of = data["time"]
+    in_window = np.ones(len(time_of), dtype=bool)
+    if start is not None:
+        in_window &= time_of >= np.datetime64(start, "us")
+    if end is not None:
+        in_window &= time_of <= np.datetime64(end, "us")
+    model_labels = list(data["models"]) + ["unknown"]
+    unknown_model = len(model_labels) - 1
+    call_entry, call_stage = data["entry"], data["stage"]
+
+    if unit == "call":
+        keep = in_window[call_entry]
+        entries, stages = call_entry[keep], call_stage[keep]
+        output_chars = np.stack([data["plan_chars"], data["thinking_chars"], data["thinking_chars"],
+                                 data["direct_chars"]])
+        metrics = {name: data[name][keep] for name in CALL_METRICS}
+        metrics["response_chars"] = output_chars[stages, entries]
+        times = time_of[entries]
+        keys = {"day": _codes(times.astype("datetime64[D]")), "month": _codes(times.astype("datetime64[M]")),
+                "brain": (STAGE_BRAIN[stages], list(BRAINS)), "stage": (stages, list(STAGES)),
+                "model": (data["model"][keep], model_labels),
+                "error": (data["error"][keep].astype(np.int64), ["no", "yes"])}
+        return metrics, keys
+
+    n = len(time_of)
+    stage_brain = STAGE_BRAIN[call_stage]
+    plans = call_stage == STAGE_CODES["plan"]
+    plan_wall = np.zeros(n)
+    plan_wall[call_entry[plans]] = np.nan_to_num(data["wall_time"][plans])
+    parts = []
+    for brain_code, brain in enumerate(BRAINS):
+        of_brain = stage_brain == brain_code
+        entries_of = call_entry[of_brain]
+
+        def total(values: np.ndarray) -> np.ndarray:
+            present = ~np.isnan(values[of_brain])
+            sums = np.bincount(entries_of[present], weights=values[of_brain][present], minlength=n)
+            counts = np.bincount(entries_of[present], minlength=n)
+            return np.where(counts > 0, sums, np.nan)
+
+        answers = of_brain & ~plans
+        answer_ttft = np.full(n, np.nan)
+        answer_ttft[call_entry[answers]] = data["ttft"][answers]
+        model = np.full(n, unknown_model)
+        model[entries_of] = data["model"][of_brain]  # Calls are in stage order, so the answer's model wins
+        errors = np.bincount(entries_of, weights=data["error"][of_brain], minlength=n) > 0
+
+        keep = data["has_" + brain].astype(bool) & in_window
+        parts.append({
+            "wall_time": total(data["wall_time"])[keep],
+            "ttft": (answer_ttft + (plan_wall if brain == "thinking" else 0))[keep],
+            "prompt_tokens": total(data["prompt_tokens"])[keep],
+            "completion_tokens": total(data["completion_tokens"])[keep],
+            "response_chars": data[brain + "_chars"][keep],
+            "time": time_of[keep], "brain": np.full(keep.sum(), brain_code),
+            "model": model[keep], "error": errors[keep].astype(np.int64),
+        })
+    merged = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    metrics = {name: merged[name] for name in METRICS}
+    keys = {"day": _codes(merged["time"].astype("datetime64[D]")),
+            "month": _codes(merged["time"].astype("datetime64[M]")),
+            "brain": (merged["brain"], list(BRAINS)), "model": (merged["model"], model_labels),
+            "error": (merged["error"], ["no", "yes"])}
+    return metrics, keys
+
+
+def grouped_stats(group_ids: np.ndarray, values: np.ndarray, n_groups: int,
+                  percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, np.ndarray]:
+    """Per-group count, mean, min, max and percentiles of values, ignoring NaNs.
+
+    Percentiles use linear interpolation, like np.percentile. Groups without values
+    get a count of 0 and NaN statistics.
+    """
+    present = ~np.isnan(values)
+    groups, values = group_ids[present], values[present]
+    order = np.lexsort((values, groups))  # By group, then value
+    groups, values = groups[order], values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    has_values = counts > 0
+
+    def per_group(positions: np.ndarray) -> np.ndarray:
+        out = np.full(n_groups, np.nan)
+        out[has_values] = values[positions[has_values]]
+        return out
+
+    stats = {"count": counts}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats["mean"] = np.bincount(groups, weights=values, minlength=n_groups) / counts
+    stats["min"] = per_group(starts)
+    for q in percentiles:
+        position = starts + (np.maximum(counts, 1) - 1) * (q / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        low, high = per_group(lower), per_group(upper)
+        stats[f"p{q:g}"] = low + (high - low) * (position - lower)
+    stats["max"] = per_group(starts + np.maximum(counts, 1) - 1)
+    return stats
+
+
+def summarize(columns: LogColumns, unit: str, group_by: Sequence[str], metric: str,
+              percentiles: Sequence[float] = DEFAULT_PERCENTILES, start: Optional[str] = None,
+              end: Optional[str] = None) -> List[Dict[str, Any]]:
+    """One row per group (sorted by group labels) with the statistics of metric over turns or calls
+    timestamped within [start, end]."""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    if unit not in UNITS:
+        raise ValueError(f"Unknown unit: {unit}")
+    for key in group_by:
+        if key not in GROUP_KEYS[unit]:
+            raise ValueError(f"Cannot group {unit}s by {key}; choose from {', '.join(GROUP_KEYS[unit])}")
+    metrics, keys = rows(columns, unit, start, end)
+    values = metrics[metric]
+    if values.size == 0:
+        return []
+    sizes = [len(keys[key][1]) for key in group_by]
+    if group_by:
+        combined = np.ravel_multi_index([keys[key][0] for key in group_by], sizes)
+        group_values, group_ids = np.unique(combined, return_inverse=True)
+        group_codes = np.unravel_index(group_values, sizes)
+    else:
+        group_values, group_ids, group_codes = np.zeros(1), np.zeros(values.size, dtype=np.int64), []
+    stats = grouped_stats(group_ids.ravel(), values, len(group_values), percentiles)
+
+    table = []
+    for g in range(len(group_values)):
+        row = {key: keys[key][1][codes[g]] for key, codes in zip(group_by, group_codes)}
+        row.update({name: int(stat[g]) if name == "count" else _round(stat[g]) for name, stat in stats.items()})
+        table.append(row)
+    return sorted(table, key=lambda row: [row[key] for key in group_by])
+
+
+def _round(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    if not rows:
+        return "No data."
+    headers = list(rows[0])
+    cells = [["" if row[h] is None else str(row[h]) for h in headers] for row in rows]
+    widths = [max(len(h), *(len(c[i]) for c in cells)) for i, h in enumerate(headers)]
+    lines = ["  ".join(h.ljust(w) for h, w in zip(headers, widths)),
+             "  ".join("-" * w for w in widths)]
+    lines += ["  ".join(c.ljust(w) for c, w in zip(cell_row, widths)) for cell_row in cells]
+    return "\n".join(lines)
+
+
+def write_csv(rows: List[Dict[str, Any]], out) -> None:
+    if rows:
+        writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _list(text: str) -> List[str]:
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Grouped statistics over the chat log.")
+    parser.add_argument("--log", default=config.LOG_FILE_PATH)
+    parser.add_argument("--unit", choices=UNITS, default="turn",
+                        help="Rows are turns of each brain, or individual LLM calls")
+    parser.add_argument("--group-by", default="day,brain",
+                        help=f"Comma-separated; turns: {','.join(GROUP_KEYS['turn'])}; "
+                             f"calls: {','.join(GROUP_KEYS['call'])}")
+    parser.add_argument("--metric", choices=METRICS, default="wall_time")
+    parser.add_argument("--percentiles", default=",".join(str(p) for p in DEFAULT_PERCENTILES))
+    parser.add_argument("--since", help="Only turns at or after this ISO timestamp or date")
+    parser.add_argument("--until", help="Only turns at or before this ISO timestamp or date")
+    parser.add_argument("--format", choices=("table", "csv"), default="table")
+    parser.add_argument("--output", help="Write to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    until = args.until
+    if until and "T" not in until:  # A bare date includes that whole day
+        until += "T23:59:59.999999"
+    started_at = time.perf_counter()
+    columns = load_columns(args.log, args.since, until)
+    loaded_at = time.perf_counter()
+    try:
+        stats = summarize(columns, args.unit, _list(args.group_by), args.metric,
+                          [float(p) for p in _list(args.percentiles)], args.since, until)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"{columns.entries} entries loaded in {loaded_at - started_at:.2f}s, "
+          f"aggregated in {time.perf_counter() - loaded_at:.3f}s", file=sys.stderr)
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            write_csv(stats, out)
+        else:
+            print(format_table(stats), file=out)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Columnar copy of chat log entries, for analytics without re-parsing the JSON log.
+
+LogColumns turns entries into typed arrays: one set per entry (timestamp, which
+brains answered, response lengths) and one per logged LLM call (stage, model,
+error, latency and tokens). Sealed log segments never change, so their columns are
+saved next to them ("<segment>.columns.npz", see log_segments.py) and loaded with
+np.load instead of decoding millions of JSON lines.
+"""
+import os
+import tempfile
+from array import array
+from typing import Dict, Any, List
+
+import numpy as np
+
+# Bump when the saved columns change, so older files are rebuilt
+FORMAT_VERSION = 1
+
+BRAINS = ("thinking", "direct")
+STAGES = ("plan", "final", "plan_answer", "direct")
+STAGE_CODES = {stage: code for code, stage in enumerate(STAGES)}
+# Index into BRAINS of each stage
+STAGE_BRAIN = np.array([0, 0, 0, 1])
+
+ENTRY_COLUMNS = {"has_thinking": "b", "has_direct": "b", "thinking_chars": "d", "direct_chars": "d",
+                 "plan_chars": "d"}
+CALL_COLUMNS = {"entry": "l", "stage": "l", "model": "l", "error": "b", "wall_time": "d", "ttft": "d",
+                "prompt_tokens": "d", "completion_tokens": "d"}
+CALL_METRICS = ("wall_time", "ttft", "prompt_tokens", "completion_tokens")
+
+_NUMBER_TYPES = (int, float)
+_NAN = float("nan")
+
+
+class _Labels:
+    """Integer codes for the distinct strings of a column."""
+
+    def __init__(self):
+        self.labels: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, label: str) -> int:
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+
+def parse_times(timestamps: List[str]) -> np.ndarray:
+    """ISO timestamps as datetime64[us]; missing or unreadable ones become NaT."""
+    try:
+        return np.array(timestamps, dtype="datetime64[us]")
+    except ValueError:
+        times = np.empty(len(timestamps), dtype="datetime64[us]")
+        for i, timestamp in enumerate(timestamps):
+            try:
+                times[i] = np.datetime64(timestamp, "us")
+            except ValueError:
+                times[i] = np.datetime64("NaT")
+        return times
+
+
+class LogColumns:
+    """Chat log entries as columns, built by add_entry() or by extend() with saved columns."""
+
+    def __init__(self):
+        self.entries = 0
+        self.models = _Labels()
+        self._chunks: List[Dict[str, np.ndarray]] = []
+        self._start_chunk()
+
+    def _start_chunk(self) -> None:
+        self._timestamps: List[str] = []
+        self._entry = {name: array(typecode) for name, typecode in ENTRY_COLUMNS.items()}
+        self._call = {name: array(typecode) for name, typecode in CALL_COLUMNS.items()}
+
+    def _flush(self) -> None:
+        if not self._timestamps:
+            return
+        chunk = {name: np.array(column, dtype=typecode) for columns, typecodes in
+                 ((self._entry, ENTRY_COLUMNS), (self._call, CALL_COLUMNS))
+                 for (name, column), typecode in zip(columns.items(), typecodes.values())}
+        chunk["time"] = parse_times(self._timestamps)
+        self._chunks.append(chunk)
+        self._start_chunk()
+
+    def add_entry(self, entry: Dict[str, Any]) -> None:
+        index = self.entries
+        self.entries += 1
+        self._timestamps.append(str(entry.get("timestamp") or ""))
+        columns = self._entry
+        for brain, field in (("thinking", "thinking_response"), ("direct", "direct_response"),
+                             ("plan", "thinking_plan")):
+            value = entry.get(field)
+            columns[brain + "_chars"].append(len(value) if value.__class__ is str else _NAN)
+            if brain != "plan":
+                columns["has_" + brain].append(field in entry)
+
+        metrics = entry.get("metrics")
+        if metrics.__class__ is not dict:
+            return
+        calls = self._call
+        for stage, record in metrics.items():
+            stage_code = STAGE_CODES.get(stage)
+            if stage_code is None or record.__class__ is not dict:
+                continue
+            calls["entry"].append(index)
+            calls["stage"].append(stage_code)
+            calls["model"].append(self.models.code(record.get("model") or "unknown"))
+            calls["error"].append(bool(record.get("error")))
+            for field in CALL_METRICS:
+                value = record.get(field)
+                calls[field].append(value if value.__class__ in _NUMBER_TYPES else _NAN)
+
+    def extend(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Append columns returned by arrays() or load() of another LogColumns."""
+        self._flush()
+        count = len(arrays["time"])
+        if not count:
+            return
+        models = np.array([self.models.code(str(m)) for m in arrays["models"]] or [0], dtype=np.int64)
+        chunk = {name: arrays[name] for name in (*ENTRY_COLUMNS, *CALL_COLUMNS, "time")}
+        chunk["entry"] = arrays["entry"] + self.entries
+        chunk["model"] = models[arrays["model"]]
+        self._chunks.append(chunk)
+        self.entries += count
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """All columns as NumPy arrays, plus "models" (the labels of the model codes)."""
+        self._flush()
+        result = {}
+        for name, typecode in (*ENTRY_COLUMNS.items(), *CALL_COLUMNS.items(), ("time", "datetime64[us]")):
+            parts = [chunk[name] for chunk in self._chunks]
+            result[name] = np.concatenate(parts) if parts else np.zeros(0, dtype=typecode)
+        if len(self._chunks) > 1:  # Later calls reuse the merged arrays
+            self._chunks = [{name: result[name] for name in result}]
+        result["models"] = np.array(self.models.labels, dtype=str)
+        return result
+
+    def save(self, path: str) -> None:
+        """Write the columns to an .npz file atomically."""
+        directory = os.path.dirname(path) or "."
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, version=np.array(FORMAT_VERSION), **self.arrays())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+def load(path: str) -> Dict[str, np.ndarray]:
+    """Columns saved by LogColumns.save(); raises ValueError if they are in an older format."""
+    with np.load(path) as saved:
+        if int(saved["version"]) != FORMAT_VERSION:
+            raise ValueError(f"{path} has columns in an older format")
+        return {name: saved[name] for name in saved.files if name != "version"}
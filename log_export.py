@@ -0,0 +1,141 @@
+"""Streaming export of the chat log as JSONL or CSV, optionally gzip-compressed.
+
+Entries are read one at a time from the log (rotated segments included, and only the
+segments overlapping the requested dates) and encoded in chunks, so exporting never
+holds the whole log in memory. The download button builds its file on demand this
+way, and `python log_export.py` writes an export from the shell.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import tempfile
+import zlib
+from typing import Dict, Any, BinaryIO, Iterator, Optional, Sequence
+
+import config
+from utils import iter_chat_history, user_input_of
+
+FORMATS = ("jsonl", "csv")
+# CSV columns (and the fields offered for filtering) in export order
+EXPORT_FIELDS = ("timestamp", "user_input", "thinking_plan", "thinking_response", "direct_response",
+                 "handler_response", "metrics")
+CHUNK_SIZE = 64 * 1024
+
+MIME_TYPES = {"jsonl": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _project(entry: Dict[str, Any], fields: Sequence[str]) -> Dict[str, Any]:
+    projected = {field: entry.get(field) for field in fields}
+    if "user_input" in projected:
+        projected["user_input"] = user_input_of(entry)
+    return projected
+
+
+def _encode_jsonl(entries: Iterator[Dict[str, Any]], fields: Optional[Sequence[str]]) -> Iterator[str]:
+    for entry in entries:
+        yield json.dumps(_project(entry, fields) if fields else entry, ensure_ascii=False) + "\n"
+
+
+def _encode_csv(entries: Iterator[Dict[str, Any]], fields: Sequence[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for entry in entries:
+        row = _project(entry, fields)
+        writer.writerow(["" if value is None else value if isinstance(value, str) else json.dumps(value)
+                         for value in row.values()])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_export(file_path: str, fmt: str = "jsonl", compress: bool = False, start: Optional[str] = None,
+                end: Optional[str] = None, fields: Optional[Sequence[str]] = None,
+                chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the export of the log at file_path as byte chunks of roughly chunk_size.
+
+    start/end are inclusive ISO timestamp bounds; fields limits the exported fields
+    (CSV exports all EXPORT_FIELDS when none are given).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    entries = iter_chat_history(file_path, start, end)
+    if fmt == "csv":
+        lines = _encode_csv(entries, list(fields or EXPORT_FIELDS))
+    else:
+        lines = _encode_jsonl(entries, list(fields or ()))
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31: gzip container
+
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    pending, size = [], 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            chunk = encode("".join(pending))
+            pending, size = [], 0
+            if chunk:
+                yield chunk
+    chunk = encode("".join(pending))
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def write_export(out: BinaryIO, file_path: str, **options) -> int:
+    """Write an export (see iter_export for the options) to a binary file; returns the bytes written."""
+    written = 0
+    for chunk in iter_export(file_path, **options):
+        out.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def export_file(file_path: str, **options) -> BinaryIO:
+    """Build an export in a temporary file (kept in memory only while small) and return it rewound."""
+    out = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    write_export(out, file_path, **options)
+    out.seek(0)
+    return out
+
+
+def export_file_name(fmt: str, compress: bool) -> str:
+    return f"chat_history.{fmt}" + (".gz" if compress else "")
+
+
+def export_mime_type(fmt: str, compress: bool) -> str:
+    return "application/gzip" if compress else MIME_TYPES[fmt]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the chat log as JSONL or CSV.")
+    parser.add_argument("--log", default=config.LOG_FILE_PATH)
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--gzip", action="store_true", help="Compress the export with gzip")
+    parser.add_argument("--since", help="Only turns at or after this ISO timestamp (e.g. 2024-01-31)")
+    parser.add_argument("--until", help="Only turns at or before this ISO timestamp or date")
+    parser.add_argument("--field", action="append", choices=EXPORT_FIELDS, help="Field to export (repeatable)")
+    parser.add_argument("--output", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    until = args.until
+    if until and "T" not in until:  # A bare date includes that whole day
+        until += "T23:59:59.999999"
+    options = dict(fmt=args.format, compress=args.gzip, start=args.since, end=until, fields=args.field)
+    if args.output:
+        with open(args.output, "wb") as out:
+            written = write_export(out, args.log, **options)
+        print(f"Wrote {written} bytes to {args.output}")
+    else:
+        write_export(sys.stdout.buffer, args.log, **options)
+
+
+if __name__ == '__main__':
+    main()
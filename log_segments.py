@@ -0,0 +1,216 @@
+"""Rotation of the JSONL chat log into numbered, compressed segments.
+
+Once the active log (e.g. logs/chat_history.jsonl) reaches a size or age limit, it is
+compressed into the next segment under logs/chat_history.jsonl.segments/ and a new
+active log is started. index.json next to the segments records each segment's entry
+count and first/last timestamps, so readers looking for a time window can skip the
+segments outside it without decompressing them.
+
+Segments are gzip-compressed; zstd is used instead if requested and the zstandard
+package is installed. Each segment also gets a columnar copy of its entries for
+log_analytics.py ("<segment>.columns.npz", see log_columns.py).
+"""
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional
+
+import log_columns
+from blob_store import hydrate_entry
+from file_lock import locked
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd-compressed segments
+    zstandard = None
+
+SEGMENT_SUFFIXES = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+
+def segment_dir(file_path: str) -> str:
+    return file_path + ".segments"
+
+
+def _index_path(file_path: str) -> str:
+    return os.path.join(segment_dir(file_path), "index.json")
+
+
+def _open_segment(path: str, mode: str):
+    """Open a segment for reading ("rt") or writing ("wt"), by its file suffix."""
+    if path.endswith(SEGMENT_SUFFIXES["zstd"]):
+        if zstandard is None:
+            raise RuntimeError(f"The zstandard package is needed to read {path}")
+        return zstandard.open(path, mode, encoding="utf-8")
+    return gzip.open(path, mode, encoding="utf-8")
+
+
+def read_index(file_path: str) -> List[Dict[str, Any]]:
+    """Return the segment index of a log, oldest segment first."""
+    try:
+        with open(_index_path(file_path), "r", encoding="utf-8") as f:
+            return json.load(f)["segments"]
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        print(f"Error reading log segment index: {e}")
+        return []
+
+
+def _write_index(file_path: str, segments: List[Dict[str, Any]]) -> None:
+    path = _index_path(file_path)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"segments": segments}, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def segments_in_range(file_path: str, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Segments that may hold entries timestamped within [start, end] (ISO strings; None is open-ended)."""
+    return [
+        segment for segment in read_index(file_path)
+        if (start is None or segment["last_timestamp"] is None or segment["last_timestamp"] >= start)
+        and (end is None or segment["first_timestamp"] is None or segment["first_timestamp"] <= end)
+    ]
+
+
+def iter_segment_lines(file_path: str, segment: Dict[str, Any]) -> Iterator[str]:
+    with _open_segment(os.path.join(segment_dir(file_path), segment["file"]), "rt") as f:
+        yield from f
+
+
+def _columns_path(file_path: str, segment: Dict[str, Any]) -> str:
+    return os.path.join(segment_dir(file_path), segment["file"] + ".columns.npz")
+
+
+def _save_columns(file_path: str, segment: Dict[str, Any], columns: "log_columns.LogColumns") -> None:
+    try:
+        columns.save(_columns_path(file_path, segment))
+    except OSError as e:
+        print(f"Error saving columns of log segment {segment['file']}: {e}")
+
+
+def read_segment_columns(file_path: str, segment: Dict[str, Any]) -> Dict[str, Any]:
+    """The segment's entries as columns (see log_columns.py).
+
+    Segments sealed before columns were saved with them get theirs built from the
+    segment's lines and saved on first use.
+    """
+    try:
+        return log_columns.load(_columns_path(file_path, segment))
+    except (OSError, ValueError, KeyError):
+        pass
+    columns = log_columns.LogColumns()
+    for line in iter_segment_lines(file_path, segment):
+        if line.strip():
+            try:
+                columns.add_entry(hydrate_entry(json.loads(line), file_path))
+            except (ValueError, AttributeError):
+                continue
+    _save_columns(file_path, segment, columns)
+    return columns.arrays()
+
+
+def _line_timestamp(line: str) -> Optional[str]:
+    try:
+        return json.loads(line).get("timestamp")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _seal(file_path: str, rotating_path: str, compression: str) -> Dict[str, Any]:
+    """Compress a rotated-out log into the next segment and add it to the index."""
+    if compression == "zstd" and zstandard is None:
+        print("zstandard is not installed; compressing log segments with gzip")
+        compression = "gzip"
+    os.makedirs(segment_dir(file_path), exist_ok=True)
+    segments = read_index(file_path)
+    number = segments[-1]["number"] + 1 if segments else 1
+    name = f"{number:06d}{SEGMENT_SUFFIXES[compression]}"
+    path = os.path.join(segment_dir(file_path), name)
+
+    entries, first, last = 0, None, None
+    columns = log_columns.LogColumns()
+    with open(rotating_path, "r", encoding="utf-8") as src, _open_segment(path + ".tmp", "wt") as out:
+        for line in src:
+            if not line.strip():
+                continue
+            out.write(line if line.endswith("\n") else line + "\n")
+            entries += 1
+            try:
+                entry = json.loads(line)
+                timestamp = entry.get("timestamp")
+                columns.add_entry(hydrate_entry(entry, file_path))
+            except (ValueError, AttributeError):
+                timestamp = None
+            if timestamp is not None:
+                first = timestamp if first is None else min(first, timestamp)
+                last = timestamp if last is None else max(last, timestamp)
+    os.replace(path + ".tmp", path)
+    segment = {"number": number, "file": name, "entries": entries, "first_timestamp": first,
+               "last_timestamp": last, "bytes": os.path.getsize(path)}
+    _save_columns(file_path, segment, columns)
+    _write_index(file_path, segments + [segment])
+    os.remove(rotating_path)
+    return segment
+
+
+def _recover(file_path: str, compression: str) -> None:
+    rotating_path = file_path + ".rotating"
+    if os.path.exists(rotating_path):
+        _seal(file_path, rotating_path, compression)
+
+
+def recover(file_path: str, compression: str = "gzip") -> None:
+    """Finish a rotation interrupted by a crash, if any."""
+    with locked(file_path):
+        _recover(file_path, compression)
+
+
+def _rotate(file_path: str, compression: str) -> Optional[Dict[str, Any]]:
+    _recover(file_path, compression)
+    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+        return None
+    rotating_path = file_path + ".rotating"
+    os.replace(file_path, rotating_path)
+    return _seal(file_path, rotating_path, compression)
+
+
+def rotate(file_path: str, compression: str = "gzip") -> Optional[Dict[str, Any]]:
+    """Move the active log into a new compressed segment; returns the segment's index entry."""
+    with locked(file_path):  # Appends (from any process) wait until the log has been moved
+        return _rotate(file_path, compression)
+
+
+def needs_rotation(file_path: str, max_bytes: int = 0, max_age_seconds: float = 0) -> bool:
+    """True once the active log is max_bytes long, or its first entry is max_age_seconds old (0 disables either)."""
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        return False
+    if size == 0:
+        return False
+    if max_bytes and size >= max_bytes:
+        return True
+    if max_age_seconds:
+        with open(file_path, "r", encoding="utf-8") as f:
+            timestamp = _line_timestamp(f.readline())
+        try:
+            age = (datetime.now() - datetime.fromisoformat(timestamp)).total_seconds()
+        except (TypeError, ValueError):
+            return False
+        return age >= max_age_seconds
+    return False
+
+
+def maybe_rotate(file_path: str, max_bytes: int = 0, max_age_seconds: float = 0,
+                 compression: str = "gzip") -> Optional[Dict[str, Any]]:
+    """Rotate the active log if it has reached its size or age limit."""
+    try:
+        if needs_rotation(file_path, max_bytes, max_age_seconds):
+            with locked(file_path):
+                # Another process may have rotated it while we waited for the lock
+                if needs_rotation(file_path, max_bytes, max_age_seconds):
+                    return _rotate(file_path, compression)
+    except Exception as e:
+        print(f"Error rotating chat log: {e}")
+    return None
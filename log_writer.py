@@ -0,0 +1,227 @@
+"""Background writer for the chat log.
+
+Turns hand their log entries to a LogWriter instead of writing the file themselves.
+A single thread per log file takes them from a bounded queue and appends them in
+batches (up to batch_size entries, or whatever arrived within flush_seconds), so a
+turn only pays for a queue put. The fsync policy decides durability:
+
+  "never"  leave flushing to the OS (fastest; a machine crash can lose recent entries)
+  "batch"  fsync after each batch (an entry is durable within about flush_seconds)
+  "entry"  fsync after every entry (slowest; each entry is durable once written)
+
+When the queue is full the caller is held back (backpressure) for up to
+enqueue_timeout seconds, then writes its entry synchronously so nothing is lost.
+close() drains the queue; the process-wide writer is closed at exit.
+
+Large fields can be moved into a content-addressed blob store (see blob_store.py)
+before the entries are written. Each batch is also inserted into the optional SQLite
+history store (see history_store.py) in one transaction. After each batch the writer
+rotates the log into a compressed segment once it reaches max_bytes or
+max_age_seconds (see log_segments.py).
+"""
+import atexit
+import queue
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+import config
+import log_segments
+from blob_store import BlobStore, blob_dir
+from history_store import get_history_store
+from utils import append_chat_log, with_timestamp
+
+FSYNC_POLICIES = ("never", "batch", "entry")
+
+_STOP = object()
+
+
+def _dehydrate(blobs: Optional[BlobStore], entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Move large fields into the blob store; entries are logged in full if that fails."""
+    if blobs is None:
+        return entries
+    try:
+        return [blobs.dehydrate(entry) for entry in entries]
+    except Exception as e:
+        print(f"Error storing chat log blobs: {e}")
+        return entries
+
+
+class LogWriter:
+    """Appends chat log entries to a JSONL file from a background thread."""
+
+    def __init__(self, file_path: str, max_queue: int = 1000, batch_size: int = 50, flush_seconds: float = 0.5,
+                 fsync: str = "batch", enqueue_timeout: float = 5.0, rotate_max_bytes: int = 0,
+                 rotate_max_age_seconds: float = 0, compression: str = "gzip", store=None,
+                 blobs: Optional[BlobStore] = None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.file_path = file_path
+        self.batch_size = max(batch_size, 1)
+        self.flush_seconds = flush_seconds
+        self.fsync = fsync
+        self.enqueue_timeout = enqueue_timeout
+        self.rotate_max_bytes = rotate_max_bytes
+        self.rotate_max_age_seconds = rotate_max_age_seconds
+        self.compression = compression
+        self.store = store
+        self.blobs = blobs
+        self._queue = queue.Queue(maxsize=max_queue)
+        # Serializes file writes between the writer thread and callers writing synchronously
+        self._file_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"entries": 0, "batches": 0, "write_errors": 0, "blocked_puts": 0, "sync_writes": 0,
+                       "rotations": 0}
+        if rotate_max_bytes or rotate_max_age_seconds:
+            log_segments.recover(file_path, compression)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        """Queue an entry to be appended to the log."""
+        entry = with_timestamp(entry)  # Stamped now, not when the writer gets to it
+        if self._closed:
+            self._write_now([entry])
+            return
+        try:
+            self._queue.put_nowait(entry)
+            return
+        except queue.Full:
+            self._count("blocked_puts")
+        try:
+            self._queue.put(entry, timeout=self.enqueue_timeout)
+        except queue.Full:
+            print(f"Chat log queue full for {self.enqueue_timeout}s; writing entry synchronously")
+            self._count("sync_writes")
+            self._write_now([entry])
+
+    def _write_now(self, entries: List[Dict[str, Any]]) -> None:
+        lines = _dehydrate(self.blobs, entries)
+        with self._file_lock:
+            if self.fsync == "entry":
+                ok = all([append_chat_log(line, self.file_path, fsync=True) for line in lines])
+            else:
+                ok = append_chat_log(lines, self.file_path, fsync=self.fsync == "batch")
+            rotated = log_segments.maybe_rotate(self.file_path, self.rotate_max_bytes, self.rotate_max_age_seconds,
+                                                self.compression)
+        if rotated is not None:
+            self._count("rotations")
+        if self.store is not None:
+            try:
+                self.store.add_many(entries)
+            except Exception as e:
+                print(f"Error adding chat log entries to the history store: {e}")
+        self._count("entries" if ok else "write_errors", len(entries))
+        self._count("batches")
+
+    def _next_batch(self) -> List[Any]:
+        """Block for the first entry, then gather more until the batch is full or flush_seconds pass."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            entries = [entry for entry in batch if entry is not _STOP]
+            try:
+                if entries:
+                    self._write_now(entries)
+            except Exception as e:
+                print(f"Chat log writer error: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(entries) < len(batch):
+                return
+
+    def flush(self) -> None:
+        """Block until every entry queued so far has been written."""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Write out the queued entries and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"Chat log writer did not drain within {timeout}s")
+            return
+        # Entries that raced in behind the stop marker
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._write_now(leftover)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+
+def _blob_store() -> Optional[BlobStore]:
+    if not config.BLOB_STORE_ENABLED:
+        return None
+    return BlobStore(blob_dir(config.LOG_FILE_PATH), config.BLOB_MIN_SIZE, fsync=config.LOG_FSYNC != "never")
+
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    """Return the process-wide writer for config.LOG_FILE_PATH, or None if background writing is disabled."""
+    global _log_writer
+    if not config.LOG_WRITER_ENABLED:
+        return None
+    with _log_writer_lock:
+        if _log_writer is None:
+            _log_writer = LogWriter(
+                config.LOG_FILE_PATH, config.LOG_WRITER_QUEUE_SIZE, config.LOG_WRITER_BATCH_SIZE,
+                config.LOG_WRITER_FLUSH_SECONDS, config.LOG_FSYNC, config.LOG_WRITER_ENQUEUE_TIMEOUT_SECONDS,
+                config.LOG_ROTATE_MAX_BYTES, config.LOG_ROTATE_MAX_AGE_SECONDS, config.LOG_SEGMENT_COMPRESSION,
+                get_history_store(), _blob_store()
+            )
+            atexit.register(_log_writer.close)
+        return _log_writer
+
+
+def log_chat_entry(entry: Dict[str, Any]) -> None:
+    """Record a turn in the chat log, through the background writer when it is enabled."""
+    writer = get_log_writer()
+    if writer is None:
+        entry = with_timestamp(entry)
+        append_chat_log(_dehydrate(_blob_store(), [entry]), config.LOG_FILE_PATH,
+                        fsync=config.LOG_FSYNC != "never")
+        if get_history_store() is not None:
+            get_history_store().add_many([entry])
+        log_segments.maybe_rotate(config.LOG_FILE_PATH, config.LOG_ROTATE_MAX_BYTES,
+                                  config.LOG_ROTATE_MAX_AGE_SECONDS, config.LOG_SEGMENT_COMPRESSION)
+    else:
+        writer.write(entry)
+
+
+def flush_chat_log() -> None:
+    """Make sure every entry logged so far is in the log file (e.g. before reading it)."""
+    writer = get_log_writer()
+    if writer is not None:
+        writer.flush()
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+import config
+from cancellation import current_token
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class MetricsRecorder:
+    """Thread-safe ring buffer of per-call latency and token usage records."""
+
+    def __init__(self, max_records: int = 1000):
+        self._records = deque(maxlen=max_records)
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._records.append(record)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """Add to a named process-wide counter (e.g. coalesced requests)."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def records(self, stage: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [r for r in self._records if stage is None or r["stage"] == stage]
+
+    def percentile(self, stage: str, field: str, q: float) -> Optional[float]:
+        """Return the q-th percentile of field over the successful calls of stage, or None without data."""
+        values = [r[field] for r in self.records(stage) if r.get(field) is not None and not r.get("error")]
+        if not values:
+            return None
+        return float(np.percentile(values, q))
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-stage call counts, latency percentiles and mean token usage."""
+        by_stage: Dict[str, List[Dict[str, Any]]] = {}
+        for r in self.records():
+            by_stage.setdefault(r["stage"], []).append(r)
+
+        counters = self.counters()
+        summary = {}
+        for stage, records in by_stage.items():
+            ok = [r for r in records if not r.get("error")]
+            stage_summary: Dict[str, Any] = {"calls": len(records), "errors": len(records) - len(ok)}
+            for field in ("wall_time", "ttft"):
+                values = np.array([r[field] for r in ok if r.get(field) is not None], dtype=float)
+                for q in PERCENTILES:
+                    stage_summary[f"{field}_p{q}"] = round(float(np.percentile(values, q)), 3) if values.size else None
+            for field in ("prompt_tokens", "completion_tokens"):
+                values = [r[field] for r in ok if r.get(field) is not None]
+                stage_summary[f"{field}_mean"] = round(float(np.mean(values)), 1) if values else None
+            if counters.get(f"{stage}.calls"):
+                hedges = counters.get(f"{stage}.hedges_sent", 0)
+                stage_summary["hedge_rate"] = round(hedges / counters[f"{stage}.calls"], 3)
+                stage_summary["hedge_wins"] = counters.get(f"{stage}.hedge_wins", 0)
+            summary[stage] = stage_summary
+        return summary
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self._counters.clear()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRecorder:
+    """Return the process-wide metrics recorder."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = MetricsRecorder(config.METRICS_MAX_RECORDS)
+        return _recorder
+
+
+class CallTimer:
+    """Times one LLM call. Call first_token() when streaming output starts, then finish()."""
+
+    def __init__(self, stage: str, model: str):
+        self.stage = stage
+        self.model = model
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+
+    def first_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def finish(self, usage=None, error: Optional[str] = None) -> Dict[str, Any]:
+        """Record the call in the process-wide recorder and return its record.
+
+        For non-streaming calls the first token arrives with the whole response,
+        so time-to-first-token equals wall time. Calls of a cancelled turn are
+        returned but not recorded, so they do not count as errors.
+        """
+        finished_at = time.perf_counter()
+        first_token_at = self.first_token_at or finished_at
+        record = {
+            "stage": self.stage,
+            "model": self.model,
+            "timestamp": time.time(),
+            "wall_time": round(finished_at - self.started_at, 4),
+            "ttft": None if error else round(first_token_at - self.started_at, 4),
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+        }
+        if error:
+            record["error"] = error
+        token = current_token()
+        if token is not None and token.cancelled:
+            record["cancelled"] = True
+            return record
+        get_metrics().record(record)
+        return record
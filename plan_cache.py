@@ -0,0 +1,114 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+import config
+from utils import ensure_directory_exists
+
+
+def normalize_input(user_input: str) -> str:
+    """Normalize user input so trivially different spellings share a cache entry."""
+    return " ".join(user_input.lower().split())
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """Exact-match cache of thinking plans, persisted in SQLite.
+
+    Entries are keyed by (planner prompt hash, model, normalized user input), expire
+    after ttl_seconds and are evicted least-recently-used once max_entries is exceeded.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 1000, ttl_seconds: float = 7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        ensure_directory_exists(os.path.dirname(db_path) or ".")
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            "key TEXT PRIMARY KEY, plan TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS plans_last_access ON plans (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt_hash: str, model: str, user_input: str) -> str:
+        return hash_text(f"{prompt_hash}\0{model}\0{normalize_input(user_input)}")
+
+    def get(self, prompt_hash: str, model: str, user_input: str) -> Optional[str]:
+        """Return the cached plan, or None on a miss or expired entry."""
+        key = self.make_key(prompt_hash, model, user_input)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT plan, created_at FROM plans WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE plans SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, prompt_hash: str, model: str, user_input: str, plan: str) -> None:
+        """Store a plan, evicting the least recently used entries beyond max_entries."""
+        key = self.make_key(prompt_hash, model, user_input)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plans (key, plan, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, plan, now, now)
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM plans WHERE key IN (SELECT key FROM plans ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM plans")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters for this process and the current number of entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": entries}
+
+
+_plan_cache = None
+_plan_cache_lock = threading.Lock()
+
+
+def get_plan_cache() -> Optional[PlanCache]:
+    """Return the process-wide plan cache, or None if plan caching is disabled."""
+    global _plan_cache
+    if not config.PLAN_CACHE_ENABLED:
+        return None
+    with _plan_cache_lock:
+        if _plan_cache is None:
+            _plan_cache = PlanCache(
+                config.PLAN_CACHE_PATH,
+                max_entries=config.PLAN_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.PLAN_CACHE_TTL_SECONDS
+            )
+        return _plan_cache
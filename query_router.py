@@ -0,0 +1,180 @@
+import argparse
+import os
+import re
+from typing import Dict, Any, List, Optional, NamedTuple
+
+import numpy as np
+
+import config
+from semantic_cache import HashingVectorizer
+from utils import load_chat_history, ensure_directory_exists
+
+TRIVIAL_PHRASES = {
+    "hi", "hello", "hey", "yo", "thanks", "thank you", "thx", "ok", "okay", "cool", "great", "nice",
+    "bye", "goodbye", "good morning", "good night", "good evening", "yes", "no", "sure", "got it",
+}
+REASONING_KEYWORDS = {
+    "why", "how", "explain", "compare", "difference", "analyze", "analyse", "design", "plan", "steps",
+    "strategy", "evaluate", "pros", "cons", "debug", "implement", "prove", "calculate", "optimize", "write",
+}
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+# A logged turn whose thinking response is longer than this (in words) is labelled
+# as having needed planning when training the router model.
+COMPLEX_RESPONSE_WORDS = 120
+
+
+class Route(NamedTuple):
+    plan: bool
+    score: float
+    threshold: float
+
+    def describe(self) -> str:
+        if not self.plan and self.score == 0.0:
+            return "Routing: planner skipped for a greeting or acknowledgement, answered in one call."
+        if self.plan:
+            return f"Routing: planner used (complexity {self.score:.2f} >= threshold {self.threshold:.2f})."
+        return f"Routing: planner skipped, answered in one call (complexity {self.score:.2f} < threshold {self.threshold:.2f})."
+
+
+def heuristic_score(text: str) -> float:
+    """Score how much a query is likely to benefit from planning, from 0 (trivial) to 1 (complex).
+
+    Only empty input and the greetings and acknowledgements in TRIVIAL_PHRASES score 0.
+    Length adds 0.0125 per word (0.5 at 40 words), a reasoning keyword 0.25, more than
+    one sentence or question 0.1, and code, line breaks or arithmetic 0.15. So
+    "What's the capital of France?" scores 0.06, "How do I reset my password?" 0.32.
+    """
+    normalized = " ".join(_WORD_PATTERN.findall(text.lower()))
+    words = normalized.split()
+    if not words or normalized in TRIVIAL_PHRASES:
+        return 0.0
+
+    score = min(len(words) / 40, 1.0) * 0.5
+    if any(word in REASONING_KEYWORDS for word in words):
+        score += 0.25
+    if text.count("?") > 1 or len(re.findall(r"[.!?](\s|$)", text)) > 1:
+        score += 0.1
+    if "`" in text or "\n" in text or re.search(r"\d\s*[-+*/^=]\s*\d", text):
+        score += 0.15
+    return min(score, 1.0)
+
+
+class RouterModel:
+    """Logistic regression over hashed word features, trained on logged history."""
+
+    def __init__(self, weights: np.ndarray, bias: float, dim: int):
+        self.weights = weights
+        self.bias = bias
+        self.vectorizer = HashingVectorizer(dim)
+
+    def _features(self, texts: List[str]) -> np.ndarray:
+        features = np.stack([self.vectorizer.embed(text) for text in texts])
+        lengths = np.array([[min(len(text.split()) / 40, 1.0), heuristic_score(text)] for text in texts],
+                           dtype=np.float32)
+        return np.hstack([features, lengths])
+
+    def predict(self, text: str) -> float:
+        z = float(self._features([text])[0] @ self.weights + self.bias)
+        return float(1 / (1 + np.exp(-z)))
+
+    @classmethod
+    def train(cls, texts: List[str], labels: List[int], dim: int = 256, epochs: int = 300,
+              learning_rate: float = 0.5, l2: float = 1e-3) -> "RouterModel":
+        model = cls(np.zeros(dim + 2, dtype=np.float32), 0.0, dim)
+        x = model._features(texts)
+        y = np.asarray(labels, dtype=np.float32)
+        for _ in range(epochs):
+            p = 1 / (1 + np.exp(-(x @ model.weights + model.bias)))
+            error = p - y
+            model.weights -= learning_rate * (x.T @ error / len(y) + l2 * model.weights)
+            model.bias -= learning_rate * float(error.mean())
+        return model
+
+    def save(self, path: str) -> None:
+        ensure_directory_exists(os.path.dirname(path) or ".")
+        np.savez(path, weights=self.weights, bias=self.bias, dim=self.vectorizer.dim)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["RouterModel"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path)
+            return cls(data["weights"], float(data["bias"]), int(data["dim"]))
+        except Exception as e:
+            print(f"Error loading router model: {e}")
+            return None
+
+
+class QueryRouter:
+    """Decides whether a query goes through the planner or is answered in a single call."""
+
+    def __init__(self, threshold: float, model: Optional[RouterModel] = None):
+        self.threshold = threshold
+        self.model = model
+
+    def score(self, user_input: str) -> float:
+        score = heuristic_score(user_input)
+        if self.model is not None:
+            # Trivial phrases stay trivial; otherwise blend in the learned estimate
+            score = 0.0 if score == 0.0 else (score + self.model.predict(user_input)) / 2
+        return score
+
+    def route(self, user_input: str) -> Route:
+        """Plan unless the query scores 0 (a greeting or acknowledgement) or below the threshold."""
+        score = self.score(user_input)
+        return Route(plan=score > 0.0 and score >= self.threshold, score=score, threshold=self.threshold)
+
+
+def training_examples(history: List[Dict[str, Any]]) -> tuple:
+    """Label logged turns: 1 if the thinking response was long enough to have needed a plan."""
+    texts, labels = [], []
+    for entry in history:
+        if "user_input" not in entry or not entry.get("thinking_response"):
+            continue
+        texts.append(entry["user_input"])
+        labels.append(int(len(entry["thinking_response"].split()) > COMPLEX_RESPONSE_WORDS))
+    return texts, labels
+
+
+_router = None
+
+
+def get_query_router() -> Optional[QueryRouter]:
+    """Return the process-wide router, or None if the planner bypass is disabled."""
+    global _router
+    if not config.PLANNER_BYPASS_ENABLED:
+        return None
+    if _router is None:
+        _router = QueryRouter(config.PLANNER_BYPASS_THRESHOLD, RouterModel.load(config.ROUTER_MODEL_PATH))
+    return _router
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or try the planner bypass router.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Train the router model from the chat log")
+    train_parser.add_argument("--log", default=config.LOG_FILE_PATH)
+    train_parser.add_argument("--output", default=config.ROUTER_MODEL_PATH)
+    score_parser = subparsers.add_parser("score", help="Show the routing decision for a query")
+    score_parser.add_argument("text")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        texts, labels = training_examples(load_chat_history(args.log))
+        if len(set(labels)) < 2:
+            print(f"Need both simple and complex examples to train; found {len(texts)} labelled turns.")
+            return
+        model = RouterModel.train(texts, labels)
+        model.save(args.output)
+        accuracy = np.mean([(model.predict(t) >= 0.5) == bool(l) for t, l in zip(texts, labels)])
+        print(f"Trained on {len(texts)} turns ({sum(labels)} complex), training accuracy {accuracy:.2f}.")
+        print(f"Saved router model to {args.output}")
+    else:
+        router = QueryRouter(config.PLANNER_BYPASS_THRESHOLD, RouterModel.load(config.ROUTER_MODEL_PATH))
+        print(router.route(args.text).describe())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""Process-wide scheduling of OpenAI calls under the account's rate limits.
+
+Every chat completion and speech request from every Streamlit session passes through
+one RequestScheduler. Before a request is sent it waits for room in two token buckets
+per model (requests/min and tokens/min), queueing by priority class so that voice
+interactions go first. Rate-limit, connection and server errors are retried with
+exponential backoff and jitter, honoring the server's Retry-After.
+"""
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Callable, Dict, Any, Optional
+
+import openai
+
+import config
+
+# Lower rank is served first
+PRIORITIES = {"voice": 0, "interactive": 1, "background": 2}
+
+_priority = contextvars.ContextVar("request_priority", default="interactive")
+
+
+@contextmanager
+def request_priority(priority: str):
+    """Run the enclosed OpenAI calls with the given priority class (also usable as a decorator)."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class TokenBucket:
+    """Continuously refilled bucket holding up to one minute's worth of a per-minute limit."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (0 if it can be taken now)."""
+        if self.capacity <= 0:  # Unlimited
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(missing / self.rate, 0.0)
+
+    def take(self, amount: float, now: float) -> None:
+        if self.capacity > 0:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+
+class _ModelLimits:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.waiting = []  # Heap of (priority rank, arrival number)
+        self.paused_until = 0.0  # Set from Retry-After when the server rate limits us
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Return the delay the server asked for in a Retry-After(-ms) header, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[name]) * scale
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+class RequestScheduler:
+    """Admits OpenAI calls under per-model RPM/TPM limits, by priority, and retries transient failures."""
+
+    RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_retries: int = 5,
+                 retry_base_seconds: float = 0.5, retry_max_seconds: float = 30.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._models: Dict[str, _ModelLimits] = {}
+        self._cond = threading.Condition()
+        self._arrivals = itertools.count()
+        self._stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failed": 0, "queued_seconds": 0.0}
+
+    def _limits(self, model: str) -> _ModelLimits:
+        if model not in self._models:
+            self._models[model] = _ModelLimits(self.requests_per_minute, self.tokens_per_minute)
+        return self._models[model]
+
+    def acquire(self, model: str, tokens: int, priority: Optional[str] = None) -> float:
+        """Block until the request may be sent; returns the seconds spent waiting."""
+        started_at = time.monotonic()
+        entry = (PRIORITIES[priority or current_priority()], next(self._arrivals))
+        with self._cond:
+            limits = self._limits(model)
+            heapq.heappush(limits.waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = limits.paused_until - now
+                    if limits.waiting[0] == entry and wait <= 0:
+                        wait = max(limits.requests.wait_time(1, now), limits.tokens.wait_time(tokens, now))
+                        if wait <= 0:
+                            limits.requests.take(1, now)
+                            limits.tokens.take(tokens, now)
+                            break
+                    # Only the head of the queue wakes up on its own; the rest wait for their turn
+                    self._cond.wait(timeout=wait if wait > 0 else None)
+            finally:
+                limits.waiting.remove(entry)
+                heapq.heapify(limits.waiting)
+                self._cond.notify_all()
+            waited = time.monotonic() - started_at
+            self._stats["requests"] += 1
+            self._stats["queued_seconds"] += waited
+        return waited
+
+    def _pause(self, model: str, seconds: float) -> None:
+        with self._cond:
+            limits = self._limits(model)
+            limits.paused_until = max(limits.paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            # A little jitter so sessions released together do not all retry at once
+            return retry_after + random.uniform(0, 0.1 * retry_after + 0.05)
+        return random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+
+    def call(self, fn: Callable[[], Any], model: str, tokens: int = 0, priority: Optional[str] = None,
+             deadline: Optional[float] = None) -> Any:
+        """Run fn once admitted, retrying transient failures until max_retries or the deadline (monotonic)."""
+        priority = priority or current_priority()
+        for attempt in itertools.count():
+            self.acquire(model, tokens, priority)
+            try:
+                return fn()
+            except self.RETRYABLE_ERRORS as e:
+                rate_limited = isinstance(e, openai.RateLimitError)
+                if rate_limited and getattr(e, "code", None) == "insufficient_quota":
+                    raise  # Out of credit; retrying will not help
+                delay = self._retry_delay(e, attempt)
+                out_of_time = deadline is not None and time.monotonic() + delay > deadline
+                with self._cond:
+                    if attempt >= self.max_retries or out_of_time:
+                        self._stats["failed"] += 1
+                        raise
+                    self._stats["retries"] += 1
+                    self._stats["rate_limited"] += int(rate_limited)
+                print(f"OpenAI call to {model} failed ({type(e).__name__}); retrying in {delay:.1f}s")
+                if rate_limited:
+                    self._pause(model, delay)  # Hold back every session's requests to this model
+                else:
+                    time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queued_seconds"] = round(stats["queued_seconds"], 3)
+            stats["waiting"] = sum(len(limits.waiting) for limits in self._models.values())
+        return stats
+
+
+def estimate_tokens(messages, max_tokens: Optional[int]) -> int:
+    """Tokens a chat request counts against the TPM limit: the prompt (about 4 chars per token) plus max_tokens."""
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in messages or [])
+    return prompt_chars // 4 + (max_tokens or 0)
+
+
+class ScheduledClient:
+    """Wraps an openai.OpenAI client so chat and speech calls go through a RequestScheduler.
+
+    Call sites keep using client.chat.completions.create(...) and client.audio.speech.create(...);
+    every other attribute is forwarded to the wrapped client.
+    """
+
+    def __init__(self, client: openai.OpenAI, scheduler: RequestScheduler):
+        self.raw = client
+        self.scheduler = scheduler
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+        self.audio = SimpleNamespace(speech=SimpleNamespace(create=self._create_speech))
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    @staticmethod
+    def _deadline(kwargs: Dict[str, Any]) -> Optional[float]:
+        timeout = kwargs.get("timeout")
+        return time.monotonic() + timeout if isinstance(timeout, (int, float)) else None
+
+    def _create_chat_completion(self, **kwargs):
+        return self.scheduler.call(
+            lambda: self.raw.chat.completions.create(**kwargs),
+            model=kwargs.get("model", ""),
+            tokens=estimate_tokens(kwargs.get("messages"), kwargs.get("max_tokens")),
+            deadline=self._deadline(kwargs)
+        )
+
+    def _create_speech(self, **kwargs):
+        return self.scheduler.call(
+            lambda: self.raw.audio.speech.create(**kwargs),
+            model=kwargs.get("model", ""),
+            deadline=self._deadline(kwargs)
+        )
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Optional[RequestScheduler]:
+    """Return the process-wide scheduler, or None if rate limiting is disabled."""
+    global _scheduler
+    if not config.RATE_LIMIT_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(
+                config.OPENAI_REQUESTS_PER_MINUTE, config.OPENAI_TOKENS_PER_MINUTE,
+                config.OPENAI_MAX_RETRIES, config.OPENAI_RETRY_BASE_SECONDS, config.OPENAI_RETRY_MAX_SECONDS
+            )
+        return _scheduler
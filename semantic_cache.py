@@ -0,0 +1,250 @@
+import atexit
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import config
+from utils import ensure_directory_exists
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+# Words that can be added, dropped or reordered without changing what is asked. Negations,
+# question words and prepositions are not in it: "not", "why" or "off" change the meaning.
+_STOPWORDS = frozenset("""
+    a an the is are was were be been am do does did can could would i me my we us our you your it its
+    this that these those they them their he she him her his of to for and please just exactly really
+    actually
+""".split())
+
+
+# "t" is what is left of "don't", "isn't" and the like
+_NEGATIONS = frozenset(("not", "no", "never", "nor", "none", "nothing", "without", "t"))
+
+
+def content_words(text: str) -> frozenset:
+    """The words of text that carry its meaning (lowercased, stopwords removed)."""
+    return frozenset(word for word in _TOKEN_PATTERN.findall(text.lower()) if word not in _STOPWORDS)
+
+
+def content_overlap(words: frozenset, cached: Optional[frozenset]) -> float:
+    """Share of their content words two inputs have in common (Jaccard), from 0 to 1.
+
+    Only inputs that add or drop words count as overlapping: one that swaps a word for
+    another ("ascending" for "descending", "on" for "off") or differs in negation
+    scores 0, however many words it shares.
+    """
+    if cached is None or words & _NEGATIONS != cached & _NEGATIONS:
+        return 0.0
+    if not (words <= cached or cached <= words):
+        return 0.0
+    union = words | cached
+    return len(words & cached) / len(union) if union else 1.0
+
+
+class HashingVectorizer:
+    """Embeds text locally by hashing word unigrams and bigrams into a fixed-size vector."""
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_PATTERN.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, text: str) -> np.ndarray:
+        """Return an L2-normalized float32 vector for text."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            # crc32 is stable across processes, unlike the built-in hash()
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class SemanticPlanCache:
+    """Reuses thinking plans for reworded inputs.
+
+    Candidates are the top_k most similar cached inputs by cosine similarity, kept in
+    a preallocated NumPy matrix so a lookup is a single matrix-vector product. Hashed
+    word features cannot tell "ascending" from "descending", so the first candidate
+    whose content_overlap() with the input reaches the threshold is the hit. Entries
+    are scoped to a namespace (planner prompt hash and model) and evicted
+    least-recently-used once max_entries is reached.
+    """
+
+    def __init__(self, index_path: str, threshold: float = 0.75, max_entries: int = 2000,
+                 dim: int = 1024, top_k: int = 5, save_every: int = 10):
+        self.index_path = index_path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.top_k = top_k
+        self.save_every = save_every
+        self.vectorizer = HashingVectorizer(dim)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._unsaved_puts = 0
+
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._last_access = np.zeros(max_entries, dtype=np.float64)
+        self._namespace_codes = np.full(max_entries, -1, dtype=np.int32)
+        self._namespace_ids: Dict[str, int] = {}
+        self._namespaces: List[str] = []
+        self._plans: List[str] = []
+        self._content_words: List[Optional[frozenset]] = []
+        self._load()
+
+    @property
+    def _vectors_path(self) -> str:
+        return self.index_path + ".npy"
+
+    @property
+    def _metadata_path(self) -> str:
+        return self.index_path + ".json"
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def search(self, namespace: str, user_input: str, k: Optional[int] = None) -> List[Tuple[float, str]]:
+        """Return up to k (similarity, plan) pairs in namespace, most similar first."""
+        k = k or self.top_k
+        query = self.vectorizer.embed(user_input)
+        with self._lock:
+            return [(score, self._plans[i]) for score, i in self._top_k(namespace, query, k)]
+
+    def _top_k(self, namespace: str, query: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        n = len(self._plans)
+        if n == 0:
+            return []
+        scores = self._vectors[:n] @ query
+        scores[self._namespace_codes[:n] != self._namespace_ids.get(namespace, -2)] = -np.inf
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(i)) for i in top if np.isfinite(scores[i])]
+
+    def get(self, namespace: str, user_input: str) -> Optional[str]:
+        """Return the plan of the most similar previous input whose content words overlap enough."""
+        query = self.vectorizer.embed(user_input)
+        words = content_words(user_input)
+        with self._lock:
+            for _, index in self._top_k(namespace, query, self.top_k):
+                if content_overlap(words, self._content_words[index]) >= self.threshold:
+                    self._last_access[index] = time.time()
+                    self.hits += 1
+                    return self._plans[index]
+            self.misses += 1
+            return None
+
+    def _namespace_id(self, namespace: str) -> int:
+        return self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+
+    def put(self, namespace: str, user_input: str, plan: str) -> None:
+        """Add a plan to the index, replacing the least recently used entry when full."""
+        vector = self.vectorizer.embed(user_input)
+        with self._lock:
+            if len(self._plans) < self.max_entries:
+                index = len(self._plans)
+                self._plans.append(plan)
+                self._namespaces.append(namespace)
+                self._content_words.append(content_words(user_input))
+            else:
+                index = int(np.argmin(self._last_access))
+                self._plans[index] = plan
+                self._namespaces[index] = namespace
+                self._content_words[index] = content_words(user_input)
+                self.evictions += 1
+            self._vectors[index] = vector
+            self._last_access[index] = time.time()
+            self._namespace_codes[index] = self._namespace_id(namespace)
+
+            self._unsaved_puts += 1
+            if self._unsaved_puts >= self.save_every:
+                self._save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        if self._unsaved_puts == 0:
+            return
+        ensure_directory_exists(os.path.dirname(self.index_path) or ".")
+        n = len(self._plans)
+        # Write to temp files and rename so a crash never leaves a half-written index
+        with open(self._vectors_path + ".tmp", "wb") as f:
+            np.save(f, self._vectors[:n])
+        with open(self._metadata_path + ".tmp", "w") as f:
+            json.dump({
+                "dim": self.vectorizer.dim,
+                "plans": self._plans,
+                "namespaces": self._namespaces,
+                "content_words": [sorted(words) if words is not None else None
+                                  for words in self._content_words],
+                "last_access": self._last_access[:n].tolist()
+            }, f)
+        os.replace(self._vectors_path + ".tmp", self._vectors_path)
+        os.replace(self._metadata_path + ".tmp", self._metadata_path)
+        self._unsaved_puts = 0
+
+    def _load(self) -> None:
+        if not (os.path.exists(self._vectors_path) and os.path.exists(self._metadata_path)):
+            return
+        try:
+            with open(self._metadata_path, "r") as f:
+                metadata = json.load(f)
+            vectors = np.load(self._vectors_path)
+        except Exception as e:
+            print(f"Error loading semantic plan index: {e}")
+            return
+        if metadata.get("dim") != self.vectorizer.dim:
+            return
+
+        # Keep the most recently used entries if the index was saved with a larger max_entries
+        order = np.argsort(metadata["last_access"])[::-1][:self.max_entries]
+        n = len(order)
+        self._vectors[:n] = vectors[order]
+        self._last_access[:n] = np.asarray(metadata["last_access"])[order]
+        self._plans = [metadata["plans"][i] for i in order]
+        self._namespaces = [metadata["namespaces"][i] for i in order]
+        # Indexes saved before content words were kept can't be checked, so their entries never hit
+        saved_words = metadata.get("content_words") or [None] * len(metadata["plans"])
+        self._content_words = [frozenset(saved_words[i]) if saved_words[i] is not None else None
+                               for i in order]
+        self._namespace_codes[:n] = [self._namespace_id(namespace) for namespace in self._namespaces]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._plans)}
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticPlanCache]:
+    """Return the process-wide semantic plan cache, or None if it is disabled."""
+    global _semantic_cache
+    if not config.SEMANTIC_CACHE_ENABLED:
+        return None
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticPlanCache(
+                config.SEMANTIC_CACHE_PATH,
+                threshold=config.SEMANTIC_CACHE_THRESHOLD,
+                max_entries=config.SEMANTIC_CACHE_MAX_ENTRIES,
+                top_k=config.SEMANTIC_CACHE_TOP_K
+            )
+            atexit.register(_semantic_cache.save)
+        return _semantic_cache
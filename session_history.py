@@ -0,0 +1,139 @@
+"""Paging backwards through the chat log, to resume sessions without reading all of it.
+
+A page is read from the newest end: the active JSONL log is read backwards in
+blocks, and rotated segments are only opened (newest first, picked from the segment
+index) once the newer entries run out. A segment is decompressed as a stream that
+keeps only the lines the page needs, so memory depends on the page size rather than
+on the size of the history.
+
+Pages are chained by a cursor: the timestamp of the oldest entry returned so far and
+how many entries with that exact timestamp were returned.
+"""
+import json
+import os
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import log_segments
+from blob_store import hydrate_entry
+from utils import user_input_of
+
+BLOCK_SIZE = 64 * 1024
+# The app logs the timestamp first, so it can be read without parsing the whole line
+_TIMESTAMP_PREFIX = '{"timestamp": "'
+
+Cursor = Tuple[str, int]
+
+
+def reverse_lines(path: str, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    """Yield the non-empty lines of a file, last first, reading it backwards in blocks."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        position = f.seek(0, os.SEEK_END)
+        tail = b""
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + tail).split(b"\n")
+            tail = lines.pop(0)  # May continue in the previous block
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode("utf-8")
+        if tail.strip():
+            yield tail.decode("utf-8")
+
+
+def _timestamp(line: str) -> str:
+    if line.startswith(_TIMESTAMP_PREFIX):
+        end = line.find('"', len(_TIMESTAMP_PREFIX))
+        if end > 0:
+            return line[len(_TIMESTAMP_PREFIX):end]
+    try:
+        return str(json.loads(line).get("timestamp") or "")
+    except (ValueError, AttributeError):
+        return ""  # Unreadable; sorted as oldest and skipped when parsed
+
+
+def _segment_lines(file_path: str, segment: Dict[str, Any], before: Optional[str], limit: int) -> Iterator[str]:
+    """Lines of a segment, last first: those timestamped exactly before, then up to limit older ones."""
+    same, older = [], deque(maxlen=limit)
+    for line in log_segments.iter_segment_lines(file_path, segment):
+        if not line.strip():
+            continue
+        timestamp = _timestamp(line)
+        if before is None or timestamp < before:
+            older.append(line)
+        elif timestamp == before:
+            same.append(line)
+    yield from reversed(same)
+    yield from reversed(older)
+
+
+def _lines_newest_first(file_path: str, before: Optional[str], limit: int) -> Iterator[str]:
+    # The active log, a rotation in progress, then the segments that may hold older entries
+    yield from reverse_lines(file_path)
+    yield from reverse_lines(file_path + ".rotating")
+    for segment in reversed(log_segments.segments_in_range(file_path, end=before)):
+        yield from _segment_lines(file_path, segment, before, limit)
+
+
+def read_page(file_path: str, limit: int,
+              cursor: Optional[Cursor] = None) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+    """Return up to limit entries of a JSONL chat log logged before cursor, oldest first.
+
+    Without a cursor the page ends with the newest entry. Also returns the cursor for
+    the page before this one, or None once the start of the history is reached.
+    """
+    before, seen = cursor or (None, 0)
+    skip = seen  # Entries at the cursor's timestamp that earlier pages already returned
+    entries = []
+    for line in _lines_newest_first(file_path, before, limit + 1):
+        timestamp = _timestamp(line)
+        if before is not None and timestamp > before:
+            continue
+        if timestamp == before and skip:
+            skip -= 1
+            continue
+        if len(entries) == limit:
+            return entries[::-1], (before, seen)
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            print(f"Skipping unreadable line in {file_path}")
+            continue
+        entries.append(hydrate_entry(entry, file_path))
+        if timestamp == before:
+            seen += 1
+        else:
+            before, seen, skip = timestamp, 1, 0
+    return entries[::-1], None
+
+
+def turn_messages(entry: Dict[str, Any]) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """The ThinkingChat and DirectChat messages of a logged turn."""
+    user = {"role": "user", "content": user_input_of(entry) or ""}
+    if "handler_response" in entry:  # Email commands are answered in the direct chat
+        return [], [user, {"role": "assistant", "content": entry["handler_response"] or ""}]
+    thinking, direct = [], []
+    if "thinking_response" in entry:
+        thinking.append(user)
+        if entry.get("thinking_plan"):
+            thinking.append({"role": "system", "content": entry["thinking_plan"]})
+        thinking.append({"role": "assistant", "content": entry["thinking_response"] or ""})
+    if "direct_response" in entry:
+        direct = [dict(user), {"role": "assistant", "content": entry["direct_response"] or ""}]
+    return thinking, direct
+
+
+def restore_chats(thinking_chat, direct_chat, entries: List[Dict[str, Any]]) -> None:
+    """Append logged turns (oldest first) to the chats' histories, as if they had just happened."""
+    for entry in entries:
+        thinking, direct = turn_messages(entry)
+        for message in thinking:
+            thinking_chat.add_message(message["role"], message["content"])
+        for message in direct:
+            direct_chat.add_message(message["role"], message["content"])
@@ -0,0 +1,196 @@
+"""Single-flight coalescing of identical concurrent chat completion requests.
+
+When the same request (model, messages and parameters) is already in flight, later
+callers wait for it and share its result instead of paying for another upstream
+call. Streaming requests share one upstream stream: every caller reads the same
+chunks, including any that arrived before it joined.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Dict, Any, Callable, Optional
+
+import config
+from metrics import get_metrics
+
+# Per-call options that do not change the response
+_IGNORED_PARAMS = {"timeout", "extra_headers"}
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """Hash the parts of a chat completion request that determine its response."""
+    params = {k: v for k, v in kwargs.items() if k not in _IGNORED_PARAMS}
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class _SharedStream:
+    """One upstream stream read on demand by any number of readers.
+
+    Whichever reader first needs a chunk that has not arrived yet pulls it from
+    upstream; the others wait for it. Chunks are kept so late readers see them all.
+    """
+
+    def __init__(self, stream, on_finished: Callable[[], None]):
+        self.stream = stream
+        self.upstream = iter(stream)
+        self.on_finished = on_finished
+        self.chunks = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.fetching = False
+        self.readers = 0
+        self.cond = threading.Condition()
+
+    def reader(self) -> "_StreamReader":
+        with self.cond:
+            self.readers += 1
+        return _StreamReader(self)
+
+    def _finish(self, error: Optional[BaseException] = None) -> None:
+        with self.cond:
+            self.finished = True
+            self.error = error
+            self.fetching = False
+            self.cond.notify_all()
+        self.on_finished()
+
+    def get(self, index: int):
+        with self.cond:
+            while True:
+                if index < len(self.chunks):
+                    return self.chunks[index]
+                if self.error is not None:
+                    raise self.error
+                if self.finished:
+                    raise StopIteration
+                if not self.fetching:
+                    self.fetching = True
+                    break
+                self.cond.wait()
+        try:
+            chunk = next(self.upstream)
+        except StopIteration:
+            self._finish()
+            raise
+        except Exception as e:
+            self._finish(e)
+            raise
+        with self.cond:
+            self.chunks.append(chunk)
+            self.fetching = False
+            self.cond.notify_all()
+        return chunk
+
+    def release(self) -> None:
+        """Called when a reader closes; the upstream stream is closed once nobody reads it."""
+        with self.cond:
+            self.readers -= 1
+            abandoned = self.readers == 0 and not self.finished
+        if abandoned:
+            self.stream.close()
+            # A reader joining in the meantime must not mistake the cut-off stream for a complete one
+            self._finish(RuntimeError("Shared stream closed before it finished"))
+
+
+class _StreamReader:
+    """Iterates a shared stream from its first chunk; quacks like openai.Stream for the chat code."""
+
+    def __init__(self, shared: _SharedStream):
+        self.shared = shared
+        self.index = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = self.shared.get(self.index)
+        self.index += 1
+        return chunk
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.shared.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one and counts the calls saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+
+    def _forget(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def call(self, key: str, fn: Callable[[], Any], stream: bool = False) -> Any:
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+        get_metrics().increment("requests_sent_upstream" if leader else "requests_coalesced")
+
+        if not leader:
+            result = future.result()
+            return result.reader() if stream else result
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._forget(key, future)
+            future.set_exception(e)
+            raise
+        if not stream:
+            self._forget(key, future)
+            future.set_result(result)
+            return result
+        # A stream stays joinable until upstream is exhausted
+        shared = _SharedStream(result, lambda: self._forget(key, future))
+        reader = shared.reader()
+        future.set_result(shared)
+        return reader
+
+
+class CoalescingClient:
+    """Wraps an OpenAI client so identical concurrent chat completion requests share one upstream call."""
+
+    def __init__(self, client, single_flight: SingleFlight):
+        self.raw = client
+        self.single_flight = single_flight
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def _create_chat_completion(self, **kwargs):
+        return self.single_flight.call(
+            request_key(kwargs), lambda: self.raw.chat.completions.create(**kwargs), stream=bool(kwargs.get("stream"))
+        )
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """Return the process-wide coalescer, or None if coalescing is disabled."""
+    global _single_flight
+    if not config.REQUEST_COALESCING_ENABLED:
+        return None
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
@@ -1,13 +1,31 @@
 import unittest
 from unittest.mock import patch, MagicMock, ANY
+import shutil
+import tempfile
+from types import SimpleNamespace
 
 # Add the project root to the Python path to allow importing app
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# Importing app runs its first-run log setup; keep it away from the repository's logs/
+import config
+_log_dir = tempfile.mkdtemp()
+_log_paths = patch.multiple(config, LOG_FILE_PATH=os.path.join(_log_dir, "chat_history.jsonl"),
+                            LEGACY_LOG_FILE_PATH=os.path.join(_log_dir, "chat_history.json"),
+                            PLAN_CACHE_PATH=os.path.join(_log_dir, "plan_cache.sqlite3"),
+                            SEMANTIC_CACHE_PATH=os.path.join(_log_dir, "semantic_plan_index"))
+_log_paths.start()
+
 # Import functions to be tested from app.py
-from app import process_voice_command, process_email_command_text, handle_submit 
+from app import process_voice_command, process_email_command_text, handle_submit, restore_session
+from utils import append_chat_log
+
+
+def tearDownModule():
+    _log_paths.stop()
+    shutil.rmtree(_log_dir, ignore_errors=True)
 
 # Mock streamlit before it's imported by app
 # This is a common pattern for testing Streamlit apps
@@ -387,5 +405,19 @@ class TestEmailProcessing(unittest.TestCase):
         self.mock_direct_chat_instance.add_message.assert_not_called()
 
 
+class TestSessionRestore(unittest.TestCase):
+
+    @patch('app.flush_chat_log')
+    @patch('app.config.ENABLE_LOGGING', True)
+    def test_fresh_session_gets_no_turns_from_another_session(self, _flush):
+        append_chat_log({"timestamp": "2024-01-01T10:00:00", "user_input": "read my email",
+                         "handler_response": "Email from Alice: private"}, config.LOG_FILE_PATH)
+        session_state = SimpleNamespace(thinking_chat=MagicMock(), direct_chat=MagicMock())
+        with patch('app.st', new=SimpleNamespace(session_state=session_state)):
+            self.assertIsNone(restore_session())
+        session_state.thinking_chat.add_message.assert_not_called()
+        session_state.direct_chat.add_message.assert_not_called()
+
+
 if __name__ == '__main__':
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
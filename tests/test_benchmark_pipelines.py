@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import tempfile
+import shutil
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class TestBenchmarkPipelines(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_runs_offline_without_api_key(self):
+        corpus = os.path.join(self.directory, "prompts.jsonl")
+        with open(corpus, "w") as f:
+            f.write('{"prompt": "hello there"}\n"compare two sorting algorithms"\n')
+        report = os.path.join(self.directory, "report.json")
+        env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "OPENAI_BASE_URL")}
+        env.update(PLAN_CACHE_PATH=os.path.join(self.directory, "plan_cache.sqlite3"),
+                   SEMANTIC_CACHE_PATH=os.path.join(self.directory, "semantic_plan_index"),
+                   CASSETTE_MODE="off")
+        result = subprocess.run(
+            [sys.executable, os.path.join(ROOT, "benchmarks", "pipelines.py"), "--corpus", corpus,
+             "--report", report, "--fake-latency", "0", "--fake-tokens-per-second", "100000"],
+            env=env, capture_output=True, text=True, timeout=120
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        with open(report) as f:
+            stages = json.load(f)["stages"]
+        self.assertEqual(stages["direct.direct"]["calls"], 2)
+        self.assertEqual(stages["thinking.final"]["errors"], 0)
+        # The plan caches are only built with --use-caches
+        self.assertEqual(sorted(os.listdir(self.directory)), ["prompts.jsonl", "report.json"])
+
+
+if __name__ == '__main__':
+    unittest.main()
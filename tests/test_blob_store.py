@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import log_segments
+from blob_store import BlobStore, blob_dir, is_blob_ref
+from log_writer import LogWriter
+from utils import append_chat_log, load_chat_history
+
+PLAN = "1. Read the question carefully.\n2. Answer it step by step.\n" * 10
+
+
+class TestBlobStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "chat_history.jsonl")
+        self.blobs = BlobStore(blob_dir(self.path), min_size=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_put_is_content_addressed(self):
+        first = self.blobs.put(PLAN)
+        self.assertEqual(self.blobs.put(PLAN), first)
+        self.assertNotEqual(self.blobs.put(PLAN + "!"), first)
+        self.assertEqual(self.blobs.get(first), PLAN)
+        stats = self.blobs.stats()
+        self.assertEqual(stats["blobs_written"], 2)
+        self.assertEqual(stats["fields_deduplicated"], 1)
+
+    def test_only_repeated_texts_become_blobs(self):
+        entry = {"thinking_plan": PLAN, "thinking_response": PLAN + "unique"}
+        self.assertIs(self.blobs.dehydrate(entry), entry)  # First time: logged inline
+        stored = self.blobs.dehydrate({"thinking_plan": PLAN, "thinking_response": PLAN + "other"})
+        self.assertTrue(is_blob_ref(stored["thinking_plan"]))
+        self.assertEqual(stored["thinking_response"], PLAN + "other")
+        # Once stored, a fresh store (e.g. after a restart) reuses the blob right away
+        fresh = BlobStore(blob_dir(self.path), min_size=100)
+        self.assertTrue(is_blob_ref(fresh.dehydrate({"direct_response": PLAN})["direct_response"]))
+
+    def test_dehydrate_keeps_small_fields_and_copies(self):
+        self.blobs.put(PLAN)
+        entry = {"user_input": PLAN, "thinking_plan": PLAN, "direct_response": "short"}
+        stored = self.blobs.dehydrate(entry)
+        self.assertTrue(is_blob_ref(stored["thinking_plan"]))
+        self.assertEqual(stored["user_input"], PLAN)  # Not a blob field
+        self.assertEqual(stored["direct_response"], "short")
+        self.assertEqual(entry["thinking_plan"], PLAN)
+        self.assertEqual(self.blobs.hydrate(stored), entry)
+        self.assertIs(self.blobs.dehydrate({"direct_response": "short"})["direct_response"], "short")
+
+    def test_log_lines_keep_hashes_and_readers_rehydrate(self):
+        writer = LogWriter(self.path, fsync="never", blobs=self.blobs)
+        for i in range(5):
+            writer.write({"user_input": f"q{i}", "thinking_plan": PLAN, "thinking_response": f"answer {i}"})
+        writer.close()
+
+        with open(self.path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(lines[0]["thinking_plan"], PLAN)
+        self.assertTrue(all(is_blob_ref(line["thinking_plan"]) for line in lines[1:]))
+        self.assertLess(os.path.getsize(self.path), 5 * len(PLAN))
+        self.assertEqual(self.blobs.stats()["blobs_written"], 1)
+
+        log_segments.rotate(self.path)  # Segments resolve the same blobs
+        entries = load_chat_history(self.path)
+        self.assertEqual([e["thinking_plan"] for e in entries], [PLAN] * 5)
+        self.assertEqual(entries[3]["thinking_response"], "answer 3")
+
+    def test_missing_blob_reads_as_none(self):
+        append_chat_log({"thinking_plan": {"$blob": "0" * 32}, "user_input": "q"}, self.path)
+        self.assertIsNone(load_chat_history(self.path)[0]["thinking_plan"])
+
+    def test_failed_blob_write_logs_entry_in_full(self):
+        writer = LogWriter(self.path, fsync="never", blobs=self.blobs)
+        self.blobs.dehydrate({"thinking_plan": PLAN})  # Seen once already
+        with patch.object(self.blobs, "put", side_effect=OSError("disk full")):
+            writer.write({"user_input": "q", "thinking_plan": PLAN})
+            writer.close()
+        with open(self.path) as f:
+            self.assertEqual(json.loads(f.readline())["thinking_plan"], PLAN)
+
+    def test_cache_is_bounded(self):
+        blobs = BlobStore(blob_dir(self.path), cache_size=2)
+        digests = [blobs.put(f"text {i}") for i in range(3)]
+        for digest in digests + digests[-1:]:
+            blobs.get(digest)
+        self.assertEqual(len(blobs._cache), 2)
+        self.assertEqual(blobs.stats()["cache_hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cancellation import (CancelToken, TurnCancelled, append_to_turn, cancel_scope, close_on_cancel,
+                          raise_if_cancelled)
+import concurrent_chat
+from concurrent_chat import process_dual_brain, stream_dual_brain
+
+
+class FakeStream:
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeChat:
+    """Adds the user message, then waits for its stream until it is closed or released."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.messages = []
+        self.release = threading.Event()
+        self.stream = FakeStream()
+
+    def process_message(self, user_input):
+        append_to_turn(self.messages, {"role": "user", "content": user_input})
+        close_on_cancel(self.stream)
+        while not (self.release.is_set() or self.stream.closed.is_set()):
+            time.sleep(0.01)
+        append_to_turn(self.messages, {"role": "assistant", "content": "answer"})
+        return ("plan", "answer") if self.kind == "response" else "answer"
+
+    def process_message_stream(self, user_input):
+        append_to_turn(self.messages, {"role": "user", "content": user_input})
+        close_on_cancel(self.stream)
+        yield (self.kind, "first") if self.kind == "response" else "first"
+        while not (self.release.is_set() or self.stream.closed.is_set()):
+            time.sleep(0.01)
+        if self.stream.closed.is_set():
+            raise ConnectionError("stream closed")
+        append_to_turn(self.messages, {"role": "assistant", "content": "answer"})
+
+
+class TestCancelToken(unittest.TestCase):
+
+    def test_cancel_rolls_back_turn_additions(self):
+        history = [{"role": "user", "content": "earlier"}]
+        token = CancelToken()
+        with cancel_scope(token):
+            append_to_turn(history, {"role": "user", "content": "new"})
+        history.append({"role": "user", "content": "from another turn"})
+        token.cancel()
+        self.assertEqual([m["content"] for m in history], ["earlier", "from another turn"])
+        with cancel_scope(token):
+            append_to_turn(history, {"role": "assistant", "content": "late"})
+            with self.assertRaises(TurnCancelled):
+                raise_if_cancelled()
+        self.assertEqual(len(history), 2)
+
+    def test_completed_turn_is_kept(self):
+        history = []
+        token = CancelToken()
+        with cancel_scope(token):
+            append_to_turn(history, "entry")
+        token.complete()
+        self.assertFalse(token.cancel())
+        self.assertEqual(history, ["entry"])
+
+    def test_cancel_closes_registered_streams(self):
+        token = CancelToken()
+        stream = FakeStream()
+        with cancel_scope(token):
+            close_on_cancel(stream)
+        token.cancel()
+        self.assertTrue(stream.closed.is_set())
+
+    def test_completed_child_is_rolled_back_with_its_turn(self):
+        history = []
+        token = CancelToken()
+        brain = token.child()
+        with cancel_scope(brain):
+            append_to_turn(history, "entry")
+        brain.complete()
+        token.cancel()
+        self.assertEqual(history, [])
+
+    def test_cancelled_child_leaves_its_turn_running(self):
+        history = []
+        token = CancelToken()
+        brain = token.child()
+        with cancel_scope(brain):
+            append_to_turn(history, "partial")
+        brain.cancel()
+        with cancel_scope(brain):
+            append_to_turn(history, "late")
+        self.assertEqual(history, [])
+        self.assertFalse(token.cancelled)
+
+    def test_append_without_turn(self):
+        history = []
+        append_to_turn(history, "entry")
+        self.assertEqual(history, ["entry"])
+
+
+class TestCancelDualBrain(unittest.TestCase):
+
+    def test_cancelled_blocking_turn_raises_and_rolls_back(self):
+        thinking, direct = FakeChat("response"), FakeChat("direct")
+        token = CancelToken()
+        threading.Timer(0.1, token.cancel).start()
+        started_at = time.monotonic()
+        with self.assertRaises(TurnCancelled):
+            process_dual_brain(thinking, direct, "hello", token)
+        self.assertLess(time.monotonic() - started_at, 1)
+        time.sleep(0.1)  # Let the workers see their closed streams
+        self.assertEqual(thinking.messages, [])
+        self.assertEqual(direct.messages, [])
+
+    def test_completed_blocking_turn(self):
+        thinking, direct = FakeChat("response"), FakeChat("direct")
+        thinking.release.set()
+        direct.release.set()
+        token = CancelToken()
+        self.assertEqual(process_dual_brain(thinking, direct, "hello", token), ("plan", "answer", "answer"))
+        token.complete()
+        self.assertEqual(len(direct.messages), 2)
+
+    @patch('concurrent_chat.JOIN_GRACE_SECONDS', 0)
+    @patch('concurrent_chat.config')
+    def test_timed_out_brain_is_cancelled(self, mock_config):
+        mock_config.THINKING_TIMEOUT_SECONDS = 0.2
+        mock_config.DIRECT_TIMEOUT_SECONDS = 5
+        thinking, direct = FakeChat("response"), FakeChat("direct")
+        direct.release.set()
+        token = CancelToken()
+        plan, response, direct_response = process_dual_brain(thinking, direct, "first", token)
+        token.complete()  # As the app does once the turn returns
+        self.assertIn("timed out", response)
+        self.assertEqual(direct_response, "answer")
+        self.assertTrue(thinking.stream.closed.wait(1))
+        thinking.release.set()
+        time.sleep(0.1)
+        # The late answer is dropped; the next turn's messages cannot be overtaken by it
+        self.assertEqual(thinking.messages, [{"role": "user", "content": "first"},
+                                             {"role": "system", "content": response}])
+
+    @patch('concurrent_chat.JOIN_GRACE_SECONDS', 0)
+    @patch('concurrent_chat.config')
+    def test_timed_out_brain_is_cancelled_when_streaming(self, mock_config):
+        mock_config.THINKING_TIMEOUT_SECONDS = 0.2
+        mock_config.DIRECT_TIMEOUT_SECONDS = 5
+        thinking, direct = FakeChat("response"), FakeChat("direct")
+        direct.release.set()
+        token = CancelToken()
+        events = list(stream_dual_brain(thinking, direct, "first", token))
+        token.complete()
+        self.assertIn(("response", "Error generating response: timed out"), events)
+        self.assertTrue(thinking.stream.closed.wait(1))
+        time.sleep(0.1)
+        self.assertEqual([m["role"] for m in thinking.messages], ["user", "system"])
+        self.assertEqual([m["role"] for m in direct.messages], ["user", "assistant"])
+
+    def test_closing_the_stream_cancels_the_turn(self):
+        thinking, direct = FakeChat("response"), FakeChat("direct")
+        token = CancelToken()
+        events = stream_dual_brain(thinking, direct, "hello", token)
+        next(events)
+        events.close()  # What a Streamlit rerun does to the rendering loop
+        self.assertTrue(token.cancelled)
+        self.assertTrue(thinking.stream.closed.wait(1))
+        self.assertTrue(direct.stream.closed.wait(1))
+        time.sleep(0.1)
+        self.assertEqual(thinking.messages, [])
+        self.assertEqual(direct.messages, [])
+
+    def test_cancelled_stream_raises(self):
+        thinking, direct = FakeChat("response"), FakeChat("direct")
+        token = CancelToken()
+        events = stream_dual_brain(thinking, direct, "hello", token)
+        next(events)
+        token.cancel()
+        with self.assertRaises(TurnCancelled):
+            list(events)
+
+
+class TestRerunRequest(unittest.TestCase):
+    """New input cancels the turn through Streamlit's pending script request (a private attribute)."""
+
+    def setUp(self):
+        from streamlit.runtime.scriptrunner_utils.script_requests import RerunData, ScriptRequests
+        self.requests = ScriptRequests()
+        self.rerun_data = RerunData()
+        ctx = SimpleNamespace(script_requests=self.requests)
+        patchers = [patch('concurrent_chat.get_script_run_ctx', return_value=ctx),
+                    patch('concurrent_chat.add_script_run_ctx')]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_rerun_request_cancels_turn(self):
+        thinking, direct = FakeChat("response"), FakeChat("direct")
+        token = CancelToken()
+        threading.Timer(0.1, self.requests.request_rerun, [self.rerun_data]).start()
+        with self.assertRaises(TurnCancelled):
+            process_dual_brain(thinking, direct, "hello", token)
+        self.assertTrue(token.cancelled)
+
+    def test_no_request_leaves_turn_running(self):
+        self.assertFalse(concurrent_chat._rerun_requested())
+
+    def test_missing_request_state_warns_once(self):
+        with patch('concurrent_chat.get_script_run_ctx', return_value=SimpleNamespace()), \
+                patch('concurrent_chat._rerun_check_warned', False), patch('builtins.print') as mock_print:
+            self.assertFalse(concurrent_chat._rerun_requested())
+            self.assertFalse(concurrent_chat._rerun_requested())
+        mock_print.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
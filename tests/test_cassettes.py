@@ -0,0 +1,89 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import time
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httplib2
+import httpx
+import openai
+
+from cassettes import Cassette, CassetteMiss
+from fake_openai_server import FakeOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "Record me"}]
+
+
+def make_client(cassette, inner=None, base_url="http://127.0.0.1:1/v1"):
+    return openai.OpenAI(base_url=base_url, api_key="test-key", max_retries=0,
+                         http_client=httpx.Client(transport=cassette.transport(inner)))
+
+
+class TestCassettes(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "session.jsonl.gz")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def record_session(self):
+        recorder = Cassette(self.path, "record")
+        with FakeOpenAIServer(latency=0.2, tokens_per_second=1000) as server:
+            client = make_client(recorder, base_url=server.base_url)
+            full = client.chat.completions.create(model="m", messages=MESSAGES).choices[0].message.content
+            chunks = client.chat.completions.create(model="m", messages=MESSAGES, stream=True)
+            streamed = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+        recorder.close()
+        self.assertEqual(recorder.stats["recorded"], 2)
+        return server.base_url, full, streamed
+
+    def test_replay_returns_recorded_responses_without_network(self):
+        base_url, full, streamed = self.record_session()
+        client = make_client(Cassette(self.path, "replay", replay_latency="zero"), base_url=base_url)
+
+        started_at = time.perf_counter()
+        replayed = client.chat.completions.create(model="m", messages=MESSAGES).choices[0].message.content
+        chunks = client.chat.completions.create(model="m", messages=MESSAGES, stream=True)
+        replayed_stream = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+
+        self.assertEqual(replayed, full)
+        self.assertEqual(replayed_stream, streamed)
+        self.assertLess(time.perf_counter() - started_at, 0.2)
+
+    def test_replay_with_original_latency(self):
+        base_url, _, _ = self.record_session()
+        client = make_client(Cassette(self.path, "replay"), base_url=base_url)
+        started_at = time.perf_counter()
+        client.chat.completions.create(model="m", messages=MESSAGES)
+        self.assertGreaterEqual(time.perf_counter() - started_at, 0.2)
+
+    def test_unrecorded_request_misses(self):
+        base_url, _, _ = self.record_session()
+        cassette = Cassette(self.path, "replay", replay_latency="zero")
+        client = make_client(cassette, base_url=base_url)
+        with self.assertRaises(openai.APIConnectionError) as raised:
+            client.chat.completions.create(model="m", messages=[{"role": "user", "content": "New question"}])
+        self.assertIsInstance(raised.exception.__cause__, CassetteMiss)
+        self.assertEqual(cassette.stats["misses"], 1)
+
+    def test_gmail_http_round_trip(self):
+        recorder = Cassette(self.path, "record")
+        uri = "https://gmail.googleapis.com/gmail/v1/users/me/messages?maxResults=10&alt=json"
+        recorded = (httplib2.Response({"status": "200", "content-type": "application/json"}), b'{"messages": []}')
+        with patch("httplib2.Http.request", return_value=recorded):
+            recorder.http().request(uri, "GET")
+        recorder.close()
+
+        response, content = Cassette(self.path, "replay", replay_latency="zero").http().request(uri, "GET")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response["content-type"], "application/json")
+        self.assertEqual(content, b'{"messages": []}')
+
+
+if __name__ == '__main__':
+    unittest.main()
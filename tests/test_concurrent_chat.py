@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import patch
+import time
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import concurrent_chat
+
+
+class SlowThinkingChat:
+    def __init__(self, delay):
+        self.delay = delay
+        self.messages = []
+
+    def process_message(self, user_input):
+        self.messages.append({"role": "user", "content": user_input})
+        time.sleep(self.delay)
+        self.messages.append({"role": "system", "content": "plan"})
+        self.messages.append({"role": "assistant", "content": "thinking answer"})
+        return "plan", "thinking answer"
+
+    def process_message_stream(self, user_input):
+        self.messages.append({"role": "user", "content": user_input})
+        for delta in ["pl", "an"]:
+            time.sleep(self.delay)
+            yield "plan", delta
+        yield "response", "thinking answer"
+
+
+class SlowDirectChat:
+    def __init__(self, delay):
+        self.delay = delay
+        self.messages = []
+
+    def process_message(self, user_input):
+        self.messages.append({"role": "user", "content": user_input})
+        time.sleep(self.delay)
+        self.messages.append({"role": "assistant", "content": "direct answer"})
+        return "direct answer"
+
+    def process_message_stream(self, user_input):
+        self.messages.append({"role": "user", "content": user_input})
+        for delta in ["direct ", "answer"]:
+            time.sleep(self.delay)
+            yield delta
+
+
+class TestConcurrentChat(unittest.TestCase):
+
+    def test_brains_run_concurrently(self):
+        thinking_chat = SlowThinkingChat(0.3)
+        direct_chat = SlowDirectChat(0.3)
+
+        start = time.monotonic()
+        result = concurrent_chat.process_dual_brain(thinking_chat, direct_chat, "hello")
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(result, ("plan", "thinking answer", "direct answer"))
+        self.assertLess(elapsed, 0.55)
+        self.assertEqual([m["role"] for m in thinking_chat.messages], ["user", "system", "assistant"])
+        self.assertEqual([m["role"] for m in direct_chat.messages], ["user", "assistant"])
+
+    @patch('concurrent_chat.JOIN_GRACE_SECONDS', 0)
+    @patch('concurrent_chat.config')
+    def test_slow_brain_does_not_hold_up_other(self, mock_config):
+        mock_config.THINKING_TIMEOUT_SECONDS = 0.2
+        mock_config.DIRECT_TIMEOUT_SECONDS = 5
+        mock_config.BRAIN_WORKERS = 4
+        thinking_chat = SlowThinkingChat(1.0)
+        direct_chat = SlowDirectChat(0.05)
+
+        start = time.monotonic()
+        thinking_plan, thinking_response, direct_response = concurrent_chat.process_dual_brain(
+            thinking_chat, direct_chat, "hello"
+        )
+        elapsed = time.monotonic() - start
+
+        self.assertIn("timed out", thinking_plan)
+        self.assertIn("timed out", thinking_response)
+        self.assertEqual(direct_response, "direct answer")
+        self.assertLess(elapsed, 0.6)
+
+    def test_stream_interleaves_both_brains(self):
+        thinking_chat = SlowThinkingChat(0.15)
+        direct_chat = SlowDirectChat(0.1)
+
+        events = list(concurrent_chat.stream_dual_brain(thinking_chat, direct_chat, "hello"))
+
+        kinds = [kind for kind, _ in events]
+        self.assertLess(kinds.index("direct"), kinds.index("response"))
+        self.assertEqual("".join(d for k, d in events if k == "plan"), "plan")
+        self.assertEqual("".join(d for k, d in events if k == "response"), "thinking answer")
+        self.assertEqual("".join(d for k, d in events if k == "direct"), "direct answer")
+
+
+if __name__ == '__main__':
+    unittest.main()
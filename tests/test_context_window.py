@@ -0,0 +1,131 @@
+import unittest
+from unittest.mock import MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cancellation import CancelToken, TurnCancelled, cancel_scope
+from context_window import ContextWindow, MESSAGE_OVERHEAD_TOKENS
+
+
+def count_words(text):
+    return len(text.split())
+
+
+class TestContextWindow(unittest.TestCase):
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.chat.completions.create.return_value.choices[0].message.content = "short summary"
+        self.client.chat.completions.create.return_value.usage = None
+        self.counter = MagicMock(side_effect=count_words)
+        self.window = ContextWindow(self.client, "gpt-3.5-turbo", max_tokens=60, summary_max_tokens=10,
+                                    count_tokens=self.counter)
+
+    def turn(self, messages, text):
+        messages.append({"role": "user", "content": text})
+        messages.append({"role": "assistant", "content": text})
+
+    def test_under_budget_sends_everything(self):
+        messages = []
+        self.turn(messages, "hello there")
+        self.assertEqual(self.window.build(messages), messages)
+        self.client.chat.completions.create.assert_not_called()
+
+    def test_tokens_counted_once_per_message(self):
+        messages = []
+        self.turn(messages, "hello there")
+        self.window.build(messages)
+        self.turn(messages, "how are you")
+        self.window.build(messages)
+        self.window.build(messages)
+        self.assertEqual(self.counter.call_count, 4)
+
+    def test_overflow_folds_old_turns_into_summary(self):
+        messages = []
+        for i in range(6):
+            self.turn(messages, f"message number {i} with some words")
+        sent = self.window.build(messages)
+
+        self.client.chat.completions.create.assert_called_once()
+        self.assertEqual(sent[0]["role"], "system")
+        self.assertIn("short summary", sent[0]["content"])
+        self.assertEqual(sent[1]["role"], "user")
+        self.assertEqual(sent[-1], messages[-1])
+        total = sum(count_words(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in sent)
+        self.assertLessEqual(total, 60 + count_words("Summary of the earlier conversation:"))
+
+    def test_summary_only_regenerated_on_overflow(self):
+        messages = []
+        for i in range(6):
+            self.turn(messages, f"message number {i} with some words")
+        self.window.build(messages)
+        self.window.build(messages)
+        self.assertEqual(self.client.chat.completions.create.call_count, 1)
+
+    def test_reset_after_clear(self):
+        messages = []
+        for i in range(6):
+            self.turn(messages, f"message number {i} with some words")
+        self.window.build(messages)
+        messages = [{"role": "user", "content": "fresh start"}]
+        self.assertEqual(self.window.build(messages), messages)
+
+    def test_summary_call_has_timeout_and_metrics(self):
+        window = ContextWindow(self.client, "gpt-3.5-turbo", max_tokens=60, summary_max_tokens=10,
+                               count_tokens=self.counter, timeout=7.5)
+        messages = []
+        for i in range(6):
+            self.turn(messages, f"message number {i} with some words")
+        window.build(messages)
+        self.assertEqual(self.client.chat.completions.create.call_args.kwargs["timeout"], 7.5)
+        self.assertEqual(window.last_metrics["summary"]["stage"], "summary")
+        window.build(messages)
+        self.assertEqual(window.last_metrics, {})  # No summary call this time
+
+    def test_no_summary_call_once_turn_is_cancelled(self):
+        messages = []
+        for i in range(6):
+            self.turn(messages, f"message number {i} with some words")
+        token = CancelToken()
+        token.cancel()
+        with cancel_scope(token), self.assertRaises(TurnCancelled):
+            self.window.build(messages)
+        self.client.chat.completions.create.assert_not_called()
+
+    def assert_counts_match(self, messages):
+        window = messages[self.window.window_start:]
+        self.assertEqual(self.window.window_tokens,
+                         sum(count_words(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in window))
+
+    def test_cancelled_turn_after_summarizing(self):
+        messages = []
+        for i in range(5):
+            self.turn(messages, f"message number {i} with some words")
+        token = CancelToken()
+        token.append(messages, {"role": "user", "content": "a long question that will be cancelled " * 2})
+        self.window.build(messages)  # Folds older turns into the summary during the turn
+        self.assertEqual(self.window.summary, "short summary")
+        token.cancel()
+
+        self.turn(messages, "next question")
+        sent = self.window.build(messages)
+        self.assertIn("short summary", sent[0]["content"])  # Not reset by the deletion
+        self.assertNotIn("cancelled", " ".join(m["content"] for m in sent))
+        self.assertEqual(sent[-2:], messages[-2:])
+        self.assert_counts_match(messages)
+
+    def test_deletion_mid_history_with_same_length(self):
+        messages = []
+        for i in range(2):
+            self.turn(messages, f"turn {i}")
+        self.window.build(messages)
+        del messages[1]
+        messages.append({"role": "assistant", "content": "a much longer reply than the one deleted"})
+        self.window.build(messages)
+        self.assert_counts_match(messages)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import random
+import unittest
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+import openai
+
+from fake_openai_server import FakeOpenAIServer, LatencyDistribution, SILENT_MP3_FRAME
+
+
+def make_client(server, **kwargs):
+    return openai.OpenAI(base_url=server.base_url, api_key="test-key", max_retries=0, **kwargs)
+
+
+class TestLatencyDistribution(unittest.TestCase):
+
+    def test_bare_number_is_fixed(self):
+        self.assertEqual(LatencyDistribution("0.25").sample(random.Random(0)), 0.25)
+
+    def test_samples_are_seeded_and_non_negative(self):
+        distribution = LatencyDistribution("normal:0.01:0.5")
+        first = [distribution.sample(random.Random(7)) for _ in range(3)]
+        second = [distribution.sample(random.Random(7)) for _ in range(3)]
+        self.assertEqual(first, second)
+        self.assertTrue(all(value >= 0 for value in first))
+
+    def test_unknown_kind_rejected(self):
+        with self.assertRaises(ValueError):
+            LatencyDistribution("gamma:1:2")
+
+
+class TestFakeOpenAIServer(unittest.TestCase):
+
+    def test_completion_is_deterministic(self):
+        messages = [{"role": "user", "content": "Hello there"}]
+        with FakeOpenAIServer(latency=0, tokens_per_second=10000) as server:
+            client = make_client(server)
+            first = client.chat.completions.create(model="gpt-4o-mini", messages=messages)
+            second = client.chat.completions.create(model="gpt-4o-mini", messages=messages)
+        self.assertEqual(first.choices[0].message.content, second.choices[0].message.content)
+        self.assertEqual(first.usage.completion_tokens, len(first.choices[0].message.content.split()))
+
+    def test_stream_matches_non_stream(self):
+        messages = [{"role": "user", "content": "Stream please"}]
+        with FakeOpenAIServer(latency=0, tokens_per_second=10000) as server:
+            client = make_client(server)
+            full = client.chat.completions.create(model="m", messages=messages).choices[0].message.content
+            chunks = list(client.chat.completions.create(model="m", messages=messages, stream=True,
+                                                         stream_options={"include_usage": True}))
+        streamed = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+        self.assertEqual(streamed, full)
+        self.assertIsNotNone(chunks[-1].usage)
+
+    def test_injected_rate_limit_sends_retry_after(self):
+        with FakeOpenAIServer(latency=0, error_rate_429=1.0, retry_after=3) as server:
+            with self.assertRaises(openai.RateLimitError) as raised:
+                make_client(server).chat.completions.create(model="m", messages=[{"role": "user", "content": "x"}])
+            self.assertEqual(raised.exception.response.headers["retry-after"], "3")
+            self.assertEqual(server.stats["rate_limited"], 1)
+
+    def test_injected_server_error(self):
+        with FakeOpenAIServer(latency=0, error_rate_500=1.0) as server:
+            with self.assertRaises(openai.InternalServerError):
+                make_client(server).chat.completions.create(model="m", messages=[{"role": "user", "content": "x"}])
+
+    def test_injected_timeout(self):
+        with FakeOpenAIServer(latency=0, timeout_rate=1.0, timeout_seconds=1) as server:
+            client = make_client(server, timeout=httpx.Timeout(0.2))
+            with self.assertRaises(openai.APITimeoutError):
+                client.chat.completions.create(model="m", messages=[{"role": "user", "content": "x"}])
+            self.assertEqual(server.stats["timeouts"], 1)
+
+    def test_seeded_errors_are_reproducible(self):
+        def outcomes():
+            with FakeOpenAIServer(latency=0, tokens_per_second=10000, error_rate_429=0.5, seed=3) as server:
+                client = make_client(server)
+                results = []
+                for _ in range(8):
+                    try:
+                        client.chat.completions.create(model="m", messages=[{"role": "user", "content": "x"}])
+                        results.append("ok")
+                    except openai.RateLimitError:
+                        results.append("429")
+                return results
+
+        self.assertEqual(outcomes(), outcomes())
+
+    def test_speech_returns_mp3_frames(self):
+        with FakeOpenAIServer(latency=0) as server:
+            response = make_client(server).audio.speech.create(model="tts-1", voice="alloy", input="Hello world")
+        self.assertTrue(response.content.startswith(SILENT_MP3_FRAME[:4]))
+        self.assertEqual(len(response.content) % len(SILENT_MP3_FRAME), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from hedging import Hedger, create_completion
+from metrics import get_metrics
+
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=None)
+
+
+class FakeStream:
+    def __init__(self, contents, delay=0.0):
+        self.contents = contents
+        self.delay = delay
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        for content in self.contents:
+            time.sleep(self.delay)
+            if self.closed.is_set():
+                return
+            yield chunk(content)
+
+    def close(self):
+        self.closed.set()
+
+
+class TestHedger(unittest.TestCase):
+
+    def setUp(self):
+        get_metrics().clear()
+        self.hedger = Hedger(percentile=90, min_samples=5, min_delay=0.05, max_rate=1.0)
+
+    def seed_latencies(self, stage, ttft=0.05, count=5):
+        for _ in range(count):
+            get_metrics().record({"stage": stage, "ttft": ttft, "wall_time": ttft})
+
+    def slow_then_fast_client(self, slow_result, fast_result, slow_seconds=1.0):
+        calls = []
+
+        def create(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                time.sleep(slow_seconds)
+                return slow_result
+            return fast_result
+
+        client = MagicMock()
+        client.chat.completions.create.side_effect = create
+        return client, calls
+
+    def test_no_hedge_without_enough_samples(self):
+        client = MagicMock()
+        client.chat.completions.create.return_value = "response"
+        self.assertIsNone(self.hedger.hedge_delay("direct"))
+        self.assertEqual(self.hedger.create(client, "direct", model="m", messages=[]), "response")
+        self.assertEqual(get_metrics().counters().get("direct.hedges_sent", 0), 0)
+
+    def test_threshold_follows_observed_latency(self):
+        self.seed_latencies("direct", ttft=0.3)
+        self.assertAlmostEqual(self.hedger.hedge_delay("direct"), 0.3)
+
+    def test_slow_call_is_hedged_and_hedge_wins(self):
+        self.seed_latencies("direct")
+        client, calls = self.slow_then_fast_client("slow", "fast")
+        started_at = time.monotonic()
+        self.assertEqual(self.hedger.create(client, "direct", model="m", messages=[]), "fast")
+        self.assertLess(time.monotonic() - started_at, 0.5)
+        counters = get_metrics().counters()
+        self.assertEqual(counters["direct.hedges_sent"], 1)
+        self.assertEqual(counters["direct.hedge_wins"], 1)
+        self.assertEqual(get_metrics().summary()["direct"]["hedge_rate"], 1.0)
+
+    def test_hedge_uses_fallback_model(self):
+        self.seed_latencies("direct")
+        self.hedger.fallback_model = "fallback"
+        client, calls = self.slow_then_fast_client("slow", "fast")
+        self.hedger.create(client, "direct", model="m", messages=[])
+        self.assertEqual([c["model"] for c in calls], ["m", "fallback"])
+
+    def test_hedge_rate_is_capped(self):
+        self.seed_latencies("direct")
+        self.hedger.max_rate = 0.5
+        get_metrics().increment("direct.calls", 1)
+        get_metrics().increment("direct.hedges_sent", 1)
+        self.assertIsNone(self.hedger.hedge_delay("direct"))
+
+    def test_stream_hedge_closes_the_loser(self):
+        self.seed_latencies("direct")
+        slow, fast = FakeStream(["slow"], delay=1.0), FakeStream(["fast", " answer"])
+        client, _ = self.slow_then_fast_client(slow, fast, slow_seconds=0)
+        chunks = self.hedger.create(client, "direct", model="m", messages=[], stream=True)
+        self.assertEqual("".join(c.choices[0].delta.content for c in chunks), "fast answer")
+        self.assertTrue(slow.closed.wait(2))
+        self.assertFalse(fast.closed.is_set())
+
+    def test_create_completion_without_hedger(self):
+        client = MagicMock()
+        create_completion(client, None, "direct", model="m", messages=[])
+        client.chat.completions.create.assert_called_once_with(model="m", messages=[])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from history_store import HistoryStore, fts_query, import_log
+from log_writer import LogWriter
+from utils import append_chat_log
+
+
+def turn(day: int, user_input: str, thinking: str = "", direct: str = ""):
+    return {"timestamp": f"2024-01-{day:02d}T12:00:00", "user_input": user_input, "thinking_plan": "plan",
+            "thinking_response": thinking, "direct_response": direct}
+
+
+class TestHistoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = HistoryStore(os.path.join(self.directory, "history.sqlite3"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_uses_wal(self):
+        mode = self.store._read_conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_search_finds_words_in_any_field(self):
+        self.store.add_many([
+            turn(1, "Tell me about volcanoes", thinking="Volcanoes erupt magma"),
+            turn(2, "Weather today?", direct="Sunny with a chance of ash"),
+            turn(3, "Cooking pasta", thinking="Boil water"),
+        ])
+        results, total = self.store.search("ash")
+        self.assertEqual(total, 1)
+        self.assertEqual(results[0]["entry"]["user_input"], "Weather today?")
+        self.assertIn("**ash**", results[0]["snippet"])
+        self.assertEqual(self.store.search("magma volcanoes")[1], 1)
+        self.assertEqual(self.store.search("magma pasta")[1], 0)
+        self.assertEqual(self.store.search("   "), ([], 0))
+
+    def test_search_by_field_and_time(self):
+        self.store.add_many([
+            turn(1, "volcano question", thinking="about volcano"),
+            turn(8, "other", thinking="volcano again"),
+            turn(9, "volcano", direct="no"),
+        ])
+        self.assertEqual(self.store.search("volcano", fields=["thinking_response"])[1], 2)
+        results, total = self.store.search("volcano", fields=["thinking_response"], start="2024-01-07")
+        self.assertEqual(total, 1)
+        self.assertEqual(results[0]["entry"]["timestamp"], "2024-01-08T12:00:00")
+
+    def test_pagination(self):
+        self.store.add_many([turn(1, f"question {i} about llamas") for i in range(25)])
+        seen = set()
+        for page in range(3):
+            results, total = self.store.search("llamas", limit=10, offset=page * 10)
+            self.assertEqual(total, 25)
+            seen.update(r["id"] for r in results)
+        self.assertEqual(len(seen), 25)
+
+    def test_query_words_are_literals(self):
+        self.store.add_many([turn(1, 'what does "OR" NOT mean*')])
+        self.assertEqual(self.store.search('"OR" NOT mean*')[1], 1)
+        self.assertEqual(fts_query("a b", ["user_input", "bogus"]), '{user_input} : ("a" "b")')
+
+    def test_email_turns_are_indexed(self):
+        self.store.add_many([{"timestamp": "2024-01-01T00:00:00", "user_input (voice_email)": "read my email",
+                              "handler_response": "You have 3 unread emails"}])
+        self.assertEqual(self.store.search("unread")[1], 1)
+        self.assertEqual(self.store.search("email", fields=["user_input"])[1], 1)
+
+    def test_iter_entries_and_clear(self):
+        self.store.add_many([turn(day, str(day)) for day in (1, 2, 3)])
+        self.assertEqual([e["user_input"] for e in self.store.iter_entries(batch_size=2)], ["1", "2", "3"])
+        self.assertEqual([e["user_input"] for e in self.store.iter_entries(start="2024-01-02")], ["2", "3"])
+        self.store.clear()
+        self.assertEqual(self.store.stats()["entries"], 0)
+        self.assertEqual(self.store.search("plan")[1], 0)
+
+    def test_import_log_and_writer_batches(self):
+        log_path = os.path.join(self.directory, "chat_history.jsonl")
+        append_chat_log([turn(1, "imported turn")], log_path)
+        self.assertEqual(import_log(self.store, log_path), 1)
+
+        writer = LogWriter(log_path, fsync="never", store=self.store)
+        writer.write({"user_input": "written turn"})
+        writer.close()
+        results, _ = self.store.search("written")
+        self.assertIn("timestamp", results[0]["entry"])
+        self.assertEqual(self.store.stats()["entries"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
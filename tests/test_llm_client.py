@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import llm_client
+
+
+class TestLLMClient(unittest.TestCase):
+
+    def setUp(self):
+        llm_client.close_clients()
+
+    def tearDown(self):
+        llm_client.close_clients()
+
+    @patch('llm_client.config.OPENAI_API_KEY', 'test-key')
+    def test_client_is_shared(self):
+        first = llm_client.get_openai_client()
+        second = llm_client.get_openai_client()
+        self.assertIs(first, second)
+
+    @patch('llm_client.config.OPENAI_MAX_CONNECTIONS', 3)
+    @patch('llm_client.config.OPENAI_API_KEY', 'test-key')
+    def test_pool_limits_applied(self):
+        llm_client.get_openai_client()
+        pool = llm_client._http_client._transport._pool
+        self.assertEqual(pool._max_connections, 3)
+
+    def test_pool_stats_before_first_use(self):
+        stats = llm_client.get_pool_stats()
+        self.assertEqual(stats["connections"], 0)
+        self.assertIn("requests_sent", stats)
+
+    @patch('llm_client.config.CASSETTE_MODE', 'off')
+    @patch('llm_client.config.OPENAI_BASE_URL', None)
+    @patch('llm_client.config.OPENAI_API_KEY', None)
+    def test_credentials(self):
+        self.assertFalse(llm_client.has_credentials())
+        with patch('llm_client.config.OPENAI_BASE_URL', 'http://localhost:8000/v1'):
+            self.assertTrue(llm_client.has_credentials())
+        with patch('llm_client.config.CASSETTE_MODE', 'replay'):
+            self.assertTrue(llm_client.has_credentials())
+        with patch('llm_client.config.OPENAI_API_KEY', 'test-key'):
+            self.assertTrue(llm_client.has_credentials())
+
+    @patch('llm_client.config.CASSETTE_MODE', 'off')
+    @patch('llm_client.config.OPENAI_BASE_URL', 'http://localhost:8000/v1')
+    @patch('llm_client.config.OPENAI_API_KEY', None)
+    def test_speech_without_key_against_local_server(self):
+        with patch.dict(sys.modules):
+            sys.modules.pop('audio_utils', None)  # test_app_email_processing.py leaves a mock in its place
+            import audio_utils
+        with patch.object(audio_utils, 'get_openai_client') as get_client, \
+                patch.object(audio_utils.pygame, 'mixer') as mixer:
+            get_client.return_value.audio.speech.create.return_value.content = b"audio"
+            mixer.music.get_busy.return_value = False
+            audio_utils.speak_text("hello")
+        get_client.return_value.audio.speech.create.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
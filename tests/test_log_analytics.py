@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import log_segments
+from log_analytics import grouped_stats, load_columns, main, summarize
+from log_columns import LogColumns
+from utils import append_chat_log
+
+
+def turn(day: int, wall_time: float, model: str = "gpt-4o-mini", error: bool = False):
+    return {"timestamp": f"2024-01-{day:02d}T12:00:00", "user_input": "question",
+            "thinking_plan": "plan", "thinking_response": "answer!", "direct_response": "direct",
+            "metrics": {
+                "plan": {"model": model, "wall_time": 1.0, "ttft": 0.2, "prompt_tokens": 10, "completion_tokens": 5},
+                "final": {"model": model, "wall_time": wall_time, "ttft": 0.3, "prompt_tokens": 20,
+                          "completion_tokens": 7, "error": "boom" if error else None},
+                "direct": {"model": "gpt-3.5-turbo", "wall_time": 0.5, "ttft": 0.1},
+            }}
+
+
+class TestGroupedStats(unittest.TestCase):
+
+    def test_matches_numpy_per_group(self):
+        rng = np.random.default_rng(0)
+        groups = rng.integers(0, 5, 1000)
+        values = rng.exponential(size=1000)
+        values[::17] = np.nan
+        stats = grouped_stats(groups, values, 6, (50, 90, 99))
+        for g in range(5):
+            expected = values[(groups == g) & ~np.isnan(values)]
+            self.assertEqual(stats["count"][g], expected.size)
+            self.assertAlmostEqual(stats["mean"][g], expected.mean())
+            self.assertAlmostEqual(stats["min"][g], expected.min())
+            self.assertAlmostEqual(stats["max"][g], expected.max())
+            for q in (50, 90, 99):
+                self.assertAlmostEqual(stats[f"p{q:g}"][g], np.percentile(expected, q))
+        self.assertEqual(stats["count"][5], 0)
+        self.assertTrue(np.isnan(stats["p50"][5]))
+
+
+class TestLogAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "chat_history.jsonl")
+        append_chat_log([turn(1, 2.0), turn(1, 4.0, model="gpt-4o"), turn(2, 3.0, error=True)], self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_turns_add_up_their_calls(self):
+        rows = summarize(load_columns(self.path), "turn", ["day", "brain"], "wall_time")
+        self.assertEqual([(r["day"], r["brain"], r["count"]) for r in rows],
+                         [("2024-01-01", "direct", 2), ("2024-01-01", "thinking", 2),
+                          ("2024-01-02", "direct", 1), ("2024-01-02", "thinking", 1)])
+        self.assertEqual((rows[1]["min"], rows[1]["max"]), (3.0, 5.0))
+        ttft = summarize(load_columns(self.path), "turn", ["brain"], "ttft")
+        self.assertEqual(ttft[1]["mean"], 1.3)  # The plan's wall time plus the answer's ttft
+        tokens = summarize(load_columns(self.path), "turn", ["brain"], "prompt_tokens")
+        self.assertEqual((tokens[0]["count"], tokens[1]["mean"]), (0, 30.0))
+
+    def test_turn_keys(self):
+        columns = load_columns(self.path)
+        models = summarize(columns, "turn", ["model"], "response_chars")
+        self.assertEqual([(r["model"], r["count"]) for r in models],
+                         [("gpt-3.5-turbo", 3), ("gpt-4o", 1), ("gpt-4o-mini", 2)])
+        errors = summarize(columns, "turn", ["brain", "error"], "wall_time")
+        self.assertEqual([(r["brain"], r["error"], r["count"]) for r in errors],
+                         [("direct", "no", 3), ("thinking", "no", 2), ("thinking", "yes", 1)])
+        self.assertEqual(summarize(columns, "turn", ["month"], "wall_time")[0]["count"], 6)
+
+    def test_calls(self):
+        rows = summarize(load_columns(self.path), "call", ["stage"], "response_chars")
+        self.assertEqual([(r["stage"], r["count"], r["mean"]) for r in rows],
+                         [("direct", 3, 6.0), ("final", 3, 7.0), ("plan", 3, 4.0)])
+
+    def test_invalid_group_key(self):
+        with self.assertRaises(ValueError):
+            summarize(load_columns(self.path), "turn", ["stage"], "wall_time")
+
+    def test_empty_log(self):
+        self.assertEqual(summarize(LogColumns(), "turn", ["day"], "wall_time"), [])
+
+    def test_csv_output(self):
+        output = os.path.join(self.directory, "stats.csv")
+        main(["--log", self.path, "--group-by", "brain", "--metric", "wall_time", "--percentiles", "50",
+              "--until", "2024-01-01", "--format", "csv", "--output", output])
+        with open(output) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "brain,count,mean,min,p50,max")
+        self.assertEqual(lines[2], "thinking,2,4.0,3.0,4.0,5.0")
+
+    def test_time_window(self):
+        rows = summarize(load_columns(self.path), "call", ["day"], "wall_time", start="2024-01-02")
+        self.assertEqual([(r["day"], r["count"]) for r in rows], [("2024-01-02", 3)])
+
+
+class TestSegmentColumns(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.plain = os.path.join(self.directory, "plain.jsonl")
+        self.rotated = os.path.join(self.directory, "rotated.jsonl")
+        turns = [turn(1, 2.0), turn(1, 4.0, model="gpt-4o"), turn(2, 3.0, error=True), turn(3, 1.0)]
+        append_chat_log(turns, self.plain)
+        append_chat_log(turns[:2], self.rotated)
+        log_segments.rotate(self.rotated)
+        append_chat_log(turns[2:3], self.rotated)
+        log_segments.rotate(self.rotated)
+        append_chat_log(turns[3:], self.rotated)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def summaries(self, path):
+        columns = load_columns(path)
+        return [summarize(columns, "turn", ["day", "brain", "model"], "ttft"),
+                summarize(columns, "turn", ["error"], "prompt_tokens"),
+                summarize(columns, "call", ["stage", "model"], "response_chars")]
+
+    def test_segments_give_the_same_results(self):
+        columns_files = [name for name in os.listdir(log_segments.segment_dir(self.rotated))
+                         if name.endswith(".columns.npz")]
+        self.assertEqual(len(columns_files), 2)  # Saved when the segments were sealed
+        self.assertEqual(self.summaries(self.rotated), self.summaries(self.plain))
+
+    def test_missing_columns_are_rebuilt(self):
+        segment = log_segments.read_index(self.rotated)[0]
+        columns_path = os.path.join(log_segments.segment_dir(self.rotated), segment["file"] + ".columns.npz")
+        os.remove(columns_path)
+        self.assertEqual(self.summaries(self.rotated), self.summaries(self.plain))
+        self.assertTrue(os.path.exists(columns_path))
+
+    def test_time_window_skips_segments(self):
+        with patch.object(log_segments, "read_segment_columns",
+                                        wraps=log_segments.read_segment_columns) as read:
+            rows = summarize(load_columns(self.rotated, "2024-01-02"), "turn", ["day"], "wall_time",
+                             start="2024-01-02")
+        self.assertEqual(read.call_count, 1)
+        self.assertEqual([(r["day"], r["count"]) for r in rows], [("2024-01-02", 2), ("2024-01-03", 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import log_segments
+from log_export import export_file, iter_export
+from utils import append_chat_log
+
+
+def turn(day: int, i: int):
+    return {"timestamp": f"2024-01-{day:02d}T12:00:{i:02d}", "user_input": f"question {day}-{i}",
+            "thinking_plan": "plan, with \"quotes\"\nand lines", "thinking_response": "answer",
+            "direct_response": "direct", "metrics": {"direct": {"wall_time": 0.5}}}
+
+
+class TestLogExport(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "chat_history.jsonl")
+        append_chat_log([turn(1, i) for i in range(3)], self.path)
+        log_segments.rotate(self.path)
+        append_chat_log([turn(2, i) for i in range(3)], self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def export(self, **options) -> bytes:
+        return b"".join(iter_export(self.path, **options))
+
+    def test_jsonl_covers_segments_and_active_log(self):
+        lines = self.export().decode("utf-8").splitlines()
+        self.assertEqual([json.loads(line)["user_input"] for line in lines],
+                         [f"question {d}-{i}" for d in (1, 2) for i in range(3)])
+
+    def test_csv_with_field_and_date_filters(self):
+        text = self.export(fmt="csv", fields=["timestamp", "user_input", "thinking_plan"],
+                           start="2024-01-02T00:00:00", end="2024-01-02T12:00:01").decode("utf-8")
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0], ["timestamp", "user_input", "thinking_plan"])
+        self.assertEqual([row[1] for row in rows[1:]], ["question 2-0", "question 2-1"])
+        self.assertEqual(rows[1][2], 'plan, with "quotes"\nand lines')
+
+    def test_csv_default_columns_encode_nested_values(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(fmt="csv").decode("utf-8"))))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(json.loads(rows[0]["metrics"]), {"direct": {"wall_time": 0.5}})
+        self.assertEqual(rows[0]["handler_response"], "")
+
+    def test_gzip_streams_in_chunks(self):
+        chunks = list(iter_export(self.path, compress=True, chunk_size=100))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(gzip.decompress(b"".join(chunks)), self.export())
+
+    def test_jsonl_fields_normalize_email_turns(self):
+        append_chat_log({"timestamp": "2024-01-03T00:00:00", "user_input (voice_email)": "read email",
+                         "handler_response": "done"}, self.path)
+        last = json.loads(self.export(fields=["user_input", "handler_response"]).decode().splitlines()[-1])
+        self.assertEqual(last, {"user_input": "read email", "handler_response": "done"})
+
+    def test_export_file_is_rewound(self):
+        with export_file(self.path, fmt="csv", compress=True) as f:
+            self.assertEqual(gzip.decompress(f.read()), self.export(fmt="csv"))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self.export(fmt="xml")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import log_segments
+from log_writer import LogWriter
+from utils import append_chat_log, iter_chat_history, load_chat_history
+
+
+def entries(day: int, count: int):
+    return [{"user_input": f"{day}-{i}", "timestamp": f"2024-01-{day:02d}T10:00:{i:02d}"} for i in range(count)]
+
+
+class TestLogSegments(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "chat_history.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rotate_compresses_log_and_indexes_it(self):
+        append_chat_log(entries(1, 3), self.path)
+        segment = log_segments.rotate(self.path)
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(segment["file"], "000001.jsonl.gz")
+        self.assertEqual(segment["entries"], 3)
+        self.assertEqual(segment["first_timestamp"], "2024-01-01T10:00:00")
+        self.assertEqual(segment["last_timestamp"], "2024-01-01T10:00:02")
+        with gzip.open(os.path.join(log_segments.segment_dir(self.path), segment["file"]), "rt") as f:
+            self.assertEqual(len(f.readlines()), 3)
+        self.assertEqual(log_segments.read_index(self.path), [segment])
+        self.assertIsNone(log_segments.rotate(self.path))  # Nothing new to rotate
+
+    def test_reader_spans_segments_and_active_log(self):
+        append_chat_log(entries(1, 2), self.path)
+        log_segments.rotate(self.path)
+        append_chat_log(entries(2, 2), self.path)
+        log_segments.rotate(self.path)
+        append_chat_log(entries(3, 2), self.path)
+
+        self.assertEqual([e["user_input"] for e in load_chat_history(self.path)],
+                         ["1-0", "1-1", "2-0", "2-1", "3-0", "3-1"])
+        self.assertEqual([s["number"] for s in log_segments.read_index(self.path)], [1, 2])
+
+    def test_time_window_skips_segments_outside_it(self):
+        for day in (1, 2, 3):
+            append_chat_log(entries(day, 2), self.path)
+            log_segments.rotate(self.path)
+        append_chat_log(entries(4, 1), self.path)
+
+        with patch("log_segments.iter_segment_lines", wraps=log_segments.iter_segment_lines) as read_segment:
+            found = list(iter_chat_history(self.path, start="2024-01-02T00:00:00", end="2024-01-02T23:59:59"))
+        self.assertEqual([e["user_input"] for e in found], ["2-0", "2-1"])
+        self.assertEqual([c.args[1]["number"] for c in read_segment.call_args_list], [2])
+
+    def test_needs_rotation_by_size_and_age(self):
+        self.assertFalse(log_segments.needs_rotation(self.path, max_bytes=1))
+        append_chat_log(entries(1, 1), self.path)
+        self.assertTrue(log_segments.needs_rotation(self.path, max_bytes=10))
+        self.assertFalse(log_segments.needs_rotation(self.path, max_bytes=10 ** 6))
+        self.assertTrue(log_segments.needs_rotation(self.path, max_age_seconds=3600))
+
+        os.remove(self.path)
+        append_chat_log({"user_input": "new", "timestamp": (datetime.now() - timedelta(seconds=10)).isoformat()},
+                        self.path)
+        self.assertFalse(log_segments.needs_rotation(self.path, max_age_seconds=3600))
+
+    def test_recovers_interrupted_rotation(self):
+        append_chat_log(entries(1, 2), self.path)
+        os.replace(self.path, self.path + ".rotating")  # Crashed before compressing
+        append_chat_log(entries(2, 1), self.path)
+        self.assertEqual(len(load_chat_history(self.path)), 3)
+
+        log_segments.recover(self.path)
+        self.assertFalse(os.path.exists(self.path + ".rotating"))
+        self.assertEqual(log_segments.read_index(self.path)[0]["entries"], 2)
+        self.assertEqual([e["user_input"] for e in load_chat_history(self.path)], ["1-0", "1-1", "2-0"])
+
+    def test_zstd_falls_back_to_gzip_without_zstandard(self):
+        append_chat_log(entries(1, 1), self.path)
+        with patch("log_segments.zstandard", None):
+            segment = log_segments.rotate(self.path, compression="zstd")
+        self.assertTrue(segment["file"].endswith(".jsonl.gz"))
+
+    def test_writer_rotates_by_size(self):
+        writer = LogWriter(self.path, batch_size=1, flush_seconds=0, fsync="never", rotate_max_bytes=200)
+        for entry in entries(1, 10):
+            writer.write(entry)
+        writer.close()
+        index = log_segments.read_index(self.path)
+        self.assertGreater(len(index), 1)
+        self.assertEqual(writer.stats()["rotations"], len(index))
+        self.assertEqual([e["user_input"] for e in load_chat_history(self.path)], [f"1-{i}" for i in range(10)])
+        with open(log_segments._index_path(self.path)) as f:
+            self.assertEqual(json.load(f)["segments"], index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import log_writer
+from log_writer import LogWriter
+from utils import load_chat_history
+
+
+class TestLogWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "chat_history.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_entries_are_written_in_batches(self):
+        writer = LogWriter(self.path, batch_size=10, flush_seconds=0.2, fsync="never")
+        for i in range(25):
+            writer.write({"user_input": str(i)})
+        writer.flush()
+        self.assertEqual([e["user_input"] for e in load_chat_history(self.path)], [str(i) for i in range(25)])
+        stats = writer.stats()
+        self.assertEqual(stats["entries"], 25)
+        self.assertLess(stats["batches"], 25)
+        writer.close()
+
+    def test_close_drains_queue(self):
+        writer = LogWriter(self.path, flush_seconds=5, fsync="batch")
+        for i in range(5):
+            writer.write({"user_input": str(i)})
+        writer.close()
+        self.assertEqual(len(load_chat_history(self.path)), 5)
+        # Writes after close still reach the log
+        writer.write({"user_input": "late"})
+        self.assertEqual(load_chat_history(self.path)[-1]["user_input"], "late")
+
+    def test_fsync_per_entry(self):
+        writer = LogWriter(self.path, fsync="entry", flush_seconds=0.05)
+        with patch("utils.os.fsync") as fsync:
+            writer.write({"user_input": "a"})
+            writer.write({"user_input": "b"})
+            writer.flush()
+        self.assertEqual(fsync.call_count, 2)
+        writer.close()
+
+    def test_unknown_fsync_policy(self):
+        with self.assertRaises(ValueError):
+            LogWriter(self.path, fsync="sometimes")
+
+    def test_full_queue_applies_backpressure_then_writes_synchronously(self):
+        release = threading.Event()
+        real_append = log_writer.append_chat_log
+
+        def slow_append(*args, **kwargs):
+            release.wait(5)
+            return real_append(*args, **kwargs)
+
+        with patch("log_writer.append_chat_log", side_effect=slow_append):
+            writer = LogWriter(self.path, max_queue=1, batch_size=1, flush_seconds=0, enqueue_timeout=0.1)
+            writer.write({"user_input": "1"})  # Taken by the writer thread, which blocks
+            time.sleep(0.05)
+            writer.write({"user_input": "2"})  # Fills the queue
+            threading.Timer(0.5, release.set).start()
+            started_at = time.monotonic()
+            writer.write({"user_input": "3"})  # Blocked, then written by this thread
+            self.assertGreaterEqual(time.monotonic() - started_at, 0.1)
+            writer.close()
+        stats = writer.stats()
+        self.assertEqual(stats["blocked_puts"], 1)
+        self.assertEqual(stats["sync_writes"], 1)
+        self.assertEqual(sorted(e["user_input"] for e in load_chat_history(self.path)), ["1", "2", "3"])
+
+    def test_log_chat_entry_without_writer(self):
+        with patch.object(log_writer.config, "LOG_WRITER_ENABLED", False), \
+                patch.object(log_writer.config, "LOG_FILE_PATH", self.path), \
+                patch.object(log_writer.config, "LOG_FSYNC", "batch"):
+            log_writer.log_chat_entry({"user_input": "direct"})
+            log_writer.flush_chat_log()
+        self.assertEqual(load_chat_history(self.path)[0]["user_input"], "direct")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import metrics
+from metrics import MetricsRecorder, CallTimer
+
+
+class TestMetricsRecorder(unittest.TestCase):
+
+    def test_ring_buffer_keeps_most_recent(self):
+        recorder = MetricsRecorder(max_records=3)
+        for i in range(5):
+            recorder.record({"stage": "direct", "wall_time": i})
+        self.assertEqual([r["wall_time"] for r in recorder.records()], [2, 3, 4])
+
+    def test_summary_percentiles_per_stage(self):
+        recorder = MetricsRecorder()
+        for i in range(1, 101):
+            recorder.record({"stage": "plan", "wall_time": float(i), "ttft": float(i) / 2,
+                             "prompt_tokens": 10, "completion_tokens": 20})
+        recorder.record({"stage": "plan", "wall_time": 500.0, "ttft": None, "error": "boom"})
+        recorder.record({"stage": "direct", "wall_time": 1.0, "ttft": 0.5})
+
+        summary = recorder.summary()
+        self.assertEqual(summary["plan"]["calls"], 101)
+        self.assertEqual(summary["plan"]["errors"], 1)
+        self.assertAlmostEqual(summary["plan"]["wall_time_p50"], 50.5)
+        self.assertAlmostEqual(summary["plan"]["wall_time_p99"], 99.01)
+        self.assertEqual(summary["plan"]["prompt_tokens_mean"], 10)
+        self.assertEqual(summary["direct"]["calls"], 1)
+        self.assertIsNone(summary["direct"]["prompt_tokens_mean"])
+
+    def test_percentile_without_data(self):
+        self.assertIsNone(MetricsRecorder().percentile("plan", "ttft", 90))
+
+
+class TestCallTimer(unittest.TestCase):
+
+    @patch('metrics.get_metrics')
+    def test_streaming_call(self, mock_get_metrics):
+        with patch('metrics.time.perf_counter', side_effect=[10.0, 10.5, 12.0]):
+            timer = CallTimer("direct", "gpt-3.5-turbo")
+            timer.first_token()
+            record = timer.finish(MagicMock(prompt_tokens=12, completion_tokens=34))
+
+        self.assertEqual(record["wall_time"], 2.0)
+        self.assertEqual(record["ttft"], 0.5)
+        self.assertEqual(record["prompt_tokens"], 12)
+        self.assertEqual(record["completion_tokens"], 34)
+        mock_get_metrics.return_value.record.assert_called_once_with(record)
+
+    @patch('metrics.get_metrics')
+    def test_non_streaming_ttft_equals_wall_time(self, mock_get_metrics):
+        with patch('metrics.time.perf_counter', side_effect=[1.0, 3.0]):
+            record = CallTimer("plan", "gpt-4o-mini").finish(None)
+        self.assertEqual(record["ttft"], record["wall_time"])
+        self.assertIsNone(record["prompt_tokens"])
+
+    @patch('metrics.get_metrics')
+    def test_error_call(self, mock_get_metrics):
+        record = CallTimer("final", "gpt-4o-mini").finish(error="timeout")
+        self.assertEqual(record["error"], "timeout")
+        self.assertIsNone(record["ttft"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from plan_cache import PlanCache
+
+
+class TestPlanCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "plan_cache.sqlite3")
+        self.cache = PlanCache(self.db_path, max_entries=2, ttl_seconds=60)
+
+    def tearDown(self):
+        self.cache._conn.close()
+        self.tmp_dir.cleanup()
+
+    def test_hit_after_put_with_normalized_input(self):
+        self.cache.put("prompt", "gpt-4o-mini", "What is AGI?", "plan A")
+        self.assertEqual(self.cache.get("prompt", "gpt-4o-mini", "  what is   AGI? "), "plan A")
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_miss_on_different_model_or_prompt(self):
+        self.cache.put("prompt", "gpt-4o-mini", "What is AGI?", "plan A")
+        self.assertIsNone(self.cache.get("prompt", "gpt-4o", "What is AGI?"))
+        self.assertIsNone(self.cache.get("other prompt", "gpt-4o-mini", "What is AGI?"))
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_lru_eviction(self):
+        with patch('plan_cache.time.time', side_effect=[1, 2, 3, 4, 5, 6]):
+            self.cache.put("p", "m", "first", "plan 1")
+            self.cache.put("p", "m", "second", "plan 2")
+            self.cache.get("p", "m", "first")  # first is now most recently used
+            self.cache.put("p", "m", "third", "plan 3")
+            self.assertIsNone(self.cache.get("p", "m", "second"))
+            self.assertEqual(self.cache.get("p", "m", "first"), "plan 1")
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_expired_entry_is_a_miss(self):
+        with patch('plan_cache.time.time', side_effect=[100, 200]):
+            self.cache.put("p", "m", "question", "plan")
+            self.assertIsNone(self.cache.get("p", "m", "question"))
+
+    def test_persists_across_instances(self):
+        self.cache.put("p", "m", "question", "plan")
+        reopened = PlanCache(self.db_path, max_entries=2, ttl_seconds=60)
+        self.assertEqual(reopened.get("p", "m", "question"), "plan")
+        reopened._conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from query_router import QueryRouter, RouterModel, heuristic_score, training_examples
+
+
+class TestQueryRouter(unittest.TestCase):
+
+    def test_trivial_phrases_score_zero(self):
+        for text in ["hi", "Thanks!", "ok", "  Good morning. "]:
+            self.assertEqual(heuristic_score(text), 0.0, text)
+
+    def test_reasoning_queries_score_higher(self):
+        self.assertGreater(
+            heuristic_score("Explain how transformers work and compare them to RNNs"),
+            heuristic_score("what time is it")
+        )
+
+    def test_route_respects_threshold(self):
+        router = QueryRouter(threshold=0.3)
+        self.assertFalse(router.route("thanks").plan)
+        self.assertTrue(router.route("Explain why the sky is blue and how sunsets change its color, step by step.").plan)
+        self.assertIn("skipped", router.route("thanks").describe())
+
+    def test_default_threshold_only_skips_greetings(self):
+        router = QueryRouter(threshold=0.0)  # The default PLANNER_BYPASS_THRESHOLD
+        for text in ["hi", "Thanks!", "ok", "got it"]:
+            self.assertFalse(router.route(text).plan, text)
+            self.assertIn("greeting", router.route(text).describe())
+        for text in ["Is Rust memory safe?", "Which database suits a small startup?", "Summarize my inbox",
+                     "What's the capital of France?", "Should I refinance my mortgage now?"]:
+            self.assertTrue(router.route(text).plan, text)
+
+    def test_model_learns_from_history(self):
+        history = []
+        for i in range(20):
+            history.append({"user_input": f"quick fact number {i}", "thinking_response": "short answer"})
+            history.append({"user_input": f"design a detailed architecture for service {i}",
+                            "thinking_response": "word " * 200})
+        history.append({"user_input (voice_email)": "check my email", "handler_response": "none"})
+
+        texts, labels = training_examples(history)
+        self.assertEqual(len(texts), 40)
+        model = RouterModel.train(texts, labels)
+        self.assertGreater(model.predict("design a detailed architecture for billing"),
+                           model.predict("quick fact about cats"))
+
+
+if __name__ == '__main__':
+    unittest.main()
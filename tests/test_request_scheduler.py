@@ -0,0 +1,122 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+import openai
+
+from request_scheduler import (RequestScheduler, ScheduledClient, TokenBucket, current_priority,
+                               estimate_tokens, request_priority, retry_after_seconds)
+
+
+def rate_limit_error(headers=None, code=None):
+    request = httpx.Request("POST", "http://test/v1/chat/completions")
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    body = {"code": code} if code else None
+    return openai.RateLimitError("rate limited", response=response, body=body)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_wait_time_after_draining(self):
+        bucket = TokenBucket(per_minute=60)  # One per second
+        now = time.monotonic()
+        bucket.take(60, now)
+        self.assertAlmostEqual(bucket.wait_time(2, now), 2.0, places=2)
+        self.assertEqual(bucket.wait_time(2, now + 2.5), 0.0)
+
+    def test_zero_limit_is_unlimited(self):
+        bucket = TokenBucket(per_minute=0)
+        bucket.take(10 ** 9, time.monotonic())
+        self.assertEqual(bucket.wait_time(10 ** 9, time.monotonic()), 0.0)
+
+
+class TestRequestScheduler(unittest.TestCase):
+
+    def test_request_limit_throttles(self):
+        scheduler = RequestScheduler(requests_per_minute=600, tokens_per_minute=0)  # 10 per second
+        scheduler._limits("m").requests.level = 1
+        scheduler.acquire("m", 0)
+        waited = scheduler.acquire("m", 0)
+        self.assertGreater(waited, 0.05)
+
+    def test_voice_requests_go_first(self):
+        scheduler = RequestScheduler(requests_per_minute=600, tokens_per_minute=0)
+        scheduler._limits("m").requests.level = 0
+        order = []
+
+        def request(priority):
+            scheduler.acquire("m", 0, priority)
+            order.append(priority)
+
+        threads = [threading.Thread(target=request, args=("interactive",))]
+        threads[0].start()
+        time.sleep(0.02)  # The interactive request queues first
+        threads.append(threading.Thread(target=request, args=("voice",)))
+        threads[1].start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ["voice", "interactive"])
+
+    def test_retry_honors_retry_after(self):
+        scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+        fn = MagicMock(side_effect=[rate_limit_error({"retry-after-ms": "100"}), "ok"])
+        started_at = time.monotonic()
+        self.assertEqual(scheduler.call(fn, model="m"), "ok")
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.1)
+        self.assertEqual(scheduler.stats()["rate_limited"], 1)
+
+    def test_gives_up_after_max_retries(self):
+        scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, max_retries=2,
+                                     retry_base_seconds=0.001)
+        fn = MagicMock(side_effect=openai.APIConnectionError(request=httpx.Request("POST", "http://test")))
+        with self.assertRaises(openai.APIConnectionError):
+            scheduler.call(fn, model="m")
+        self.assertEqual(fn.call_count, 3)
+
+    def test_insufficient_quota_not_retried(self):
+        scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+        fn = MagicMock(side_effect=rate_limit_error(code="insufficient_quota"))
+        with self.assertRaises(openai.RateLimitError):
+            scheduler.call(fn, model="m")
+        self.assertEqual(fn.call_count, 1)
+
+    def test_no_retry_past_deadline(self):
+        scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+        fn = MagicMock(side_effect=rate_limit_error({"retry-after": "5"}))
+        with self.assertRaises(openai.RateLimitError):
+            scheduler.call(fn, model="m", deadline=time.monotonic() + 1)
+        self.assertEqual(fn.call_count, 1)
+
+
+class TestScheduledClient(unittest.TestCase):
+
+    def test_chat_calls_go_through_scheduler(self):
+        raw = MagicMock()
+        scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0)
+        client = ScheduledClient(raw, scheduler)
+        messages = [{"role": "user", "content": "x" * 40}]
+        client.chat.completions.create(model="m", messages=messages, max_tokens=100)
+        raw.chat.completions.create.assert_called_once_with(model="m", messages=messages, max_tokens=100)
+        self.assertEqual(scheduler.stats()["requests"], 1)
+        self.assertEqual(estimate_tokens(messages, 100), 110)
+        self.assertIs(client.models, raw.models)
+
+    def test_priority_context(self):
+        self.assertEqual(current_priority(), "interactive")
+        with request_priority("voice"):
+            self.assertEqual(current_priority(), "voice")
+        self.assertEqual(current_priority(), "interactive")
+
+    def test_retry_after_parsing(self):
+        self.assertEqual(retry_after_seconds(rate_limit_error({"retry-after": "2"})), 2.0)
+        self.assertIsNone(retry_after_seconds(rate_limit_error()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import tempfile
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from semantic_cache import SemanticPlanCache, HashingVectorizer
+
+
+class TestSemanticPlanCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmp_dir.name, "semantic_plan_index")
+        self.cache = SemanticPlanCache(self.index_path, threshold=0.6, max_entries=3, save_every=1)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_vectorizer_is_deterministic_and_normalized(self):
+        vectorizer = HashingVectorizer(dim=64)
+        first = vectorizer.embed("What is artificial general intelligence?")
+        second = vectorizer.embed("What is artificial general intelligence?")
+        self.assertTrue((first == second).all())
+        self.assertAlmostEqual(float((first ** 2).sum()), 1.0, places=5)
+
+    def test_paraphrase_hits(self):
+        self.cache.put("ns", "what is artificial general intelligence", "AGI plan")
+        self.assertEqual(self.cache.get("ns", "What is artificial general intelligence exactly?"), "AGI plan")
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_unrelated_input_misses(self):
+        self.cache.put("ns", "what is artificial general intelligence", "AGI plan")
+        self.assertIsNone(self.cache.get("ns", "recommend a pasta recipe for dinner"))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_opposite_meanings_miss(self):
+        cache = SemanticPlanCache(self.index_path, max_entries=10)
+        for cached, asked in [("sort the list ascending", "sort the list descending"),
+                              ("delete the email from Bob", "do not delete the email from Bob"),
+                              ("turn the alarm on", "turn the alarm off"),
+                              ("why is the build failing", "how is the build failing"),
+                              ("How do I reverse a list in Python?", "How do I reverse a list in Rust?")]:
+            cache.put("ns", cached, cached)
+            self.assertGreater(cache.search("ns", asked, k=1)[0][0], 0.5)  # Lexically close
+            self.assertIsNone(cache.get("ns", asked), asked)
+        self.assertEqual(cache.stats()["hits"], 0)
+
+    def test_paraphrases_hit(self):
+        cache = SemanticPlanCache(self.index_path, max_entries=10)
+        cache.put("ns", "How do I reverse a list in Python?", "reverse plan")
+        cache.put("ns", "Sort the list ascending", "sort plan")
+        for asked, plan in [("How can I reverse a list in Python?", "reverse plan"),
+                            ("in python, how would you reverse a list", "reverse plan"),
+                            ("How do I reverse a list in Python quickly?", "reverse plan"),
+                            ("please sort this list, ascending", "sort plan")]:
+            self.assertEqual(cache.get("ns", asked), plan, asked)
+
+    def test_namespaces_are_isolated(self):
+        self.cache.put("ns", "what is artificial general intelligence", "AGI plan")
+        self.assertIsNone(self.cache.get("other", "what is artificial general intelligence"))
+
+    def test_search_orders_by_similarity(self):
+        self.cache.put("ns", "how do I bake bread", "bread plan")
+        self.cache.put("ns", "how do I bake sourdough bread at home", "sourdough plan")
+        results = self.cache.search("ns", "bake sourdough bread at home", k=2)
+        self.assertEqual([plan for _, plan in results], ["sourdough plan", "bread plan"])
+
+    def test_evicts_least_recently_used_when_full(self):
+        for i, text in enumerate(["alpha beta", "gamma delta", "epsilon zeta"]):
+            self.cache.put("ns", text, f"plan {i}")
+        self.cache.get("ns", "alpha beta")
+        self.cache.put("ns", "eta theta", "plan 3")
+        self.assertEqual(len(self.cache), 3)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.assertIsNone(self.cache.get("ns", "gamma delta"))
+        self.assertEqual(self.cache.get("ns", "alpha beta"), "plan 0")
+
+    def test_index_persists(self):
+        self.cache.put("ns", "what is artificial general intelligence", "AGI plan")
+        reopened = SemanticPlanCache(self.index_path, threshold=0.6, max_entries=3)
+        self.assertEqual(reopened.get("ns", "what is artificial general intelligence"), "AGI plan")
+        self.assertIsNone(reopened.get("ns", "what is not artificial general intelligence"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import log_segments
+from session_history import read_page, restore_chats, reverse_lines, turn_messages
+from utils import append_chat_log
+
+
+def turn(i: int, timestamp: str = None):
+    return {"timestamp": timestamp or f"2024-01-01T12:00:{i:02d}", "user_input": f"question {i}",
+            "thinking_plan": f"plan {i}", "thinking_response": f"answer {i}", "direct_response": f"direct {i}"}
+
+
+class FakeChat:
+
+    def __init__(self):
+        self.messages = []
+
+    def add_message(self, role, content):
+        self.messages.append({"role": role, "content": content})
+
+
+class TestSessionHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "chat_history.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def page_through(self, limit):
+        pages, cursor = [], None
+        while True:
+            entries, cursor = read_page(self.path, limit, cursor)
+            pages.append([entry["user_input"] for entry in entries])
+            if cursor is None:
+                return pages
+
+    def test_reverse_lines_across_blocks(self):
+        lines = [f"line {i} " + "x" * (i * 7) for i in range(30)]
+        with open(self.path, "w") as f:
+            f.write("\n".join(lines) + "\n\n")
+        self.assertEqual(list(reverse_lines(self.path, block_size=16)), lines[::-1])
+        self.assertEqual(list(reverse_lines(self.path + ".missing")), [])
+
+    def test_last_page_only_reads_the_active_log(self):
+        append_chat_log([turn(i) for i in range(5)], self.path)
+        log_segments.rotate(self.path)
+        append_chat_log([turn(i) for i in range(5, 8)], self.path)
+        entries, cursor = read_page(self.path, 3)
+        self.assertEqual([e["user_input"] for e in entries], ["question 5", "question 6", "question 7"])
+        self.assertEqual(cursor, ("2024-01-01T12:00:05", 1))
+
+    def test_pages_through_segments(self):
+        for first in (0, 5, 10):
+            append_chat_log([turn(i) for i in range(first, first + 5)], self.path)
+            if first < 10:
+                log_segments.rotate(self.path)
+        pages = self.page_through(4)
+        self.assertEqual(pages[0], ["question 11", "question 12", "question 13", "question 14"])
+        self.assertEqual([q for page in reversed(pages) for q in page], [f"question {i}" for i in range(15)])
+
+    def test_identical_timestamps_across_pages(self):
+        append_chat_log([turn(i, "2024-01-01T12:00:00") for i in range(5)], self.path)
+        log_segments.rotate(self.path)
+        append_chat_log([turn(i, "2024-01-01T12:00:00") for i in range(5, 7)], self.path)
+        pages = self.page_through(3)
+        self.assertEqual([q for page in reversed(pages) for q in page], [f"question {i}" for i in range(7)])
+
+    def test_skips_unreadable_lines(self):
+        append_chat_log([turn(0), turn(1)], self.path)
+        with open(self.path, "a") as f:
+            f.write('{"timestamp": "2024-01-01T12:00:02", "user_input": "cut off\n')
+        entries, cursor = read_page(self.path, 5)
+        self.assertEqual([e["user_input"] for e in entries], ["question 0", "question 1"])
+        self.assertIsNone(cursor)
+        self.assertEqual(read_page(self.path + ".missing", 5), ([], None))
+
+    def test_restore_chats(self):
+        email = {"timestamp": "2024-01-01T12:00:09", "user_input (text_email)": "read my email",
+                 "handler_response": "You have no new email."}
+        thinking_chat, direct_chat = FakeChat(), FakeChat()
+        restore_chats(thinking_chat, direct_chat, [turn(0), email])
+        self.assertEqual([m["role"] for m in thinking_chat.messages], ["user", "system", "assistant"])
+        self.assertEqual(direct_chat.messages, [
+            {"role": "user", "content": "question 0"}, {"role": "assistant", "content": "direct 0"},
+            {"role": "user", "content": "read my email"}, {"role": "assistant", "content": "You have no new email."},
+        ])
+        self.assertEqual(turn_messages({"user_input": "hi", "direct_response": "hello"})[0], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metrics import get_metrics
+from single_flight import CoalescingClient, SingleFlight, request_key
+
+MESSAGES = [{"role": "user", "content": "Same question"}]
+
+
+def slow_create(release: threading.Event, result):
+    def create(**kwargs):
+        release.wait(5)
+        return result
+    return create
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        get_metrics().clear()
+        self.raw = MagicMock()
+        self.release = threading.Event()
+        self.client = CoalescingClient(self.raw, SingleFlight())
+
+    def run_concurrently(self, count, **kwargs):
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = [executor.submit(self.client.chat.completions.create, **kwargs) for _ in range(count)]
+            time.sleep(0.1)  # Let every caller join the flight
+            self.release.set()
+            return [f.result() for f in futures]
+
+    def test_concurrent_identical_requests_share_one_call(self):
+        self.raw.chat.completions.create.side_effect = slow_create(self.release, "response")
+        results = self.run_concurrently(4, model="m", messages=MESSAGES, temperature=0.7, timeout=5)
+        self.assertEqual(results, ["response"] * 4)
+        self.assertEqual(self.raw.chat.completions.create.call_count, 1)
+        self.assertEqual(get_metrics().counters(), {"requests_sent_upstream": 1, "requests_coalesced": 3})
+
+    def test_different_params_are_not_coalesced(self):
+        self.assertNotEqual(request_key({"model": "m", "messages": MESSAGES, "temperature": 0.7}),
+                            request_key({"model": "m", "messages": MESSAGES, "temperature": 0.2}))
+        self.assertEqual(request_key({"model": "m", "messages": MESSAGES, "timeout": 5}),
+                         request_key({"model": "m", "messages": MESSAGES, "timeout": 30}))
+
+    def test_sequential_requests_are_not_coalesced(self):
+        self.raw.chat.completions.create.return_value = "response"
+        self.client.chat.completions.create(model="m", messages=MESSAGES)
+        self.client.chat.completions.create(model="m", messages=MESSAGES)
+        self.assertEqual(self.raw.chat.completions.create.call_count, 2)
+
+    def test_errors_reach_every_caller(self):
+        def failing_create(**kwargs):
+            self.release.wait(5)
+            raise ValueError("upstream failed")
+        self.raw.chat.completions.create.side_effect = failing_create
+        with self.assertRaises(ValueError):
+            self.run_concurrently(3, model="m", messages=MESSAGES)
+        self.assertEqual(self.raw.chat.completions.create.call_count, 1)
+
+    def test_stream_is_shared_from_the_first_chunk(self):
+        chunks_ready = threading.Event()
+
+        def upstream():
+            yield "a"
+            chunks_ready.wait(5)
+            yield "b"
+            yield "c"
+
+        self.raw.chat.completions.create.return_value = upstream()
+        first = self.client.chat.completions.create(model="m", messages=MESSAGES, stream=True)
+        self.assertEqual(next(first), "a")
+        second = self.client.chat.completions.create(model="m", messages=MESSAGES, stream=True)
+        chunks_ready.set()
+        self.assertEqual(list(second), ["a", "b", "c"])
+        self.assertEqual(list(first), ["b", "c"])
+        self.assertEqual(self.raw.chat.completions.create.call_count, 1)
+
+        # Once the stream has finished, the same request goes upstream again
+        self.raw.chat.completions.create.return_value = iter(["d"])
+        self.assertEqual(list(self.client.chat.completions.create(model="m", messages=MESSAGES, stream=True)), ["d"])
+        self.assertEqual(self.raw.chat.completions.create.call_count, 2)
+
+    def test_abandoned_stream_is_closed(self):
+        stream = MagicMock()
+        stream.__iter__.return_value = iter(["a", "b"])
+        self.raw.chat.completions.create.return_value = stream
+        reader = self.client.chat.completions.create(model="m", messages=MESSAGES, stream=True)
+        next(reader)
+        reader.close()
+        stream.close.assert_called_once()
+
+    def test_other_attributes_are_forwarded(self):
+        self.assertIs(self.client.audio, self.raw.audio)
+
+
+if __name__ == '__main__':
+    unittest.main()
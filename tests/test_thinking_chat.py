@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from types import SimpleNamespace
+import json
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# test_app_email_processing.py swaps some modules for mocks at import time; load the real ones here.
+for module_name in ('config', 'thinking_chat'):
+    if isinstance(sys.modules.get(module_name), MagicMock):
+        del sys.modules[module_name]
+
+from thinking_chat import ThinkingChat, _JsonFieldStream
+
+
+def make_chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class TestJsonFieldStream(unittest.TestCase):
+
+    def test_decodes_fields_split_across_chunks(self):
+        source = json.dumps({"plan": 'Hmm, "quoted"\nnext line é', "answer": "Done \\ ok"})
+        stream = _JsonFieldStream()
+        events = []
+        for i in range(0, len(source), 3):
+            events.extend(stream.feed(source[i:i + 3]))
+
+        self.assertEqual("".join(t for f, t in events if f == "plan"), 'Hmm, "quoted"\nnext line é')
+        self.assertEqual("".join(t for f, t in events if f == "answer"), "Done \\ ok")
+
+
+@patch('thinking_chat.get_query_router', return_value=None)
+@patch('thinking_chat.get_semantic_cache', return_value=None)
+@patch('thinking_chat.get_plan_cache', return_value=None)
+@patch('thinking_chat.get_openai_client')
+class TestSingleCallMode(unittest.TestCase):
+
+    def make_chat(self, mock_get_client):
+        chat = ThinkingChat()
+        chat.mode = "single_call"
+        return chat, mock_get_client.return_value.chat.completions.create
+
+    def test_unknown_mode_is_rejected(self, mock_get_client, *_):
+        for mode in ("single-call", "single_calls"):
+            with patch('thinking_chat.config.THINKING_MODE', mode), self.assertRaises(ValueError):
+                ThinkingChat()
+
+    def test_single_call_returns_plan_and_answer(self, mock_get_client, *_):
+        chat, create = self.make_chat(mock_get_client)
+        create.return_value.choices[0].message.content = json.dumps({"plan": "my plan", "answer": "my answer"})
+
+        self.assertEqual(chat.process_message("Explain entropy"), ("my plan", "my answer"))
+        create.assert_called_once()
+        self.assertEqual(create.call_args.kwargs["response_format"], {"type": "json_object"})
+        self.assertEqual(chat.get_thinking_history(), ["my plan"])
+        self.assertEqual([m["role"] for m in chat.get_messages()], ["user", "system", "assistant"])
+
+    def test_single_call_non_json_reply_becomes_answer(self, mock_get_client, *_):
+        chat, create = self.make_chat(mock_get_client)
+        create.return_value.choices[0].message.content = "plain text"
+        self.assertEqual(chat.process_message("Explain entropy"), ("", "plain text"))
+
+    def test_single_call_stream(self, mock_get_client, *_):
+        chat, create = self.make_chat(mock_get_client)
+        source = json.dumps({"plan": "step one", "answer": "the answer"})
+        create.return_value = iter([make_chunk(source[i:i + 4]) for i in range(0, len(source), 4)])
+
+        events = list(chat.process_message_stream("Explain entropy"))
+
+        self.assertEqual("".join(d for k, d in events if k == "plan"), "step one")
+        self.assertEqual("".join(d for k, d in events if k == "response"), "the answer")
+        self.assertEqual(chat.get_messages()[1], {"role": "system", "content": "step one"})
+        self.assertEqual(chat.get_messages()[2], {"role": "assistant", "content": "the answer"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import (_iter_json_array, append_chat_log, iter_chat_history, load_chat_history, migrate_json_log,
+                   save_chat_history)
+
+
+def _append_many(path: str, name: str, text: str, count: int) -> None:
+    for i in range(count):
+        append_chat_log({"writer": name, "i": i, "text": text}, path)
+
+
+class TestChatLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "logs", "chat_history.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_append_writes_one_line_per_entry(self):
+        append_chat_log({"user_input": "hi"}, self.path)
+        append_chat_log([{"user_input": "a"}, {"user_input": "b"}], self.path)
+        with open(self.path) as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual([json.loads(line)["user_input"] for line in lines], ["hi", "a", "b"])
+        self.assertEqual([e["user_input"] for e in load_chat_history(self.path)], ["hi", "a", "b"])
+
+    def test_append_adds_timestamp_without_mutating_entry(self):
+        entry = {"user_input": "hi"}
+        append_chat_log(entry, self.path)
+        self.assertNotIn("timestamp", entry)
+        self.assertIn("timestamp", load_chat_history(self.path)[0])
+        append_chat_log({"user_input": "x", "timestamp": "2024-01-01T00:00:00"}, self.path)
+        self.assertEqual(load_chat_history(self.path)[1]["timestamp"], "2024-01-01T00:00:00")
+
+    def test_truncated_line_is_skipped(self):
+        append_chat_log({"user_input": "kept"}, self.path)
+        with open(self.path, "a") as f:
+            f.write('{"user_input": "cut of')
+        self.assertEqual([e["user_input"] for e in iter_chat_history(self.path)], ["kept"])
+
+    def test_missing_log_is_empty(self):
+        self.assertEqual(load_chat_history(self.path), [])
+
+    def test_save_rewrites_log(self):
+        append_chat_log({"user_input": "old"}, self.path)
+        entries = [{"user_input": "new"}]
+        save_chat_history(entries, self.path)
+        self.assertEqual([e["user_input"] for e in load_chat_history(self.path)], ["new"])
+        self.assertNotIn("timestamp", entries[0])
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))),
+                         ["chat_history.jsonl", "chat_history.jsonl.lock"])
+
+    def test_failed_save_keeps_old_log(self):
+        append_chat_log({"user_input": "old"}, self.path)
+        save_chat_history([{"user_input": object()}], self.path)  # Not JSON serializable
+        self.assertEqual([e["user_input"] for e in load_chat_history(self.path)], ["old"])
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))),
+                         ["chat_history.jsonl", "chat_history.jsonl.lock"])
+
+    def test_concurrent_processes_do_not_interleave(self):
+        # Entries larger than a pipe/page buffer, so unlocked buffered writes could split them
+        text = "x" * 20000
+        processes = [multiprocessing.Process(target=_append_many, args=(self.path, name, text, 20))
+                     for name in ("a", "b", "c")]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+        with open(self.path) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 60)
+        self.assertTrue(all(entry["text"] == text for entry in entries))
+
+    def test_reads_legacy_json_array(self):
+        legacy = os.path.join(self.directory, "chat_history.json")
+        with open(legacy, "w") as f:
+            json.dump([{"user_input": "a"}, {"user_input": "b"}], f, indent=2)
+        self.assertEqual([e["user_input"] for e in load_chat_history(legacy)], ["a", "b"])
+
+
+class TestMigration(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.legacy = os.path.join(self.directory, "chat_history.json")
+        self.path = os.path.join(self.directory, "chat_history.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_iter_json_array_across_chunks(self):
+        entries = [{"user_input": f"question {i}", "nested": {"text": "a, ] [ \" b" * i}} for i in range(50)]
+        text = json.dumps(entries, indent=2)
+        self.assertEqual(list(_iter_json_array(io.StringIO(text), chunk_size=7)), entries)
+        self.assertEqual(list(_iter_json_array(io.StringIO("  [ ] "))), [])
+        with self.assertRaises(ValueError):
+            list(_iter_json_array(io.StringIO('[{"a": 1}, {"b"')))
+
+    def test_migrates_legacy_log_before_new_entries(self):
+        with open(self.legacy, "w") as f:
+            json.dump([{"user_input": "a", "timestamp": "t1"}, {"user_input": "b", "timestamp": "t2"}], f, indent=2)
+        append_chat_log({"user_input": "c"}, self.path)
+
+        self.assertEqual(migrate_json_log(self.legacy, self.path), 2)
+        self.assertEqual([e["user_input"] for e in load_chat_history(self.path)], ["a", "b", "c"])
+        self.assertFalse(os.path.exists(self.legacy))
+        self.assertTrue(os.path.exists(self.legacy + ".migrated"))
+        # Only done once
+        self.assertEqual(migrate_json_log(self.legacy, self.path), 0)
+        self.assertEqual(len(load_chat_history(self.path)), 3)
+
+    def test_failed_migration_leaves_logs_untouched(self):
+        with open(self.legacy, "w") as f:
+            f.write('[{"user_input": "a"}, {"user_input": ')
+        with self.assertRaises(ValueError):
+            migrate_json_log(self.legacy, self.path)
+        self.assertTrue(os.path.exists(self.legacy))
+        self.assertEqual([name for name in os.listdir(self.directory) if not name.endswith(".lock")],
+                         ["chat_history.json"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,21 +1,120 @@
-import openai
+import json
 import os
-from typing import List, Dict, Any, Tuple
+import re
+from typing import List, Dict, Any, Tuple, Iterator, Optional
 import config
+from llm_client import get_openai_client
+from plan_cache import get_plan_cache, hash_text
+from semantic_cache import get_semantic_cache
+from metrics import CallTimer
+from hedging import create_completion, get_hedger
+from cancellation import append_to_turn
+from query_router import get_query_router
 import streamlit as st # For accessing session_state
 from email_utils import authenticate_gmail, list_emails, read_email # Gmail functions
 
-class ThinkingChat:
+THINKING_MODES = ("two_call", "single_call")
+
+SINGLE_CALL_INSTRUCTIONS = """
+
+---
+
+In this mode you also answer the query in the same reply. Respond with a JSON object with exactly two
+string fields, in this order:
+- "plan": your thinking process as described above. The instruction not to answer applies only to this field.
+- "answer": your response to the user, guided by the plan. Do NOT mention the plan or that you followed one."""
+
+
+class _JsonFieldStream:
+    """Incrementally decodes the string values of the "plan" and "answer" fields of a streamed JSON object."""
+
+    _FIELD_START = re.compile(r'"(plan|answer)"\s*:\s*"')
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
     def __init__(self):
-        """Initialize the ThinkingChat class."""
-        self.client = openai.OpenAI(api_key=config.OPENAI_API_KEY)
+        self._buffer = ""
+        self._field = None
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        """Add streamed text and return the newly decoded (field, text) pieces."""
+        self._buffer += text
+        events = []
+        while True:
+            if self._field is None:
+                match = self._FIELD_START.search(self._buffer)
+                if not match:
+                    self._buffer = self._buffer[-32:]  # Enough to hold a partially streamed key
+                    break
+                self._field = match.group(1)
+                self._buffer = self._buffer[match.end():]
+
+            decoded, consumed, closed = self._decode_string(self._buffer)
+            self._buffer = self._buffer[consumed:]
+            if decoded:
+                events.append((self._field, decoded))
+            if not closed:
+                break
+            self._field = None
+        return events
+
+    def _decode_string(self, buf: str) -> Tuple[str, int, bool]:
+        """Decode a JSON string body up to its closing quote or the last complete character."""
+        decoded = []
+        i = 0
+        while i < len(buf):
+            c = buf[i]
+            if c == '"':
+                return "".join(decoded), i + 1, True
+            if c != '\\':
+                decoded.append(c)
+                i += 1
+                continue
+            if i + 1 >= len(buf):
+                break
+            if buf[i + 1] != 'u':
+                decoded.append(self._ESCAPES.get(buf[i + 1], buf[i + 1]))
+                i += 2
+                continue
+            if i + 6 > len(buf):
+                break
+            code = int(buf[i + 2:i + 6], 16)
+            if 0xD800 <= code < 0xDC00:  # High surrogate: wait for the low half
+                if i + 12 > len(buf):
+                    break
+                low = int(buf[i + 8:i + 12], 16)
+                code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                i += 6
+            decoded.append(chr(code))
+            i += 6
+        return "".join(decoded), i, False
+
+
+class ThinkingChat:
+    def __init__(self, client=None, use_caches: bool = True):
+        """Initialize the ThinkingChat class.
+
+        client defaults to the shared OpenAI client; with use_caches=False the plan
+        caches and the planner bypass are not set up.
+        """
+        self.client = client or get_openai_client()
         self.model = config.THINKING_MODEL
+        self.timeout = config.THINKING_TIMEOUT_SECONDS
+        if config.THINKING_MODE not in THINKING_MODES:
+            raise ValueError(f"Unknown thinking mode: {config.THINKING_MODE} "
+                             f"(expected one of {', '.join(THINKING_MODES)})")
+        self.mode = config.THINKING_MODE
         self.messages = []
         self.thinking_history = []
+        self.last_metrics = {}  # Per-stage call metrics of the most recent turn
         
         # Load the planner prompt
         with open("prompts/planner_prompt.txt", "r") as f:
             self.planner_prompt = f.read()
+        self.planner_prompt_hash = hash_text(self.planner_prompt)
+        self.plan_cache = get_plan_cache() if use_caches else None
+        self.semantic_cache = get_semantic_cache() if use_caches else None
+        self.router = get_query_router() if use_caches else None
+        self.hedger = get_hedger()
 
     def handle_email_query(self, user_query: str) -> Tuple[str, str]:
         """Handles email-related queries by interacting with email_utils."""
@@ -126,13 +225,18 @@ class ThinkingChat:
             plan += f"X. Error encountered: {error_message}"
             return plan, f"Sorry, I encountered an error while processing your email request: {e}"
 
+    def _is_email_query(self, user_input: str) -> bool:
+        """Check for email-related keywords in the user input."""
+        email_keywords = ["email", "gmail", "mail", "inbox", "message", "sender", "subject"]
+        return any(keyword in user_input.lower() for keyword in email_keywords)
+
     def add_message(self, role: str, content: str) -> None:
         """Add a message to the chat history."""
-        self.messages.append({"role": role, "content": content})
+        append_to_turn(self.messages, {"role": role, "content": content})
     
     def add_thinking(self, content: str) -> None:
         """Add a thinking step to the thinking history."""
-        self.thinking_history.append(content)
+        append_to_turn(self.thinking_history, content)
     
     def get_messages(self) -> List[Dict[str, str]]:
         """Get all messages in the chat history."""
@@ -147,59 +251,146 @@ class ThinkingChat:
         self.messages = []
         self.thinking_history = []
     
+    def _planning_messages(self, user_input: str) -> List[Dict[str, str]]:
+        """Build the messages for the planning step."""
+        return [
+            {"role": "system", "content": self.planner_prompt},
+            {"role": "user", "content": user_input}
+        ]
+
+    def _final_messages(self, user_input: str, thinking_plan: Optional[str]) -> List[Dict[str, str]]:
+        """Build the messages for the final response, with the plan (if any) inlined in the system prompt."""
+        if thinking_plan is None:
+            return [
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": user_input}
+            ]
+
+        system_prompt = f"""You are a helpful assistant. Use the following thinking plan to guide your response to the user:
+
+{thinking_plan}
+
+Respond directly to the user's query using this plan, but do NOT mention that you're following a plan or include the plan in your response."""
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_input}
+        ]
+
+    def _record_metrics(self, record: Dict[str, Any]) -> None:
+        self.last_metrics[record["stage"]] = record
+
+    def _stream_content(self, messages: List[Dict[str, str]], max_tokens: int, stage: str,
+                        **params) -> Iterator[str]:
+        """Send a streaming completion request and yield the content deltas."""
+        timer = CallTimer(stage, self.model)
+        usage = None
+        try:
+            stream = create_completion(
+                self.client, self.hedger, stage,
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                timeout=self.timeout,
+                stream=True,
+                stream_options={"include_usage": True},
+                **params
+            )
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    timer.first_token()
+                    yield delta
+        except Exception as e:
+            self._record_metrics(timer.finish(error=str(e)))
+            raise
+        self._record_metrics(timer.finish(usage))
+
+    def _get_cached_plan(self, user_input: str) -> Optional[str]:
+        """Look up a previously generated plan for this input or a close paraphrase of it."""
+        if self.plan_cache is not None:
+            cached_plan = self.plan_cache.get(self.planner_prompt_hash, self.model, user_input)
+            if cached_plan is not None:
+                return cached_plan
+        if self.semantic_cache is not None:
+            return self.semantic_cache.get(f"{self.planner_prompt_hash}:{self.model}", user_input)
+        return None
+
+    def _cache_plan(self, user_input: str, thinking_plan: str) -> None:
+        if not thinking_plan:
+            return
+        if self.plan_cache is not None:
+            self.plan_cache.put(self.planner_prompt_hash, self.model, user_input, thinking_plan)
+        if self.semantic_cache is not None:
+            self.semantic_cache.put(f"{self.planner_prompt_hash}:{self.model}", user_input, thinking_plan)
+
     def generate_thinking_plan(self, user_input: str) -> str:
         """Generate a thinking plan for the user input."""
+        cached_plan = self._get_cached_plan(user_input)
+        if cached_plan is not None:
+            self.last_metrics["plan"] = {"stage": "plan", "model": self.model, "cached": True}
+            self.add_thinking(cached_plan)
+            return cached_plan
+
+        timer = CallTimer("plan", self.model)
         try:
-            # Create messages for the planning step
-            planning_messages = [
-                {"role": "system", "content": self.planner_prompt},
-                {"role": "user", "content": user_input}
-            ]
-            
             # Send the planning request to OpenAI
-            response = self.client.chat.completions.create(
+            response = create_completion(
+                self.client, self.hedger, "plan",
                 model=self.model,
-                messages=planning_messages,
+                messages=self._planning_messages(user_input),
                 temperature=0.7,
-                max_tokens=1000
+                max_tokens=1000,
+                timeout=self.timeout
             )
+            self._record_metrics(timer.finish(response.usage))
             
             # Extract the thinking plan
             thinking_plan = response.choices[0].message.content
             
             # Add to thinking history
             self.add_thinking(thinking_plan)
+            self._cache_plan(user_input, thinking_plan)
             
             return thinking_plan
         
         except Exception as e:
+            self._record_metrics(timer.finish(error=str(e)))
             error_message = f"Error generating thinking plan: {str(e)}"
             print(error_message)
             self.add_thinking(error_message)
             return error_message
     
-    def generate_final_response(self, user_input: str, thinking_plan: str) -> str:
-        """Generate the final response based on the thinking plan."""
-        try:
-            # Create messages for the final response
-            system_prompt = f"""You are a helpful assistant. Use the following thinking plan to guide your response to the user:
+    def _should_plan(self, user_input: str) -> Optional[str]:
+        """Route the query and record the decision in the thinking history.
 
-{thinking_plan}
+        Returns None if the planner should run, otherwise the routing note that stands in for the plan.
+        """
+        if self.router is None:
+            return None
+        route = self.router.route(user_input)
+        self.add_thinking(route.describe())
+        return None if route.plan else route.describe()
 
-Respond directly to the user's query using this plan, but do NOT mention that you're following a plan or include the plan in your response."""
-            
-            final_messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input}
-            ]
-            
+    def generate_final_response(self, user_input: str, thinking_plan: Optional[str]) -> str:
+        """Generate the final response based on the thinking plan (or without one if planning was skipped)."""
+        timer = CallTimer("final", self.model)
+        try:
             # Send the final response request to OpenAI
-            response = self.client.chat.completions.create(
+            response = create_completion(
+                self.client, self.hedger, "final",
                 model=self.model,
-                messages=final_messages,
+                messages=self._final_messages(user_input, thinking_plan),
                 temperature=0.7,
-                max_tokens=2000
+                max_tokens=2000,
+                timeout=self.timeout
             )
+            self._record_metrics(timer.finish(response.usage))
             
             # Extract the final response
             final_response = response.choices[0].message.content
@@ -207,19 +398,17 @@ Respond directly to the user's query using this plan, but do NOT mention that yo
             return final_response
         
         except Exception as e:
+            self._record_metrics(timer.finish(error=str(e)))
             error_message = f"Error generating final response: {str(e)}"
             print(error_message)
             return error_message
     
     def process_message(self, user_input: str) -> Tuple[str, str]:
         """Process user input through the thinking process and generate a response."""
+        self.last_metrics = {}
         self.add_message("user", user_input)
 
-        # Check for email-related keywords
-        email_keywords = ["email", "gmail", "mail", "inbox", "message", "sender", "subject"]
-        is_email_query = any(keyword in user_input.lower() for keyword in email_keywords)
-
-        if is_email_query:
+        if self._is_email_query(user_input):
             # Handle email query
             thinking_plan, final_response = self.handle_email_query(user_input)
             self.add_message("system", thinking_plan) # Log the plan from email_handler
@@ -227,8 +416,194 @@ Respond directly to the user's query using this plan, but do NOT mention that yo
             return thinking_plan, final_response
         else:
             # Original non-email processing
+            routing_note = self._should_plan(user_input)
+            if routing_note is not None:
+                # Trivial query: skip the planner and answer in a single call
+                self.add_message("system", routing_note)
+                final_response = self.generate_final_response(user_input, None)
+                self.add_message("assistant", final_response)
+                return routing_note, final_response
+
+            if self.mode == "single_call":
+                thinking_plan, final_response = self.generate_plan_and_response(user_input)
+                self.add_message("system", thinking_plan)
+                self.add_message("assistant", final_response)
+                return thinking_plan, final_response
+
             thinking_plan = self.generate_thinking_plan(user_input)
             self.add_message("system", thinking_plan)
             final_response = self.generate_final_response(user_input, thinking_plan)
             self.add_message("assistant", final_response)
-            return thinking_plan, final_response
\ No newline at end of file
+            return thinking_plan, final_response
+
+    def generate_thinking_plan_stream(self, user_input: str) -> Iterator[str]:
+        """Generate a thinking plan for the user input, yielding it as it is generated."""
+        cached_plan = self._get_cached_plan(user_input)
+        if cached_plan is not None:
+            self.last_metrics["plan"] = {"stage": "plan", "model": self.model, "cached": True}
+            self.add_thinking(cached_plan)
+            yield cached_plan
+            return
+
+        chunks = []
+        try:
+            for delta in self._stream_content(self._planning_messages(user_input), max_tokens=1000, stage="plan"):
+                chunks.append(delta)
+                yield delta
+            thinking_plan = "".join(chunks)
+            self.add_thinking(thinking_plan)
+            self._cache_plan(user_input, thinking_plan)
+
+        except Exception as e:
+            error_message = f"Error generating thinking plan: {str(e)}"
+            print(error_message)
+            self.add_thinking(error_message)
+            yield error_message
+
+    def generate_final_response_stream(self, user_input: str, thinking_plan: Optional[str]) -> Iterator[str]:
+        """Generate the final response based on the thinking plan, yielding it as it is generated."""
+        try:
+            yield from self._stream_content(
+                self._final_messages(user_input, thinking_plan), max_tokens=2000, stage="final"
+            )
+
+        except Exception as e:
+            error_message = f"Error generating final response: {str(e)}"
+            print(error_message)
+            yield error_message
+
+    def process_message_stream(self, user_input: str) -> Iterator[Tuple[str, str]]:
+        """Process user input like process_message, yielding ("plan", delta) and ("response", delta) events.
+
+        The plan and response are added to the chat history once each of them is complete.
+        """
+        self.last_metrics = {}
+        self.add_message("user", user_input)
+
+        if self._is_email_query(user_input):
+            thinking_plan, final_response = self.handle_email_query(user_input)
+            self.add_message("system", thinking_plan)
+            yield "plan", thinking_plan
+            self.add_message("assistant", final_response)
+            yield "response", final_response
+            return
+
+        routing_note = self._should_plan(user_input)
+        if routing_note is not None:
+            self.add_message("system", routing_note)
+            yield "plan", routing_note
+            thinking_plan = None
+        elif self.mode == "single_call":
+            chunks = {"plan": [], "response": []}
+            for kind, delta in self.generate_plan_and_response_stream(user_input):
+                if kind == "response" and not chunks["response"]:
+                    self.add_message("system", "".join(chunks["plan"]))
+                chunks[kind].append(delta)
+                yield kind, delta
+            if not chunks["response"]:
+                self.add_message("system", "".join(chunks["plan"]))
+            self.add_message("assistant", "".join(chunks["response"]))
+            return
+        else:
+            plan_chunks = []
+            for delta in self.generate_thinking_plan_stream(user_input):
+                plan_chunks.append(delta)
+                yield "plan", delta
+            thinking_plan = "".join(plan_chunks)
+            self.add_message("system", thinking_plan)
+
+        response_chunks = []
+        for delta in self.generate_final_response_stream(user_input, thinking_plan):
+            response_chunks.append(delta)
+            yield "response", delta
+        self.add_message("assistant", "".join(response_chunks))
+
+    def _single_call_messages(self, user_input: str) -> List[Dict[str, str]]:
+        """Build the messages asking for the plan and the answer in one structured reply."""
+        return [
+            {"role": "system", "content": self.planner_prompt + SINGLE_CALL_INSTRUCTIONS},
+            {"role": "user", "content": user_input}
+        ]
+
+    def generate_plan_and_response(self, user_input: str) -> Tuple[str, str]:
+        """Generate the thinking plan and the final response with a single completion.
+
+        A cached plan is reused with the regular final-response call, which is also a single call.
+        """
+        cached_plan = self._get_cached_plan(user_input)
+        if cached_plan is not None:
+            self.last_metrics["plan"] = {"stage": "plan", "model": self.model, "cached": True}
+            self.add_thinking(cached_plan)
+            return cached_plan, self.generate_final_response(user_input, cached_plan)
+
+        timer = CallTimer("plan_answer", self.model)
+        try:
+            response = create_completion(
+                self.client, self.hedger, "plan_answer",
+                model=self.model,
+                messages=self._single_call_messages(user_input),
+                temperature=0.7,
+                max_tokens=3000,
+                timeout=self.timeout,
+                response_format={"type": "json_object"}
+            )
+            self._record_metrics(timer.finish(response.usage))
+            content = response.choices[0].message.content
+
+            try:
+                result = json.loads(content)
+                thinking_plan, final_response = str(result.get("plan", "")), str(result.get("answer", ""))
+            except (ValueError, AttributeError):
+                # Not the requested JSON object; show the whole reply as the answer
+                thinking_plan, final_response = "", content
+
+            self.add_thinking(thinking_plan)
+            self._cache_plan(user_input, thinking_plan)
+            return thinking_plan, final_response
+
+        except Exception as e:
+            self._record_metrics(timer.finish(error=str(e)))
+            error_message = f"Error generating response: {str(e)}"
+            print(error_message)
+            self.add_thinking(error_message)
+            return error_message, error_message
+
+    def generate_plan_and_response_stream(self, user_input: str) -> Iterator[Tuple[str, str]]:
+        """Stream the single-call reply, yielding ("plan", delta) and ("response", delta) events."""
+        cached_plan = self._get_cached_plan(user_input)
+        if cached_plan is not None:
+            self.last_metrics["plan"] = {"stage": "plan", "model": self.model, "cached": True}
+            self.add_thinking(cached_plan)
+            yield "plan", cached_plan
+            for delta in self.generate_final_response_stream(user_input, cached_plan):
+                yield "response", delta
+            return
+
+        fields = _JsonFieldStream()
+        raw_chunks = []
+        plan_chunks = []
+        answered = False
+        try:
+            for delta in self._stream_content(self._single_call_messages(user_input), max_tokens=3000,
+                                              stage="plan_answer", response_format={"type": "json_object"}):
+                raw_chunks.append(delta)
+                for field, text in fields.feed(delta):
+                    if field == "plan":
+                        plan_chunks.append(text)
+                        yield "plan", text
+                    else:
+                        answered = True
+                        yield "response", text
+
+            if not answered:
+                # Not the requested JSON object; show the whole reply as the answer
+                yield "response", "".join(raw_chunks)
+            thinking_plan = "".join(plan_chunks)
+            self.add_thinking(thinking_plan)
+            self._cache_plan(user_input, thinking_plan)
+
+        except Exception as e:
+            error_message = f"Error generating response: {str(e)}"
+            print(error_message)
+            self.add_thinking(error_message)
+            yield "response", error_message
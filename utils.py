@@ -1,40 +1,221 @@
 import json
 import os
+import shutil
+import tempfile
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, TextIO, Union
+
+import log_segments
+from blob_store import hydrate_entry
+from file_lock import locked
 
 def ensure_directory_exists(directory_path: str) -> None:
     """Ensure that the specified directory exists."""
     if not os.path.exists(directory_path):
         os.makedirs(directory_path)
 
+def with_timestamp(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the entry with a timestamp, without modifying the caller's dict."""
+    if "timestamp" in entry:
+        return entry
+    return {**entry, "timestamp": datetime.now().isoformat()}
+
+# Email turns are logged under their own user input keys
+USER_INPUT_KEYS = ("user_input", "user_input (voice_email)", "user_input (text_email)")
+
+def user_input_of(entry: Dict[str, Any]) -> Optional[str]:
+    """Return what the user said or typed in a logged turn, whichever kind of turn it was."""
+    return next((entry[key] for key in USER_INPUT_KEYS if entry.get(key)), None)
+
+def _entry_line(entry: Dict[str, Any]) -> str:
+    return json.dumps(with_timestamp(entry), ensure_ascii=False) + "\n"
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def append_chat_log(entries: Union[Dict[str, Any], Iterable[Dict[str, Any]]], file_path: str,
+                    fsync: bool = False) -> bool:
+    """Append one entry (or several) to a JSONL chat log, one line per entry.
+
+    Safe with several threads or processes appending to the same log: the lines are
+    written in one O_APPEND write under the log's file lock, so they are never
+    interleaved with another writer's. With fsync=True the data is on disk when this
+    returns. Returns False on failure.
+    """
+    if isinstance(entries, dict):
+        entries = [entries]
+    data = "".join(_entry_line(entry) for entry in entries).encode("utf-8")
+    if not data:
+        return True
+    try:
+        with locked(file_path):
+            fd = os.open(file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                _write_all(fd, data)
+                if fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+        return True
+    except Exception as e:
+        print(f"Error appending to chat history: {e}")
+        return False
+
 def save_chat_history(chat_history: List[Dict[str, Any]], file_path: str) -> None:
-    """Save the chat history to a JSON file."""
-    ensure_directory_exists(os.path.dirname(file_path))
-    
-    # Add timestamp to each entry if not already present
-    for entry in chat_history:
-        if "timestamp" not in entry:
-            entry["timestamp"] = datetime.now().isoformat()
-    
+    """Replace the whole chat log with chat_history, as JSONL. Prefer append_chat_log for new entries.
+
+    The new log is written to a temporary file and renamed over the old one, so readers
+    and a crash mid-write only ever see the old or the new log in full.
+    """
+    ensure_directory_exists(os.path.dirname(file_path) or ".")
     try:
-        with open(file_path, 'w') as f:
-            json.dump(chat_history, f, indent=2)
+        with locked(file_path):
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write("".join(_entry_line(entry) for entry in chat_history))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, file_path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
     except Exception as e:
         print(f"Error saving chat history: {e}")
 
+def _iter_json_array(f: TextIO, chunk_size: int = 65536) -> Iterator[Any]:
+    """Yield the elements of a JSON array file one at a time, reading it in chunks."""
+    decoder = json.JSONDecoder()
+    buffer, pos = "", 0
+    eof = False
+    started = False
+    while True:
+        while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ",")):
+            pos += 1
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+                yield item
+                continue
+            except ValueError:
+                if eof:
+                    raise
+        elif eof:
+            if started:
+                raise ValueError("Unterminated JSON array")
+            return
+        # Need more data: drop what has been consumed and read the next chunk
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+def _is_json_array_file(file_path: str) -> bool:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            char = f.read(1)
+            if not char or not char.isspace():
+                return char == "["
+
+def _in_window(entry: Dict[str, Any], start: Optional[str], end: Optional[str]) -> bool:
+    timestamp = entry.get("timestamp") or ""
+    return (start is None or timestamp >= start) and (end is None or timestamp <= end)
+
+def _parse_lines(lines: Iterable[str], source: str, file_path: str, start: Optional[str],
+                 end: Optional[str]) -> Iterator[Dict[str, Any]]:
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            print(f"Skipping unreadable line {line_number} of {source}")
+            continue
+        if _in_window(entry, start, end):
+            yield hydrate_entry(entry, file_path)
+
+def iter_chat_history(file_path: str, start: Optional[str] = None,
+                      end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield chat log entries one at a time, oldest first, optionally only those timestamped within [start, end].
+
+    Reads the log's rotated segments (skipping those outside the window) and then the
+    active JSONL log; a legacy JSON array log is read as is. Fields moved to the blob
+    store are put back. Unreadable lines (e.g. a line cut off by a crash) are skipped.
+    """
+    if not is_legacy_log(file_path):
+        for segment in log_segments.segments_in_range(file_path, start, end):
+            yield from _parse_lines(log_segments.iter_segment_lines(file_path, segment), segment["file"],
+                                    file_path, start, end)
+    yield from iter_unsealed_entries(file_path, start, end)
+
+def is_legacy_log(file_path: str) -> bool:
+    """Whether the log is still a (not yet migrated) JSON array."""
+    return os.path.exists(file_path) and _is_json_array_file(file_path)
+
+def iter_unsealed_entries(file_path: str, start: Optional[str] = None,
+                          end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Like iter_chat_history(), but only the entries not yet sealed into a rotated segment."""
+    if is_legacy_log(file_path):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for entry in _iter_json_array(f):
+                if _in_window(entry, start, end):
+                    yield entry
+        return
+    # A rotation in progress, then the active log
+    for path in (file_path + ".rotating", file_path):
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                yield from _parse_lines(f, path, file_path, start, end)
+
 def load_chat_history(file_path: str) -> List[Dict[str, Any]]:
-    """Load chat history from a JSON file."""
-    if not os.path.exists(file_path):
-        return []
-    
+    """Load the whole chat history from a JSONL (or legacy JSON array) log."""
     try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        return list(iter_chat_history(file_path))
     except Exception as e:
         print(f"Error loading chat history: {e}")
         return []
 
+def migrate_json_log(legacy_path: str, file_path: str) -> int:
+    """One-time conversion of a JSON array log into the JSONL log at file_path.
+
+    The array is streamed, so the old log never has to fit in memory. Its entries go
+    before any already in file_path, and it is renamed to *.migrated afterwards.
+    Returns the number of entries migrated (0 if there was nothing to migrate).
+    """
+    if not os.path.exists(legacy_path):
+        return 0
+    with locked(file_path):
+        if not os.path.exists(legacy_path):  # Another session or process got here first
+            return 0
+        ensure_directory_exists(os.path.dirname(file_path))
+        temp_path = file_path + ".migrating"
+        count = 0
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as out:
+                with open(legacy_path, 'r', encoding='utf-8') as f:
+                    for entry in _iter_json_array(f):
+                        out.write(_entry_line(entry))
+                        count += 1
+                if os.path.exists(file_path):
+                    with open(file_path, 'r', encoding='utf-8') as existing:
+                        shutil.copyfileobj(existing, out)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        os.replace(temp_path, file_path)
+        os.replace(legacy_path, legacy_path + ".migrated")
+    print(f"Migrated {count} chat log entries from {legacy_path} to {file_path}")
+    return count
+
 def format_message_for_display(message: Dict[str, str]) -> str:
     """Format a message for display in the UI."""
     role = message.get("role", "")